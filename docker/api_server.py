@@ -5,67 +5,57 @@ Energy Statistics REST API
 Endpoints:
     GET /                               - API documentation
     GET /api/v1/energy/regions          - ดึงข้อมูลทุกภูมิภาค
-    GET /api/v1/energy/regions/{code}   - ดึงข้อมูลภูมิภาคเดียว
-    GET /api/v1/energy/summary          - ดึงข้อมูลสรุป
+                                          (?region=&province=&year_from=&year_to=
+                                           &min_consumption_gwh=&sort=&limit=&cursor=)
+    GET /api/v1/energy/regions/{code}   - ดึงข้อมูลภูมิภาคเดียว (?year=2566)
+    GET /api/v1/energy/summary          - ดึงข้อมูลสรุป (?year=2566&group_by=region|province|month)
+    POST /api/v1/energy/batch           - ดึงหลายรายการใน request เดียว (NDJSON)
+    GET /api/v1/energy/export           - ดาวน์โหลดทั้งชุดแบบ streaming (?format=ndjson|csv|parquet)
+    GET /api/v1/energy/search           - ค้นหาด้วยความหมาย (?q=&k=5&region=&year=)
     GET /health                         - Health check
+    GET /metrics                        - Prometheus metrics (latency, cache hit/miss, reload)
+
+/regions, /regions/{code} และ /summary ตอบเป็น JSON, XML, CSV, Turtle, Arrow หรือ Parquet
+ตาม Accept header (หรือ ?format=json|xml|csv|turtle|arrow|parquet)
+
+Rate limit: RATE_LIMIT_RATE / RATE_LIMIT_BURST ต่อ client (IP หรือ X-API-Key ใน RATE_LIMIT_API_KEYS)
+ตั้ง RATE_LIMIT_REDIS_URL เพื่อใช้ bucket ร่วมกันทุก worker (ไม่ตั้ง = bucket ใน process)
+
+Production (ใน Docker image):
+    gunicorn --config gunicorn.conf.py api_server:app
+
+Development:
+    FLASK_ENV=development python api_server.py
 """
 
 import os
+import sys
 import json
+from pathlib import Path
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+# โมดูลร่วมอยู่ใน level4_api/ (ใน container ถูก copy มาไว้ข้าง api_server.py)
+LEVEL4_DIR = Path(__file__).resolve().parent.parent / "level4_api"
+if LEVEL4_DIR.is_dir():
+    sys.path.insert(0, str(LEVEL4_DIR))
+
+from energy_api import energy_api, store
+from metrics import init_metrics
+from rate_limit import init_rate_limit, limiter_from_env
+
 app = Flask(__name__)
 CORS(app)
 
-# ข้อมูลสถิติพลังงานไฟฟ้า ปี 2566
-ENERGY_DATA = {
-    "TH-C": {
-        "region_code": "TH-C",
-        "region_th": "ภาคกลาง",
-        "region_en": "Central",
-        "consumption_gwh": 45230,
-        "customers": 8542000,
-        "growth_rate": 3.2,
-        "year": 2566
-    },
-    "TH-N": {
-        "region_code": "TH-N",
-        "region_th": "ภาคเหนือ",
-        "region_en": "North",
-        "consumption_gwh": 18450,
-        "customers": 4125000,
-        "growth_rate": 2.8,
-        "year": 2566
-    },
-    "TH-NE": {
-        "region_code": "TH-NE",
-        "region_th": "ภาคตะวันออกเฉียงเหนือ",
-        "region_en": "Northeast",
-        "consumption_gwh": 22180,
-        "customers": 7890000,
-        "growth_rate": 4.1,
-        "year": 2566
-    },
-    "TH-S": {
-        "region_code": "TH-S",
-        "region_th": "ภาคใต้",
-        "region_en": "South",
-        "consumption_gwh": 15620,
-        "customers": 3456000,
-        "growth_rate": 2.5,
-        "year": 2566
-    },
-    "TH-E": {
-        "region_code": "TH-E",
-        "region_th": "ภาคตะวันออก",
-        "region_en": "East",
-        "consumption_gwh": 28970,
-        "customers": 2987000,
-        "growth_rate": 5.3,
-        "year": 2566
-    }
-}
+# /api/v1/energy/* (ดู energy_api.py)
+app.register_blueprint(energy_api)
+
+# GET /metrics (Prometheus) - ติดตั้งก่อน rate limit เพื่อให้นับ request ที่ถูกปฏิเสธด้วย
+init_metrics(app)
+
+# จำกัด request ต่อ client (token bucket, ดู rate_limit.py) - burst จาก client เดียวไม่กิน worker ทั้งหมด
+# request ที่เหมือนกันและมาพร้อมกันคำนวณเพียงครั้งเดียวอยู่แล้ว (SingleFlight ใน response_cache.py)
+init_rate_limit(app, limiter_from_env(), exempt=("/", "/health", "/metrics"))
 
 
 @app.route("/")
@@ -77,10 +67,16 @@ def index():
         "source": "กรมพัฒนาพลังงานทดแทนและอนุรักษ์พลังงาน (พพ.)",
         "level": "★★★★ Level 4: Open with API",
         "endpoints": {
-            "GET /api/v1/energy/regions": "ดึงข้อมูลทุกภูมิภาค",
+            "GET /api/v1/energy/regions": "ดึงข้อมูลทุกภูมิภาค (filter: region, province, year, year_from, year_to, min_/max_consumption_gwh, min_/max_growth_rate, min_/max_customers; sort, limit, cursor)",
             "GET /api/v1/energy/regions/{code}": "ดึงข้อมูลภูมิภาคเดียว (TH-C, TH-N, TH-NE, TH-S, TH-E)",
-            "GET /api/v1/energy/summary": "ดึงข้อมูลสรุป",
-            "GET /health": "Health check"
+            "GET /api/v1/energy/summary": "ดึงข้อมูลสรุป (?year=, ?group_by=region|province|month)",
+            "POST /api/v1/energy/batch": "ดึงหลายรายการใน request เดียว (NDJSON)",
+            "GET /api/v1/energy/export": "ดาวน์โหลดทั้งชุดแบบ streaming (?format=ndjson|csv|parquet)",
+            "GET /api/v1/energy/search": "ค้นหาด้วยความหมายผ่าน vector index (?q=, ?k=, ?region=, ?year=)",
+            "GET /api/v1/energy/search/stats": "throughput, latency และ cache hit rate ของการค้นหา",
+            "formats": "Accept: application/json | application/xml | text/csv | text/turtle | application/vnd.apache.arrow.stream | application/vnd.apache.parquet (หรือ ?format=)",
+            "GET /health": "Health check",
+            "GET /metrics": "Prometheus metrics"
         },
         "related_services": {
             "sparql_endpoint": "http://localhost:3030/energy/sparql",
@@ -92,52 +88,12 @@ def index():
 @app.route("/health")
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "energy-api"})
-
-
-@app.route("/api/v1/energy/regions")
-def get_all_regions():
-    """ดึงข้อมูลทุกภูมิภาค"""
-    return jsonify({
-        "status": "success",
-        "count": len(ENERGY_DATA),
-        "data": list(ENERGY_DATA.values())
-    })
-
-
-@app.route("/api/v1/energy/regions/<region_code>")
-def get_region(region_code):
-    """ดึงข้อมูลภูมิภาคเดียว"""
-    region_code = region_code.upper()
-    if region_code in ENERGY_DATA:
-        return jsonify({
-            "status": "success",
-            "data": ENERGY_DATA[region_code]
-        })
-    else:
-        return jsonify({
-            "status": "error",
-            "message": f"Region '{region_code}' not found",
-            "valid_codes": list(ENERGY_DATA.keys())
-        }), 404
-
-
-@app.route("/api/v1/energy/summary")
-def get_summary():
-    """ดึงข้อมูลสรุป"""
-    total_consumption = sum(r["consumption_gwh"] for r in ENERGY_DATA.values())
-    total_customers = sum(r["customers"] for r in ENERGY_DATA.values())
-    avg_growth = sum(r["growth_rate"] for r in ENERGY_DATA.values()) / len(ENERGY_DATA)
-
+    snapshot = store.snapshot
     return jsonify({
-        "status": "success",
-        "data": {
-            "year": 2566,
-            "total_consumption_gwh": total_consumption,
-            "total_customers": total_customers,
-            "average_growth_rate": round(avg_growth, 2),
-            "region_count": len(ENERGY_DATA)
-        }
+        "status": "healthy",
+        "service": "energy-api",
+        "records": len(snapshot),
+        "data_version": snapshot.version
     })
 
 
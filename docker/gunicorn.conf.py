@@ -0,0 +1,77 @@
+"""
+Gunicorn configuration for Energy Statistics API (production mode)
+
+รัน:
+    gunicorn --config gunicorn.conf.py api_server:app
+
+ปรับได้ผ่าน environment variables:
+    PORT               - port (ค่าเริ่มต้น 5000)
+    WEB_CONCURRENCY    - จำนวน worker process (ค่าเริ่มต้น 2 x CPU + 1)
+    GUNICORN_THREADS   - จำนวน thread ต่อ worker (ค่าเริ่มต้น 4)
+    GUNICORN_TIMEOUT   - วินาทีก่อน worker ที่ค้างถูก restart (ค่าเริ่มต้น 30)
+    GUNICORN_KEEPALIVE - วินาทีที่เปิด keep-alive connection ค้างไว้ (ค่าเริ่มต้น 5)
+    METRICS_DIR        - ที่เก็บ metrics ของแต่ละ worker ให้ /metrics รวม (ค่าเริ่มต้น /tmp/energy-api-metrics)
+
+Graceful reload (worker ใหม่รับงานก่อน worker เดิมปิด):
+    docker kill --signal=HUP energy-api
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+
+# ต้องตั้งก่อน app ถูก import (preload) - metrics.py อ่านค่านี้ตอน import
+os.environ.setdefault("METRICS_DIR", "/tmp/energy-api-metrics")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# gthread: แต่ละ worker มีหลาย thread - client ที่ช้าไม่บล็อก request อื่น
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# โหลด app (และข้อมูลใน EnergyStore) ครั้งเดียวใน master แล้ว fork
+# worker ทุกตัวใช้หน่วยความจำชุดเดียวกันแบบ copy-on-write
+preload_app = True
+
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+
+# restart worker เป็นระยะ กัน memory รั่วสะสม (jitter กันไม่ให้ restart พร้อมกัน)
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def pre_fork(server, worker):
+    # ย้าย object ที่โหลดไว้แล้วออกจาก GC tracking ก่อน fork
+    # ไม่งั้น GC ใน worker จะเขียน header ของ object ทำให้ page ถูก copy
+    gc.freeze()
+
+
+def on_starting(server):
+    # metrics ของการรันครั้งก่อนไม่เกี่ยวกับ process ชุดนี้
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def when_ready(server):
+    # ค่าที่ master เก็บไว้ตอน preload (เวลาโหลดข้อมูล, warm cache) นับครั้งเดียวในไฟล์ของ master
+    import metrics
+    metrics.flush()
+
+
+def post_fork(server, worker):
+    # worker เริ่มนับจากศูนย์ (ค่าที่ copy มาจาก master ถูกนับในไฟล์ของ master แล้ว)
+    import metrics
+    metrics.REGISTRY.reset()
+    metrics.start_flusher()
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.flush()
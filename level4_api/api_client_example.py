@@ -7,44 +7,47 @@
 
 รัน:
     python api_client_example.py
+
+ตัวอย่างนี้ใช้ EnergyClient (energy_client.py) ที่มี connection pool,
+timeout/retry และ HTTP cache (ETag) ในตัว
 """
 
-import requests
+import asyncio
+
+from energy_client import AsyncEnergyClient, EnergyClient
 
-API_BASE = "http://localhost:5000/api/v1"
+API_BASE = "http://localhost:5000"
+
+client = EnergyClient(API_BASE)
 
 
 def get_all_regions():
     """ดึงข้อมูลทุกภูมิภาค"""
-    response = requests.get(f"{API_BASE}/energy/regions")
-    data = response.json()
-
     print("=== ข้อมูลทุกภูมิภาค ===")
-    for region in data["data"]:
+    for region in client.regions():
         print(f"  {region['region_th']}: {region['consumption_gwh']:,} GWh")
     print()
 
 
 def get_single_region(region_code):
     """ดึงข้อมูลภูมิภาคเดียว"""
-    response = requests.get(f"{API_BASE}/energy/regions/{region_code}")
-    data = response.json()
-
-    if data["status"] == "success":
-        region = data["data"]
-        print(f"=== {region['region_th']} ({region['region_en']}) ===")
-        print(f"  การใช้ไฟฟ้า: {region['consumption_gwh']:,} GWh")
-        print(f"  จำนวนผู้ใช้: {region['customers']:,} ราย")
-        print(f"  อัตราเติบโต: {region['growth_rate']}%")
-    else:
-        print(f"Error: {data['message']}")
+    try:
+        region = client.region(region_code)
+    except Exception as e:
+        print(f"Error: {e}")
+        print()
+        return
+
+    print(f"=== {region['region_th']} ({region['region_en']}) ===")
+    print(f"  การใช้ไฟฟ้า: {region['consumption_gwh']:,} GWh")
+    print(f"  จำนวนผู้ใช้: {region['customers']:,} ราย")
+    print(f"  อัตราเติบโต: {region['growth_rate']}%")
     print()
 
 
 def get_summary():
     """ดึงข้อมูลสรุป"""
-    response = requests.get(f"{API_BASE}/energy/summary")
-    data = response.json()["data"]
+    data = client.summary()
 
     print("=== สรุปภาพรวม ===")
     print(f"  ปี: {data['year']}")
@@ -54,6 +57,24 @@ def get_summary():
     print()
 
 
+def get_many_regions(region_codes):
+    """ดึงหลายภูมิภาคใน request เดียว (batch endpoint)"""
+    print("=== หลายภูมิภาคใน request เดียว ===")
+    for code, region in client.regions_many(region_codes).items():
+        print(f"  {code}: {region['consumption_gwh']:,} GWh")
+    print()
+
+
+async def get_regions_concurrently(region_codes):
+    """ดึงหลายภูมิภาคพร้อมกันด้วย asyncio"""
+    print("=== ดึงพร้อมกันด้วย asyncio ===")
+    async with AsyncEnergyClient(API_BASE) as async_client:
+        regions = await async_client.fetch_regions(region_codes)
+    for region in regions:
+        print(f"  {region['region_th']}: {region['growth_rate']}%")
+    print()
+
+
 if __name__ == "__main__":
     print("Energy Statistics API Client Demo\n")
 
@@ -61,3 +82,9 @@ if __name__ == "__main__":
     get_all_regions()
     get_single_region("TH-NE")  # ภาคอีสาน
     get_summary()
+
+    # เรียกซ้ำ: client ส่ง If-None-Match แล้วได้ 304 (ไม่ต้องโหลด body ใหม่)
+    get_summary()
+
+    get_many_regions(["TH-C", "TH-NE", "TH-E"])
+    asyncio.run(get_regions_concurrently(["TH-C", "TH-N", "TH-NE", "TH-S", "TH-E"]))
@@ -6,66 +6,33 @@ Level 4: Open Data with API
     pip install flask flask-cors
     python api_server.py
 
+    # ใช้ไฟล์ข้อมูลอื่น (.json แบบ Level 3 หรือ .jsonl แบบ Level 6)
+    ENERGY_DATA_FILE=../level6_ai_ready/data/energy_stats.jsonl python api_server.py
+
 Endpoints:
     GET /api/v1/energy/regions          - ดึงข้อมูลทุกภูมิภาค
-    GET /api/v1/energy/regions/{code}   - ดึงข้อมูลภูมิภาคเดียว
-    GET /api/v1/energy/summary          - ดึงข้อมูลสรุป
+                                          (?region=&province=&year_from=&year_to=
+                                           &min_consumption_gwh=&sort=&limit=&cursor=)
+    GET /api/v1/energy/regions/{code}   - ดึงข้อมูลภูมิภาคเดียว (?year=2566)
+    GET /api/v1/energy/summary          - ดึงข้อมูลสรุป (?year=2566&group_by=region|province|month)
+    POST /api/v1/energy/batch           - ดึงหลายรายการใน request เดียว (NDJSON)
+    GET /api/v1/energy/export           - ดาวน์โหลดทั้งชุดแบบ streaming (?format=ndjson|csv|parquet)
+    GET /api/v1/energy/search           - ค้นหาด้วยความหมาย (?q=&k=5&region=&year=)
+
+/regions, /regions/{code} และ /summary ตอบเป็น JSON, XML, CSV, Turtle, Arrow หรือ Parquet
+ตาม Accept header (หรือ ?format=json|xml|csv|turtle|arrow|parquet)
 """
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+from energy_api import energy_api
+
 app = Flask(__name__)
 CORS(app)
 
-# ข้อมูลสถิติพลังงานไฟฟ้า ปี 2566
-ENERGY_DATA = {
-    "TH-C": {
-        "region_code": "TH-C",
-        "region_th": "ภาคกลาง",
-        "region_en": "Central",
-        "consumption_gwh": 45230,
-        "customers": 8542000,
-        "growth_rate": 3.2,
-        "year": 2566
-    },
-    "TH-N": {
-        "region_code": "TH-N",
-        "region_th": "ภาคเหนือ",
-        "region_en": "North",
-        "consumption_gwh": 18450,
-        "customers": 4125000,
-        "growth_rate": 2.8,
-        "year": 2566
-    },
-    "TH-NE": {
-        "region_code": "TH-NE",
-        "region_th": "ภาคตะวันออกเฉียงเหนือ",
-        "region_en": "Northeast",
-        "consumption_gwh": 22180,
-        "customers": 7890000,
-        "growth_rate": 4.1,
-        "year": 2566
-    },
-    "TH-S": {
-        "region_code": "TH-S",
-        "region_th": "ภาคใต้",
-        "region_en": "South",
-        "consumption_gwh": 15620,
-        "customers": 3456000,
-        "growth_rate": 2.5,
-        "year": 2566
-    },
-    "TH-E": {
-        "region_code": "TH-E",
-        "region_th": "ภาคตะวันออก",
-        "region_en": "East",
-        "consumption_gwh": 28970,
-        "customers": 2987000,
-        "growth_rate": 5.3,
-        "year": 2566
-    }
-}
+# /api/v1/energy/* (ดู energy_api.py)
+app.register_blueprint(energy_api)
 
 
 @app.route("/")
@@ -76,55 +43,14 @@ def index():
         "version": "1.0",
         "source": "กรมพัฒนาพลังงานทดแทนและอนุรักษ์พลังงาน (พพ.)",
         "endpoints": {
-            "GET /api/v1/energy/regions": "ดึงข้อมูลทุกภูมิภาค",
+            "GET /api/v1/energy/regions": "ดึงข้อมูลทุกภูมิภาค (filter: region, province, year, year_from, year_to, min_/max_consumption_gwh, min_/max_growth_rate, min_/max_customers; sort, limit, cursor)",
             "GET /api/v1/energy/regions/{code}": "ดึงข้อมูลภูมิภาคเดียว (TH-C, TH-N, TH-NE, TH-S, TH-E)",
-            "GET /api/v1/energy/summary": "ดึงข้อมูลสรุป"
-        }
-    })
-
-
-@app.route("/api/v1/energy/regions")
-def get_all_regions():
-    """ดึงข้อมูลทุกภูมิภาค"""
-    return jsonify({
-        "status": "success",
-        "count": len(ENERGY_DATA),
-        "data": list(ENERGY_DATA.values())
-    })
-
-
-@app.route("/api/v1/energy/regions/<region_code>")
-def get_region(region_code):
-    """ดึงข้อมูลภูมิภาคเดียว"""
-    region_code = region_code.upper()
-    if region_code in ENERGY_DATA:
-        return jsonify({
-            "status": "success",
-            "data": ENERGY_DATA[region_code]
-        })
-    else:
-        return jsonify({
-            "status": "error",
-            "message": f"Region '{region_code}' not found",
-            "valid_codes": list(ENERGY_DATA.keys())
-        }), 404
-
-
-@app.route("/api/v1/energy/summary")
-def get_summary():
-    """ดึงข้อมูลสรุป"""
-    total_consumption = sum(r["consumption_gwh"] for r in ENERGY_DATA.values())
-    total_customers = sum(r["customers"] for r in ENERGY_DATA.values())
-    avg_growth = sum(r["growth_rate"] for r in ENERGY_DATA.values()) / len(ENERGY_DATA)
-
-    return jsonify({
-        "status": "success",
-        "data": {
-            "year": 2566,
-            "total_consumption_gwh": total_consumption,
-            "total_customers": total_customers,
-            "average_growth_rate": round(avg_growth, 2),
-            "region_count": len(ENERGY_DATA)
+            "GET /api/v1/energy/summary": "ดึงข้อมูลสรุป (?year=, ?group_by=region|province|month)",
+            "POST /api/v1/energy/batch": "ดึงหลายรายการใน request เดียว (NDJSON)",
+            "GET /api/v1/energy/export": "ดาวน์โหลดทั้งชุดแบบ streaming (?format=ndjson|csv|parquet)",
+            "GET /api/v1/energy/search": "ค้นหาด้วยความหมายผ่าน vector index (?q=, ?k=, ?region=, ?year=)",
+            "GET /api/v1/energy/search/stats": "throughput, latency และ cache hit rate ของการค้นหา",
+            "formats": "Accept: application/json | application/xml | text/csv | text/turtle | application/vnd.apache.arrow.stream | application/vnd.apache.parquet (หรือ ?format=)"
         }
     })
 
@@ -0,0 +1,382 @@
+"""
+Energy API Benchmark
+Level 4: วัด throughput / latency / หน่วยความจำของ API ด้วยข้อมูลสังเคราะห์หลายขนาด
+
+สร้างข้อมูล จังหวัด x ปี x เดือน ตามขนาดที่กำหนด แล้วเปิด api_server.py (หรือ gunicorn)
+บนเครื่องนี้ ยิงแต่ละ endpoint ที่ concurrency ต่างๆ รายงาน RPS, p50/p95/p99 และ RSS
+ผลถูกบันทึกเป็น JSON เพื่อเทียบระหว่างเวอร์ชัน (--compare)
+
+รัน: pip install requests  (psutil ถ้าต้องการวัดหน่วยความจำของ gunicorn ทุก worker)
+     python benchmark.py
+     python benchmark.py --provinces 10,77 --years 10 --concurrency 1,16,64 --requests 2000
+     python benchmark.py --gunicorn --compare benchmark_results/<ไฟล์ก่อนหน้า>.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+HERE = Path(__file__).resolve().parent
+DOCKER_DIR = HERE.parent / "docker"
+
+REGIONS = [
+    ("TH-C", "ภาคกลาง", "Central"),
+    ("TH-N", "ภาคเหนือ", "North"),
+    ("TH-NE", "ภาคตะวันออกเฉียงเหนือ", "Northeast"),
+    ("TH-S", "ภาคใต้", "South"),
+    ("TH-E", "ภาคตะวันออก", "East"),
+]
+LATEST_YEAR = 2566
+
+
+# ===========================================
+# ข้อมูลสังเคราะห์
+# ===========================================
+
+def generate_dataset(path: Path, provinces: int, years: int, seed: int = 2566) -> int:
+    """
+    เขียน JSONL: ยอดรวมรายภูมิภาคต่อปี + จังหวัด x ปี x เดือน
+    คืนจำนวน record
+    """
+    rng = random.Random(seed)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for year in range(LATEST_YEAR - years + 1, LATEST_YEAR + 1):
+            for index, (code, name_th, name_en) in enumerate(REGIONS):
+                rows = [{
+                    "region_code": code, "region_th": name_th, "region_en": name_en, "year": year,
+                    "consumption_gwh": round(rng.uniform(10_000, 50_000), 1),
+                    "customers": rng.randint(2_000_000, 9_000_000),
+                    "growth_rate": round(rng.uniform(-2, 6), 1),
+                }]
+                for province in range(index, provinces, len(REGIONS)):
+                    for month in range(1, 13):
+                        rows.append({
+                            "region_code": code, "region_th": name_th, "region_en": name_en,
+                            "province": f"จังหวัด{province + 1:02d}", "year": year, "month": month,
+                            "consumption_gwh": round(rng.uniform(5, 800), 2),
+                            "customers": rng.randint(10_000, 900_000),
+                            "growth_rate": round(rng.uniform(-5, 8), 1),
+                        })
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += len(rows)
+    return count
+
+
+def scenarios(provinces: int):
+    """endpoint ที่วัด: (ชื่อ, method, path, JSON body)"""
+    province = "จังหวัด01"
+    batch = {"requests": [{"op": "region", "code": code} for code, _, _ in REGIONS]
+             + [{"op": "summary", "group_by": "region"}]}
+    items = [
+        ("regions_all", "GET", "/api/v1/energy/regions", None),
+        ("regions_query", "GET",
+         f"/api/v1/energy/regions?region=TH-NE&year_from={LATEST_YEAR - 2}&sort=-consumption_gwh&limit=100", None),
+        ("region", "GET", "/api/v1/energy/regions/TH-NE", None),
+        ("summary", "GET", "/api/v1/energy/summary", None),
+        ("summary_by_region", "GET", "/api/v1/energy/summary?group_by=region", None),
+        ("summary_by_month", "GET", "/api/v1/energy/summary?group_by=month", None),
+        ("batch", "POST", "/api/v1/energy/batch", batch),
+        ("export_ndjson", "GET", f"/api/v1/energy/export?format=ndjson&year={LATEST_YEAR}", None),
+    ]
+    if provinces:
+        items.insert(2, ("regions_province", "GET", f"/api/v1/energy/regions?province={province}&limit=1000", None))
+        items.append(("summary_by_province", "GET", "/api/v1/energy/summary?group_by=province", None))
+    return items
+
+
+# ===========================================
+# Server
+# ===========================================
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """เปิด api_server.py (หรือ gunicorn) ด้วย ENERGY_DATA_FILE ที่กำหนด"""
+
+    def __init__(self, data_file: Path, use_gunicorn: bool = False, workers: int = 2):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        env = {
+            **os.environ,
+            "ENERGY_DATA_FILE": str(data_file),
+            "PORT": str(self.port),
+            "RATE_LIMIT_RATE": "0",  # ไม่ต้องการวัด 429
+            "PYTHONUNBUFFERED": "1",
+        }
+        if use_gunicorn:
+            env["WEB_CONCURRENCY"] = str(workers)
+            env["METRICS_DIR"] = tempfile.mkdtemp(prefix="energy-bench-metrics-")
+            command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py",
+                       "--access-logfile", os.devnull, "api_server:app"]
+            cwd = DOCKER_DIR
+        else:
+            # level4_api/api_server.py รันด้วย Flask development server (threaded) บน port คงที่
+            # จึงเปิดผ่าน app.run ของเราเองเพื่อเลือก port และปิด debug reloader
+            command = [sys.executable, "-c",
+                       "from api_server import app; "
+                       f"app.run(host='127.0.0.1', port={self.port}, threaded=True)"]
+            cwd = HERE
+        # log ของ server (access log ทุก request) ลงไฟล์ - ถ้าใช้ pipe ที่ไม่มีใครอ่าน server จะค้างเมื่อ buffer เต็ม
+        self.log = tempfile.TemporaryFile()
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(command, cwd=cwd, env=env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float = 120) -> float:
+        """รอจน server ตอบ คืนเวลาที่ใช้ start (วินาที)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError(f"Server exited: {self.log.read().decode()[-2000:]}")
+            try:
+                requests.get(self.base_url + "/", timeout=1)
+                return time.perf_counter() - self.started
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        raise RuntimeError("Server did not start in time")
+
+    def rss_bytes(self) -> int:
+        """RSS ของ server (รวม worker ทุกตัวถ้ามี psutil)"""
+        try:
+            import psutil
+            process = psutil.Process(self.process.pid)
+            return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        except ImportError:
+            pass
+        try:
+            status = Path(f"/proc/{self.process.pid}/status").read_text()
+        except OSError:
+            return 0
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+        return 0
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+class MemorySampler:
+    """อ่าน RSS เป็นระยะระหว่างยิง load เก็บค่าสูงสุด"""
+
+    def __init__(self, server: Server, interval: float = 0.2):
+        self.server = server
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.server.rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+# ===========================================
+# Load generator
+# ===========================================
+
+def percentile(sorted_values, fraction: float) -> float:
+    """percentile แบบ nearest-rank: ค่าลำดับที่ ceil(fraction * N) (นับจาก 1, ปัด error ของ float ก่อน ceil)"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(round(fraction * len(sorted_values), 9)) - 1))
+    return sorted_values[index]
+
+
+def run_load(base_url: str, method: str, path: str, body, concurrency: int, total: int,
+             warmup: int = 20) -> dict:
+    """ยิง request ทั้งหมด total ครั้ง ด้วย concurrency thread (แต่ละ thread มี Session ของตัวเอง)"""
+    url = base_url + path
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def once():
+        start = time.perf_counter()
+        try:
+            response = session().request(method, url, json=body, timeout=60)
+            size = len(response.content)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            size, ok = 0, False
+        return time.perf_counter() - start, size, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: once(), range(min(warmup, total))))
+
+        started = time.perf_counter()
+        results = list(pool.map(lambda _: once(), range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, ok in results if ok)
+    errors = sum(1 for _, _, ok in results if not ok)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "bytes_per_response": round(statistics.mean(size for _, size, _ in results)) if results else 0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+# ===========================================
+# รายงาน
+# ===========================================
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, previous: dict):
+    """พิมพ์การเปลี่ยนแปลงของ RPS และ p95 เทียบกับผลครั้งก่อน"""
+    def index(report):
+        return {
+            (run["dataset"]["records"], endpoint["name"], endpoint["concurrency"]): endpoint
+            for run in report["runs"] for endpoint in run["endpoints"]
+        }
+
+    before = index(previous)
+    print(f"\n=== เทียบกับ {previous['meta']['revision']} ({previous['meta']['timestamp']}) ===")
+    print(f"{'records':>8} {'endpoint':<22} {'conc':>4} {'RPS':>16} {'p95 ms':>18}")
+    for key, now in sorted(index(current).items()):
+        old = before.get(key)
+        if old is None:
+            continue
+        rps_change = (now["rps"] - old["rps"]) / old["rps"] * 100 if old["rps"] else 0.0
+        p95_old, p95_new = old["latency_ms"]["p95"], now["latency_ms"]["p95"]
+        p95_change = (p95_new - p95_old) / p95_old * 100 if p95_old else 0.0
+        flag = "  ⚠️" if rps_change < -10 or p95_change > 20 else ""
+        print(f"{key[0]:>8} {key[1]:<22} {key[2]:>4} "
+              f"{now['rps']:>8} ({rps_change:+5.1f}%) {p95_new:>9} ({p95_change:+5.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Energy Statistics API")
+    parser.add_argument("--provinces", default="0,10,77",
+                        help="จำนวนจังหวัดของแต่ละชุดข้อมูล คั่นด้วย , (0 = ยอดรวมรายภูมิภาคเท่านั้น)")
+    parser.add_argument("--years", type=int, default=5, help="จำนวนปีย้อนหลังจาก 2566")
+    parser.add_argument("--concurrency", default="1,8,32", help="จำนวน request พร้อมกัน คั่นด้วย ,")
+    parser.add_argument("--requests", type=int, default=500, help="จำนวน request ต่อ endpoint ต่อ concurrency")
+    parser.add_argument("--endpoints", default="", help="วัดเฉพาะ endpoint เหล่านี้ (ชื่อคั่นด้วย ,)")
+    parser.add_argument("--gunicorn", action="store_true",
+                        help="รันด้วย gunicorn + docker/gunicorn.conf.py แทน Flask dev server")
+    parser.add_argument("--workers", type=int, default=2, help="จำนวน gunicorn worker")
+    parser.add_argument("--output", default=str(HERE / "benchmark_results"), help="โฟลเดอร์เก็บผล JSON")
+    parser.add_argument("--compare", help="ไฟล์ผลครั้งก่อนสำหรับเทียบ")
+    args = parser.parse_args()
+
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    wanted = {name for name in args.endpoints.split(",") if name}
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "server": f"gunicorn ({args.workers} workers)" if args.gunicorn else "flask",
+            "requests_per_run": args.requests,
+        },
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="energy-bench-") as tmp:
+        for provinces in (int(p) for p in args.provinces.split(",")):
+            data_file = Path(tmp) / f"energy_{provinces}p_{args.years}y.jsonl"
+            records = generate_dataset(data_file, provinces, args.years)
+            print(f"\n=== {provinces} จังหวัด x {args.years} ปี x 12 เดือน: {records:,} records ===")
+
+            server = Server(data_file, args.gunicorn, args.workers)
+            try:
+                startup = server.wait_ready()
+                run = {
+                    "dataset": {"provinces": provinces, "years": args.years, "records": records,
+                                "file_bytes": data_file.stat().st_size},
+                    "startup_seconds": round(startup, 3),
+                    "rss_mb_idle": round(server.rss_bytes() / 2**20, 1),
+                    "endpoints": [],
+                }
+                with MemorySampler(server) as sampler:
+                    for name, method, path, body in scenarios(provinces):
+                        if wanted and name not in wanted:
+                            continue
+                        for concurrency in concurrencies:
+                            result = {"name": name, **run_load(
+                                server.base_url, method, path, body, concurrency, args.requests)}
+                            run["endpoints"].append(result)
+                            latency = result["latency_ms"]
+                            print(f"  {name:<22} c={concurrency:<3} {result['rps']:>9} req/s  "
+                                  f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms"
+                                  f"{'  errors=' + str(result['errors']) if result['errors'] else ''}")
+                run["rss_mb_peak"] = round(max(sampler.peak, server.rss_bytes()) / 2**20, 1)
+                print(f"  startup {run['startup_seconds']}s, RSS {run['rss_mb_idle']} MB idle, "
+                      f"{run['rss_mb_peak']} MB peak")
+                report["runs"].append(run)
+            finally:
+                server.stop()
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    output_path = output_dir / f"{stamp}-{report['meta']['revision']}.json"
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nบันทึกผลที่ {output_path}")
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
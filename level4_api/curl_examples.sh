@@ -11,3 +11,28 @@ curl -s http://localhost:5000/api/v1/energy/regions/TH-NE | jq .
 echo ""
 echo "=== ดึงข้อมูลสรุป ==="
 curl -s http://localhost:5000/api/v1/energy/summary | jq .
+
+echo ""
+echo "=== ค้นหาแบบมีเงื่อนไข: ภาคกลาง+อีสาน ปี 2560-2566 เรียงตามการใช้ไฟฟ้า (หน้าละ 2) ==="
+curl -s "http://localhost:5000/api/v1/energy/regions?region=TH-C,TH-NE&year_from=2560&year_to=2566&sort=-consumption_gwh&limit=2" | jq .
+# หน้าถัดไป: ส่ง next_cursor กลับมาเป็น &cursor=... (ทุกรูปแบบมี header Link: <...>; rel="next" และ X-Next-Cursor)
+
+echo ""
+echo "=== สรุปรายภูมิภาค ปี 2566 ==="
+curl -s "http://localhost:5000/api/v1/energy/summary?year=2566&group_by=region" | jq .
+
+echo ""
+echo "=== ภาคอีสานในรูปแบบ XML / Turtle (content negotiation) ==="
+curl -s -H "Accept: application/xml" http://localhost:5000/api/v1/energy/regions/TH-NE
+curl -s "http://localhost:5000/api/v1/energy/regions/TH-NE?format=turtle"
+
+echo ""
+echo "=== Batch: หลายรายการใน request เดียว (ตอบเป็น NDJSON) ==="
+curl -s -X POST http://localhost:5000/api/v1/energy/batch \
+    -H "Content-Type: application/json" \
+    -d '{"requests": [{"op": "region", "code": "TH-NE"}, {"op": "region", "code": "TH-E"}, {"op": "summary"}]}'
+
+echo ""
+echo "=== Export ทั้งชุดเป็น CSV (บีบอัด gzip ระหว่างส่ง) ==="
+curl -s --compressed "http://localhost:5000/api/v1/energy/export?format=csv"
+# NDJSON: ?format=ndjson, Parquet: ?format=parquet -o energy_stats.parquet
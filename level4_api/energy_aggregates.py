@@ -0,0 +1,179 @@
+"""
+Energy Summary Aggregates
+Level 4: ผลรวมสำหรับ /api/v1/energy/summary ที่คำนวณไว้ล่วงหน้า
+
+เก็บผลรวมแยกตาม (ปี, group_by, ระดับข้อมูล) แล้วอัปเดตแบบ incremental
+เมื่อมี record ถูกเพิ่ม ลบ หรือแก้ไข - ไม่ต้องรวมข้อมูลใหม่ทั้งหมดทุก request
+
+ระดับข้อมูลของ record (ดูจาก field province / month):
+    region          ภูมิภาคทั้งปี
+    province        จังหวัดทั้งปี
+    region_month    ภูมิภาครายเดือน
+    province_month  จังหวัดรายเดือน
+
+การสรุปแต่ละแบบใช้ระดับข้อมูลที่หยาบที่สุดที่มีในปีนั้น เพื่อไม่ให้นับซ้ำ
+เช่น ถ้ามีทั้งข้อมูลภูมิภาคและจังหวัด ยอดรวมประเทศจะมาจากข้อมูลภูมิภาค
+"""
+
+GROUP_BYS = ("region", "province", "month")
+
+# ระดับข้อมูลที่ใช้ได้กับแต่ละ group_by เรียงจากหยาบไปละเอียด
+GROUP_LEVELS = {
+    None: ("region", "province", "region_month", "province_month"),
+    "region": ("region", "province", "region_month", "province_month"),
+    "province": ("province", "province_month"),
+    "month": ("region_month", "province_month"),
+}
+
+
+def record_level(record: dict) -> str:
+    """ระดับข้อมูลของ record"""
+    if record.get("province"):
+        return "province_month" if record.get("month") else "province"
+    return "region_month" if record.get("month") else "region"
+
+
+def _group_values(record: dict) -> dict:
+    """ค่าของแต่ละ group_by ที่ record นี้มี (None = ยอดรวม)"""
+    values = {None: None, "region": record["region_code"]}
+    if record.get("province"):
+        values["province"] = record["province"]
+    if record.get("month"):
+        values["month"] = int(record["month"])
+    return values
+
+
+class Aggregate:
+    """ผลรวมของกลุ่มหนึ่ง"""
+
+    __slots__ = ("count", "consumption_gwh", "customers", "growth_rate_sum")
+
+    def __init__(self):
+        self.count = 0
+        self.consumption_gwh = 0
+        self.customers = 0
+        self.growth_rate_sum = 0
+
+    def add(self, record: dict, sign: int = 1):
+        self.count += sign
+        self.consumption_gwh += sign * record["consumption_gwh"]
+        self.customers += sign * record["customers"]
+        self.growth_rate_sum += sign * record["growth_rate"]
+
+    def copy(self):
+        other = Aggregate()
+        other.count = self.count
+        other.consumption_gwh = self.consumption_gwh
+        other.customers = self.customers
+        other.growth_rate_sum = self.growth_rate_sum
+        return other
+
+    @property
+    def average_growth_rate(self):
+        if not self.count:
+            return 0
+        # ตัดเศษที่สะสมจากการบวก/ลบก่อน เพื่อให้ปัดเศษได้ผลเท่ากับการรวมใหม่ทั้งหมด
+        return round(round(self.growth_rate_sum, 9) / self.count, 2)
+
+
+class SummaryAggregates:
+    """ผลรวมทุกปี ทุก group_by (อัปเดตด้วย add/remove)"""
+
+    def __init__(self):
+        # (year, group_by, level) -> {group value: Aggregate}
+        self._buckets = {}
+
+    @classmethod
+    def build(cls, records) -> "SummaryAggregates":
+        aggregates = cls()
+        for record in records:
+            aggregates.add(record)
+        return aggregates
+
+    def copy(self) -> "SummaryAggregates":
+        """สำเนาสำหรับ snapshot ใหม่ (snapshot เดิมยังอ่านของเดิมได้)"""
+        other = SummaryAggregates()
+        other._buckets = {
+            bucket_key: {group: agg.copy() for group, agg in groups.items()}
+            for bucket_key, groups in self._buckets.items()
+        }
+        return other
+
+    def add(self, record: dict, sign: int = 1):
+        year = int(record["year"])
+        level = record_level(record)
+        for group_by, value in _group_values(record).items():
+            groups = self._buckets.setdefault((year, group_by, level), {})
+            aggregate = groups.get(value)
+            if aggregate is None:
+                aggregate = groups[value] = Aggregate()
+            aggregate.add(record, sign)
+            if aggregate.count == 0:
+                del groups[value]
+                if not groups:
+                    del self._buckets[(year, group_by, level)]
+
+    def remove(self, record: dict):
+        self.add(record, sign=-1)
+
+    def _groups(self, year: int, group_by):
+        """กลุ่มของระดับข้อมูลที่หยาบที่สุดที่มีในปีนั้น"""
+        for level in GROUP_LEVELS[group_by]:
+            groups = self._buckets.get((year, group_by, level))
+            if groups:
+                return groups
+        return {}
+
+    def summary(self, year: int, group_by: str = None) -> dict:
+        """ข้อมูลสรุปของปี (และแยกตาม group_by ถ้าระบุ)"""
+        total = self._groups(year, None).get(None) or Aggregate()
+        data = {
+            "year": year,
+            "total_consumption_gwh": _round(total.consumption_gwh),
+            "total_customers": total.customers,
+            "average_growth_rate": total.average_growth_rate,
+            "region_count": len(self._groups(year, "region"))
+        }
+
+        if group_by is not None:
+            groups = self._groups(year, group_by)
+            data["group_by"] = group_by
+            data["groups"] = [
+                {
+                    group_by: value,
+                    "consumption_gwh": _round(aggregate.consumption_gwh),
+                    "customers": aggregate.customers,
+                    "average_growth_rate": aggregate.average_growth_rate,
+                    "record_count": aggregate.count
+                }
+                for value, aggregate in sorted(groups.items())
+            ]
+
+        return data
+
+
+def _round(value):
+    # ผลรวมแบบ incremental (บวกแล้วลบ) อาจมีเศษทศนิยมสะสม
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def update_aggregates(previous, records, keys):
+    """
+    สร้าง SummaryAggregates ของข้อมูลชุดใหม่จาก snapshot เดิม
+    โดยปรับเฉพาะ record ที่ถูกเพิ่ม ลบ หรือแก้ไข
+    """
+    old = dict(zip(previous.keys, previous.records))
+    new = dict(zip(keys, records))
+
+    # มี key ซ้ำ - diff ตาม key ไม่ได้ ต้องคำนวณใหม่ทั้งหมด
+    if len(old) != len(previous.keys) or len(new) != len(keys):
+        return SummaryAggregates.build(records)
+
+    aggregates = previous.aggregates.copy()
+    for key, record in old.items():
+        if new.get(key) != record:
+            aggregates.remove(record)
+    for key, record in new.items():
+        if old.get(key) != record:
+            aggregates.add(record)
+    return aggregates
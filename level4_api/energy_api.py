@@ -0,0 +1,373 @@
+"""
+Energy Statistics API routes
+Level 4: Flask Blueprint ของ /api/v1/energy ใช้ร่วมกันระหว่าง
+level4_api/api_server.py และ docker/api_server.py
+
+การใช้งาน:
+    from energy_api import energy_api
+    app.register_blueprint(energy_api)
+
+Endpoints:
+    GET  /api/v1/energy/regions          - ดึงข้อมูลทุกภูมิภาค (filter/sort/แบ่งหน้า ดู energy_query.py)
+    GET  /api/v1/energy/regions/{code}   - ดึงข้อมูลภูมิภาคเดียว (?year=2566)
+    GET  /api/v1/energy/summary          - ดึงข้อมูลสรุป (?year=2566&group_by=region|province|month)
+    POST /api/v1/energy/batch            - ดึงหลายรายการใน request เดียว (ตอบเป็น NDJSON)
+    GET  /api/v1/energy/export           - ดาวน์โหลดทั้งชุดแบบ streaming (?format=ndjson|csv|parquet)
+    GET  /api/v1/energy/search           - ค้นหาด้วยความหมาย (?q=&k=5&region=TH-NE&year=2566, ดู energy_search.py)
+    GET  /api/v1/energy/search/stats     - throughput / latency / cache hit rate ของการค้นหา
+
+/regions, /regions/{code} และ /summary ตอบได้หลายรูปแบบตาม Accept header หรือ ?format=
+(json, xml, csv, turtle, arrow, parquet - ดู energy_formats.py)
+"""
+
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from energy_aggregates import GROUP_BYS
+from energy_export import ExportError, compress, export_stream, negotiate_encoding
+from energy_formats import FormatError, encoder, negotiate_format
+from energy_query import QueryError, iter_query, parse_query, run_query, wants_query
+from energy_search import SearchError, SearchIndex, SearchUnavailable, parse_search, run_search
+from energy_store import EnergyStore
+from response_cache import CachedBody, ResponseCache, SingleFlight, encode_json
+
+MAX_BATCH_ITEMS = 500
+
+# header ที่บอก cursor ของหน้าถัดไป (route เติม Link: <...>; rel="next" ให้ด้วย)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+energy_api = Blueprint("energy_api", __name__, url_prefix="/api/v1/energy")
+
+# Response ที่ encode เป็น bytes แล้ว พร้อม ETag (encode ใหม่เฉพาะเมื่อข้อมูลถูก reload)
+response_cache = ResponseCache()
+
+# query ที่ไม่ cache (filter/sort/แบ่งหน้า) - request ที่เหมือนกันและมาพร้อมกันคำนวณครั้งเดียว
+query_flight = SingleFlight()
+
+# ข้อมูลสถิติพลังงานไฟฟ้า โหลดจากไฟล์ Level 3/6 (ดู energy_store.py)
+# ถ้าไฟล์ถูกแก้ไข store จะ reload เองโดยไม่ต้อง restart server
+store = EnergyStore.from_env()
+
+# vector index จาก level6_ai_ready/prepare_data.py (โหลดเมื่อมีการค้นหาครั้งแรก)
+search_index = SearchIndex.from_env()
+
+
+@store.on_reload
+def clear_response_cache(snapshot):
+    """ล้าง response เก่าเมื่อข้อมูลถูก reload"""
+    response_cache.invalidate()
+    print(f"Reloaded {len(snapshot)} records from {snapshot.source}")
+
+
+def build_all_regions(snapshot):
+    """สร้าง payload ข้อมูลทุกภูมิภาค"""
+    return {
+        "status": "success",
+        "count": len(snapshot),
+        "data": list(snapshot.records)
+    }
+
+
+def build_region(record):
+    """สร้าง payload ข้อมูลภูมิภาคเดียว"""
+    return {
+        "status": "success",
+        "data": record
+    }
+
+
+def build_summary(snapshot, year, group_by=None):
+    """สร้าง payload ข้อมูลสรุป (ผลรวมคำนวณไว้แล้วใน snapshot.aggregates)"""
+    return {
+        "status": "success",
+        "data": snapshot.aggregates.summary(year, group_by)
+    }
+
+
+def error_body(message, **extra) -> CachedBody:
+    """Body ของ error (ไม่ cache)"""
+    return CachedBody(encode_json({"status": "error", "message": message, **extra}))
+
+
+def warm_cache():
+    """Encode response หลักล่วงหน้าตอน startup"""
+    snapshot = store.snapshot
+    lookup_regions(snapshot, {})
+    lookup_summary(snapshot)
+
+
+# ===========================================
+# Lookup: คืน (status, CachedBody) ใช้ทั้ง endpoint ปกติและ batch
+# fmt คือรูปแบบของ body (ดู energy_formats.py) - แต่ละรูปแบบ cache แยกกัน
+# error ตอบเป็น JSON เสมอ
+# ===========================================
+
+def cached(snapshot, key, render, kind, fmt="json"):
+    """body ที่ render ครั้งเดียวต่อ data version และต่อรูปแบบ"""
+    encode, mimetype = encoder(fmt, kind)
+    return response_cache.get((snapshot.version, fmt) + key, render, encode, mimetype)
+
+
+def query_key(args):
+    """key ของ query ที่ไม่ขึ้นกับลำดับ parameter (รองรับทั้ง MultiDict และ dict)"""
+    items = args.items(multi=True) if hasattr(args, "getlist") else args.items()
+    return tuple(sorted((name, str(value)) for name, value in items))
+
+
+def lookup_regions(snapshot, args, fmt="json"):
+    """ข้อมูลทุกภูมิภาค หรือผลของ query ถ้ามี filter/sort/แบ่งหน้า"""
+    # ข้อมูลจาก Parquet อาจมีหลายสิบล้านแถว - ตอบทีละหน้าเสมอ (ทั้งชุดใช้ /export)
+    if wants_query(args) or getattr(snapshot, "columnar", False):
+        try:
+            query = parse_query(args)
+        except QueryError as e:
+            return 400, error_body(str(e))
+
+        def render():
+            records, next_cursor = run_query(snapshot, query)
+            encode, mimetype = encoder(fmt, "regions")
+            # CSV/XML/Arrow/... ไม่มีที่ใส่ next_cursor ใน body - ส่งใน header ด้วยทุกรูปแบบ
+            return CachedBody(encode({
+                "status": "success",
+                "count": len(records),
+                "data": records,
+                "next_cursor": next_cursor
+            }), mimetype, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+        try:
+            return 200, query_flight.do((snapshot.version, fmt, query_key(args)), render)
+        except QueryError as e:
+            return 400, error_body(str(e))
+
+    return 200, cached(snapshot, ("regions",), lambda: build_all_regions(snapshot), "regions", fmt)
+
+
+def lookup_region(snapshot, region_code, year=None, fmt="json"):
+    """ข้อมูลภูมิภาคเดียว"""
+    region_code = str(region_code).upper()
+    record = snapshot.get_region(region_code, year)
+    if record is None:
+        return 404, error_body(
+            f"Region '{region_code}' not found", valid_codes=snapshot.region_codes
+        )
+    return 200, cached(
+        snapshot, ("region", region_code, year), lambda: build_region(record), "region", fmt
+    )
+
+
+def lookup_summary(snapshot, year=None, group_by=None, fmt="json"):
+    """ข้อมูลสรุป"""
+    year = snapshot.latest_year if year is None else year
+    if group_by is not None and group_by not in GROUP_BYS:
+        return 400, error_body(
+            f"Invalid group_by '{group_by}'. Must be one of {list(GROUP_BYS)}"
+        )
+    if year not in snapshot.years:
+        return 404, error_body(f"No data for year {year}", valid_years=snapshot.years)
+    return 200, cached(
+        snapshot, ("summary", year, group_by),
+        lambda: build_summary(snapshot, year, group_by), "summary", fmt
+    )
+
+
+# ===========================================
+# Routes
+# ===========================================
+
+def negotiated(lookup):
+    """เลือกรูปแบบจาก Accept / ?format= แล้วตอบด้วย body ที่ cache ไว้"""
+    try:
+        fmt = negotiate_format(request)
+    except FormatError as e:
+        status, body = 406, error_body(str(e))
+    else:
+        status, body = lookup(fmt)
+    response = response_cache.make_response(body, status)
+    response.headers["Vary"] = "Accept"
+    cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    if cursor:
+        response.headers["Link"] = f'<{next_page_url(cursor)}>; rel="next"'
+    return response
+
+
+def next_page_url(cursor: str) -> str:
+    """URL ของหน้าถัดไป: parameter เดิมของ request แต่เปลี่ยน cursor"""
+    args = [(name, value) for name, value in request.args.items(multi=True) if name != "cursor"]
+    return f"{request.base_url}?{urlencode(args + [('cursor', cursor)])}"
+
+
+def year_arg(args):
+    """?year= เป็น int (ไม่ระบุ = None) ค่าที่ไม่ใช่ตัวเลขเป็น QueryError แบบเดียวกับ parse_query"""
+    value = args.get("year")
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise QueryError(f"Invalid value for 'year': {value!r}")
+
+
+def invalid_request(error):
+    """ตอบ 400 (JSON) สำหรับ query parameter ที่ไม่ถูกต้อง"""
+    return response_cache.make_response(error_body(str(error)), 400)
+
+
+@energy_api.route("/regions")
+def get_all_regions():
+    """ดึงข้อมูลทุกภูมิภาค"""
+    args = request.args.copy()
+    args.pop("format", None)
+    return negotiated(lambda fmt: lookup_regions(store.snapshot, args, fmt))
+
+
+@energy_api.route("/regions/<region_code>")
+def get_region(region_code):
+    """ดึงข้อมูลภูมิภาคเดียว (?year= เลือกปี ค่าเริ่มต้นคือปีล่าสุด)"""
+    try:
+        year = year_arg(request.args)
+    except QueryError as e:
+        return invalid_request(e)
+    return negotiated(lambda fmt: lookup_region(store.snapshot, region_code, year, fmt))
+
+
+@energy_api.route("/summary")
+def get_summary():
+    """ดึงข้อมูลสรุป (?year= ค่าเริ่มต้นคือปีล่าสุด, ?group_by=region|province|month)"""
+    try:
+        year = year_arg(request.args)
+    except QueryError as e:
+        return invalid_request(e)
+    group_by = request.args.get("group_by") or None
+    return negotiated(lambda fmt: lookup_summary(store.snapshot, year, group_by, fmt))
+
+
+def run_batch_item(snapshot, item):
+    """ประมวลผลหนึ่งรายการของ batch คืน (status, CachedBody)"""
+    if not isinstance(item, dict):
+        return 400, error_body("Batch item must be an object")
+
+    op = item.get("op")
+    try:
+        if op == "regions":
+            return lookup_regions(snapshot, {
+                name: str(value) for name, value in (item.get("params") or {}).items()
+            })
+        if op == "region":
+            year = item.get("year")
+            return lookup_region(snapshot, item.get("code", ""), None if year is None else int(year))
+        if op == "summary":
+            year = item.get("year")
+            return lookup_summary(snapshot, None if year is None else int(year), item.get("group_by"))
+    except (TypeError, ValueError) as e:
+        return 400, error_body(f"Invalid batch item: {e}")
+
+    return 400, error_body(f"Unknown op '{op}'. Must be one of ['regions', 'region', 'summary']")
+
+
+@energy_api.route("/batch", methods=["POST"])
+def batch():
+    """
+    ดึงหลายรายการใน request เดียว
+
+    Body: {"requests": [{"op": "region", "code": "TH-NE", "year": 2566},
+                        {"op": "summary", "group_by": "region"},
+                        {"op": "regions", "params": {"region": "TH-C", "limit": 10}}]}
+
+    ตอบเป็น NDJSON ทีละบรรทัดตามลำดับ ส่งออกทันทีที่แต่ละรายการเสร็จ:
+        {"index": 0, "status": 200, "body": {...}}
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify({
+            "status": "error",
+            "message": "Body must be JSON: {\"requests\": [...]}"
+        }), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({
+            "status": "error",
+            "message": f"Too many batch items ({len(items)} > {MAX_BATCH_ITEMS})"
+        }), 400
+
+    # ทุกรายการใช้ snapshot เดียวกัน ผลจึงสอดคล้องกันแม้ข้อมูลถูก reload ระหว่างทาง
+    snapshot = store.snapshot
+
+    def generate():
+        for index, item in enumerate(items):
+            status, body = run_batch_item(snapshot, item)
+            # body เป็น JSON bytes อยู่แล้ว - ต่อเข้าไปตรงๆ ไม่ต้อง serialize ซ้ำ
+            yield b'{"index":%d,"status":%d,"body":%s}\n' % (index, status, body.body)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@energy_api.route("/export")
+def export():
+    """
+    ดาวน์โหลดข้อมูลทั้งชุดแบบ streaming (chunked) - หน่วยความจำของ server คงที่ไม่ว่าข้อมูลจะใหญ่แค่ไหน
+
+    ?format=ndjson|csv|parquet   (ค่าเริ่มต้น ndjson, csv ใช้คอลัมน์เดียวกับไฟล์ Level 2)
+    ?fields=region_code,year,... เลือกคอลัมน์
+    รองรับ filter และ sort เดียวกับ /regions (ไม่มี limit)
+    บีบอัด zstd / gzip ตาม Accept-Encoding (ยกเว้น Parquet ที่บีบอัดในตัวแล้ว)
+    """
+    snapshot = store.snapshot
+    fmt = request.args.get("format", "ndjson")
+    fields = None
+    if request.args.get("fields"):
+        fields = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+    elif fmt == "parquet":
+        fields = snapshot.fields
+
+    args = request.args.copy()
+    args.pop("limit", None)
+    try:
+        if wants_query(args):
+            records = (record for _, record in iter_query(snapshot, parse_query(args)))
+        else:
+            records = iter(snapshot.records)
+        chunks, mimetype, extension = export_stream(records, fmt, fields)
+    except (QueryError, ExportError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    encoding = "identity" if fmt == "parquet" else negotiate_encoding(request.accept_encodings)
+    response = Response(stream_with_context(compress(chunks, encoding)), mimetype=mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Content-Disposition"] = f'attachment; filename="energy_stats.{extension}"'
+    return response
+
+
+@energy_api.route("/search")
+def search():
+    """
+    ค้นหาข้อความของสถิติพลังงานด้วย vector index (semantic search)
+
+    ?q=ภาคอีสานใช้ไฟฟ้าเท่าไหร่   คำถาม (จำเป็น)
+    ?k=5                          จำนวนผลลัพธ์ (1-100)
+    ?region=TH-NE,TH-N&year=2566  filter ตาม metadata (คั่นหลายค่าด้วย ,)
+    """
+    try:
+        params = parse_search(request.args)
+        results = run_search(search_index, params)
+    except SearchError as e:
+        return response_cache.make_response(error_body(str(e)), 400)
+    except SearchUnavailable as e:
+        return response_cache.make_response(error_body(str(e)), 503)
+    return response_cache.make_response(CachedBody(encode_json({
+        "status": "success",
+        "query": params["query"],
+        "count": len(results),
+        "data": results
+    })))
+
+
+@energy_api.route("/search/stats")
+def search_stats():
+    """สถิติการค้นหาของ worker นี้ (throughput, latency p50/p95/p99, ขนาด batch, cache hit rate)"""
+    return jsonify({"status": "success", "data": search_index.stats()})
+
+
+warm_cache()
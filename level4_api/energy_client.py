@@ -0,0 +1,312 @@
+"""
+Energy Statistics API Client
+Level 4: Python client สำหรับ Energy Statistics API
+
+- ใช้ requests.Session + connection pool (ไม่เปิด TCP connection ใหม่ทุก call)
+- มี timeout และ retry (backoff) สำหรับ error ชั่วคราว
+- HTTP cache ในหน่วยความจำหรือบนดิสก์ ใช้ ETag / Cache-Control
+  (ข้อมูลไม่เปลี่ยน = server ตอบ 304 ไม่ต้องส่ง body ซ้ำ)
+- AsyncEnergyClient สำหรับดึงหลายภูมิภาคพร้อมกันด้วย asyncio
+- helper ที่คืน pandas DataFrame โดยตรง
+
+ก่อนใช้:
+    pip install requests
+    pip install pandas   (ถ้าต้องการ DataFrame)
+
+ตัวอย่าง:
+    from energy_client import EnergyClient, DiskCache
+
+    client = EnergyClient("http://localhost:5000", cache=DiskCache(".energy_cache"))
+    print(client.summary(group_by="region"))
+    df = client.regions_dataframe(year_from=2560, year_to=2566)
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "http://localhost:5000"
+DEFAULT_TIMEOUT = (3.05, 30)  # (connect, read) วินาที
+
+
+class EnergyAPIError(Exception):
+    """API ตอบกลับด้วย error"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+# ===========================================
+# HTTP cache
+# ===========================================
+
+class CacheEntry:
+    """Response ที่เก็บไว้: body, ETag และเวลาหมดอายุ"""
+
+    __slots__ = ("body", "etag", "expires")
+
+    def __init__(self, body: bytes, etag: str = None, expires: float = 0.0):
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+
+class MemoryCache:
+    """HTTP cache ในหน่วยความจำ (LRU ตามจำนวน entry)"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def set(self, url: str, entry: CacheEntry):
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class DiskCache:
+    """HTTP cache บนดิสก์ (หนึ่งไฟล์ต่อ URL) ใช้ร่วมกันข้ามการรัน ETL ได้"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{name}.json", self.directory / f"{name}.body"
+
+    def get(self, url: str):
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            return CacheEntry(body_path.read_bytes(), meta["etag"], meta["expires"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, url: str, entry: CacheEntry):
+        meta_path, body_path = self._paths(url)
+        # เขียนไฟล์ชั่วคราวแล้ว rename - process อื่นไม่เห็นไฟล์ที่เขียนไม่เสร็จ
+        for path, data in (
+            (body_path, entry.body),
+            (meta_path, json.dumps({"etag": entry.etag, "expires": entry.expires}).encode("utf-8")),
+        ):
+            tmp_path = path.with_suffix(path.suffix + f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+
+
+def _max_age(cache_control: str):
+    """แปลง Cache-Control เป็น (store ได้หรือไม่, max-age วินาที)"""
+    directives = {d.strip().lower() for d in cache_control.split(",") if d.strip()}
+    if "no-store" in directives:
+        return False, 0
+    if "no-cache" in directives:
+        return True, 0
+    for directive in directives:
+        match = re.fullmatch(r"(?:s-)?max-age=(\d+)", directive)
+        if match:
+            return True, int(match.group(1))
+    return True, 0
+
+
+# ===========================================
+# Client
+# ===========================================
+
+class EnergyClient:
+    """Client แบบ synchronous พร้อม connection pool, retry และ HTTP cache"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT,
+                 retries: int = 3, pool_maxsize: int = 20, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache if cache is not None else MemoryCache()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/json"
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- low level ---
+
+    def get_json(self, path: str, params: dict = None):
+        """GET แล้วคืน JSON ใช้ cache ถ้ายังสดอยู่ หรือ revalidate ด้วย If-None-Match"""
+        request = requests.Request(
+            "GET", f"{self.base_url}{path}",
+            params={k: v for k, v in (params or {}).items() if v is not None}
+        ).prepare()
+        url = request.url
+
+        entry = self.cache.get(url)
+        if entry is not None and entry.fresh:
+            return json.loads(entry.body)
+
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        storable, max_age = _max_age(response.headers.get("Cache-Control", ""))
+        if response.status_code == 304 and entry is not None:
+            entry.expires = time.time() + max_age
+            self.cache.set(url, entry)
+            return json.loads(entry.body)
+
+        data = self._check(response)
+        etag = response.headers.get("ETag")
+        if storable and (etag or max_age):
+            self.cache.set(url, CacheEntry(response.content, etag, time.time() + max_age))
+        return data
+
+    @staticmethod
+    def _check(response):
+        try:
+            data = response.json()
+        except ValueError:
+            raise EnergyAPIError(response.status_code, response.text[:200])
+        if response.status_code >= 400:
+            raise EnergyAPIError(response.status_code, data.get("message", response.reason))
+        return data
+
+    # --- endpoints ---
+
+    def regions(self, **params) -> list:
+        """ข้อมูลทุกภูมิภาค หรือหน้าเดียวของ query (ดู filter ใน energy_query.py)"""
+        return self.get_json("/api/v1/energy/regions", params)["data"]
+
+    def iter_regions(self, **params):
+        """วนทุก record ของ query โดยตาม next_cursor ไปจนหมด"""
+        params.setdefault("limit", 1000)
+        while True:
+            page = self.get_json("/api/v1/energy/regions", params)
+            yield from page["data"]
+            if not page.get("next_cursor"):
+                return
+            params = {**params, "cursor": page["next_cursor"]}
+
+    def region(self, region_code: str, year: int = None) -> dict:
+        """ข้อมูลภูมิภาคเดียว"""
+        return self.get_json(f"/api/v1/energy/regions/{region_code}", {"year": year})["data"]
+
+    def summary(self, year: int = None, group_by: str = None) -> dict:
+        """ข้อมูลสรุป"""
+        return self.get_json("/api/v1/energy/summary", {"year": year, "group_by": group_by})["data"]
+
+    def batch(self, items: list):
+        """ส่งหลายรายการใน request เดียว คืน iterator ของ (index, status, body) ตามที่ server stream มา"""
+        response = self.session.post(
+            f"{self.base_url}/api/v1/energy/batch",
+            json={"requests": items}, stream=True, timeout=self.timeout
+        )
+        if response.status_code != 200:
+            self._check(response)
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    result = json.loads(line)
+                    yield result["index"], result["status"], result["body"]
+
+    def regions_many(self, region_codes, year: int = None) -> dict:
+        """ดึงหลายภูมิภาคใน round trip เดียว (ผ่าน batch endpoint) คืน {code: record}"""
+        region_codes = list(region_codes)
+        items = [{"op": "region", "code": code, "year": year} for code in region_codes]
+        results = {}
+        for index, status, body in self.batch(items):
+            if status != 200:
+                raise EnergyAPIError(status, body.get("message", ""))
+            results[region_codes[index]] = body["data"]
+        return results
+
+    # --- pandas helpers ---
+
+    def regions_dataframe(self, **params):
+        """ผลของ query ทั้งหมด (ทุกหน้า) เป็น pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame.from_records(list(self.iter_regions(**params)))
+
+    def summary_dataframe(self, year: int = None, group_by: str = "region"):
+        """ข้อมูลสรุปแยกกลุ่มเป็น pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame.from_records(self.summary(year, group_by)["groups"])
+
+
+class AsyncEnergyClient:
+    """
+    Client แบบ asyncio สำหรับดึงหลายรายการพร้อมกัน
+
+    ทุก request วิ่งผ่าน connection pool และ cache ของ EnergyClient ตัวเดียวกัน
+    จำนวน request ที่ค้างพร้อมกันถูกจำกัดด้วย concurrency
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, concurrency: int = 16, **kwargs):
+        kwargs.setdefault("pool_maxsize", concurrency)
+        self.client = EnergyClient(base_url, **kwargs)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _call(self, func, *args, **kwargs):
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def region(self, region_code: str, year: int = None) -> dict:
+        return await self._call(self.client.region, region_code, year)
+
+    async def summary(self, year: int = None, group_by: str = None) -> dict:
+        return await self._call(self.client.summary, year, group_by)
+
+    async def regions(self, **params) -> list:
+        return await self._call(self.client.regions, **params)
+
+    async def fetch_regions(self, region_codes, years=(None,)) -> list:
+        """ดึงทุกคู่ (ภูมิภาค, ปี) พร้อมกัน คืน list ตามลำดับที่ขอ"""
+        tasks = [self.region(code, year) for code in region_codes for year in years]
+        return await asyncio.gather(*tasks)
+
+    async def close(self):
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,408 @@
+"""
+Columnar Energy Store (Parquet / Arrow)
+Level 4: ให้ API อ่านข้อมูลจากไฟล์ Parquet ผ่าน Arrow โดยตรง แทนการโหลดทุก record เป็น dict
+
+ใช้เมื่อ ENERGY_DATA_FILE ชี้ไปที่ไฟล์ .parquet (เช่นไฟล์จาก prepare_data.create_parquet())
+หรือโฟลเดอร์ Parquet แบบ Hive partition (เช่น year=2566/region_code=TH-C/...)
+
+- ไม่ถือข้อมูลไว้ในหน่วยความจำ: ทุก query อ่านเฉพาะคอลัมน์และ row group ที่ต้องใช้
+- filter ถูกแปลงเป็น Arrow expression แล้ว push down ไปที่ row group statistics / partition
+- sort + แบ่งหน้าใช้ top-k ทีละ batch (หน่วยความจำคงที่ไม่ขึ้นกับขนาดข้อมูล)
+- export ที่มี filter/sort เรียงแบบ external merge sort (run ชั่วคราวใน Arrow IPC)
+- /summary รวมผลด้วย Arrow group_by ครั้งเดียวต่อ (ปี, group_by) แล้ว cache ไว้
+
+รัน: pip install pyarrow
+     ENERGY_DATA_FILE=../level6_ai_ready/data/energy_stats.parquet python api_server.py
+"""
+
+import hashlib
+import heapq
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    raise ImportError("Parquet data files require pyarrow (pip install pyarrow)")
+
+from energy_aggregates import GROUP_LEVELS, Aggregate, SummaryAggregates
+from energy_export import CHUNK_RECORDS, PARQUET_TYPES
+
+# คอลัมน์ช่วยที่เติมค่าว่างของ key (province ว่าง = "", month ว่าง = 0) ให้ sort ได้เหมือน record_key()
+_PROVINCE_KEY = "__province_key"
+_MONTH_KEY = "__month_key"
+KEY_COLUMNS = ["region_code", _PROVINCE_KEY, "year", _MONTH_KEY]
+
+BATCH_ROWS = 65_536
+SORT_BUFFER_ROWS = 500_000  # iter_query: แถวที่เรียงในหน่วยความจำก่อนเขียน run ลงไฟล์ชั่วคราว
+
+
+def _schema(schema: "pa.Schema") -> "pa.Schema":
+    """แปลง schema ของไฟล์ให้ตรงกับ field ที่รู้จัก (dictionary -> ค่าจริง, month float -> int)"""
+    fields = []
+    for field in schema:
+        if field.name in PARQUET_TYPES:
+            field = field.with_type(pa.type_for_alias(PARQUET_TYPES[field.name]))
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def open_dataset(path: Path) -> "ds.Dataset":
+    """เปิดไฟล์หรือโฟลเดอร์ Parquet เป็น Arrow dataset (ยังไม่อ่านข้อมูล)"""
+    partitioning = "hive" if path.is_dir() else None
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+    return ds.dataset(path, format="parquet", partitioning=partitioning, schema=_schema(dataset.schema))
+
+
+def data_version(path: Path) -> str:
+    """version จากขนาดและเวลาแก้ไขของทุกไฟล์ (ไม่ต้องอ่านข้อมูลทั้งหมดมา hash)"""
+    files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+    digest = hashlib.blake2b(digest_size=8)
+    for file in files:
+        stat = file.stat()
+        digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _clean(row: dict) -> dict:
+    """แถวจาก Arrow -> record แบบเดียวกับไฟล์ JSON (ไม่มี field ที่เป็น null)"""
+    return {name: value for name, value in row.items() if value is not None and not name.startswith("__")}
+
+
+# ===========================================
+# Filter -> Arrow expression (push down)
+# ===========================================
+
+def _has(schema, name: str) -> bool:
+    return schema.get_field_index(name) != -1
+
+
+def _blank(schema, name: str, empty):
+    """expression: field ไม่มีค่า (null หรือเท่ากับ empty)"""
+    if not _has(schema, name):
+        return None
+    field = ds.field(name)
+    return field.is_null() | (field == empty)
+
+
+def _all(expressions):
+    result = None
+    for expression in expressions:
+        if expression is not None:
+            result = expression if result is None else result & expression
+    return result
+
+
+def query_filter(schema, query):
+    """แปลงเงื่อนไขของ EnergyQuery เป็น Arrow expression"""
+    expressions = []
+    if query.regions is not None:
+        expressions.append(ds.field("region_code").isin(sorted(query.regions)))
+    if query.provinces is not None:
+        if not _has(schema, "province"):
+            return ds.scalar(False)
+        expressions.append(ds.field("province").isin(sorted(query.provinces)))
+    if query.years is not None:
+        expressions.append(ds.field("year").isin(sorted(query.years)))
+
+    low, high = query.year_range
+    if low is not None:
+        expressions.append(ds.field("year") >= low)
+    if high is not None:
+        expressions.append(ds.field("year") <= high)
+    for field, (low, high) in query.ranges.items():
+        expressions.append(ds.field(field).is_valid())
+        if low is not None:
+            expressions.append(ds.field(field) >= low)
+        if high is not None:
+            expressions.append(ds.field(field) <= high)
+
+    # ตำแหน่ง cursor ตัด row group ที่อยู่ก่อนหน้าได้ทั้งก้อน (เงื่อนไขละเอียดตรวจใน _after_cursor)
+    if query.cursor is not None:
+        value = query.cursor[0]
+        column, bound = (query.sort, value) if query.sort != "key" else ("region_code", value[0])
+        expressions.append(ds.field(column) <= bound if query.descending else ds.field(column) >= bound)
+
+    return _all(expressions)
+
+
+def _with_keys(table: "pa.Table") -> "pa.Table":
+    """เติมคอลัมน์ช่วยของ record key"""
+    province = table["province"] if "province" in table.column_names else pa.nulls(table.num_rows, pa.string())
+    month = table["month"] if "month" in table.column_names else pa.nulls(table.num_rows, pa.int64())
+    table = table.append_column(_PROVINCE_KEY, pc.fill_null(province.cast(pa.string()), ""))
+    return table.append_column(_MONTH_KEY, pc.fill_null(month.cast(pa.int64()), 0))
+
+
+def _sort_columns(query):
+    return ([query.sort] if query.sort != "key" else []) + KEY_COLUMNS
+
+
+def _entry_values(query, entry):
+    value, key, _ = entry
+    return tuple(key) if query.sort == "key" else (value,) + tuple(key)
+
+
+def _after_cursor(table: "pa.Table", columns, values, descending: bool):
+    """mask ของแถวที่อยู่หลัง cursor ตามลำดับ sort (เทียบแบบ lexicographic)"""
+    compare = pc.less if descending else pc.greater
+    mask = None
+    for column, value in reversed(list(zip(columns, values))):
+        strict = compare(table[column], value)
+        mask = strict if mask is None else pc.or_(strict, pc.and_(pc.equal(table[column], value), mask))
+    return mask
+
+
+class ColumnarAggregates(SummaryAggregates):
+    """ผลรวมของ /summary คำนวณจาก Parquet ด้วย Arrow (ทีละปี) แทนการรวมทีละ record"""
+
+    def __init__(self, dataset):
+        super().__init__()
+        self._dataset = dataset
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: dict, sign: int = 1):
+        raise TypeError("ColumnarAggregates is read-only")
+
+    def _groups(self, year: int, group_by):
+        key = (year, group_by)
+        groups = self._cache.get(key)
+        if groups is None:
+            groups = self._compute(year, group_by)
+            with self._lock:
+                self._cache[key] = groups
+        return groups
+
+    def _compute(self, year: int, group_by):
+        schema = self._dataset.schema
+        columns = [name for name in ("region_code", "province", "month", "consumption_gwh",
+                                     "customers", "growth_rate") if _has(schema, name)]
+        table = _with_keys(self._dataset.to_table(filter=ds.field("year") == year, columns=columns))
+
+        has_province = pc.not_equal(table[_PROVINCE_KEY], "")
+        has_month = pc.not_equal(table[_MONTH_KEY], 0)
+        levels = {
+            "region": pc.and_(pc.invert(has_province), pc.invert(has_month)),
+            "province": pc.and_(has_province, pc.invert(has_month)),
+            "region_month": pc.and_(pc.invert(has_province), has_month),
+            "province_month": pc.and_(has_province, has_month),
+        }
+        column = {"region": "region_code", "province": "province", "month": _MONTH_KEY}.get(group_by)
+
+        for level in GROUP_LEVELS[group_by]:
+            rows = table.filter(levels[level])
+            if not rows.num_rows:
+                continue
+            if column is None:
+                return {None: _aggregate(
+                    rows.num_rows, pc.sum(rows["consumption_gwh"]).as_py(),
+                    pc.sum(rows["customers"]).as_py(), pc.sum(rows["growth_rate"]).as_py())}
+            grouped = rows.group_by(column).aggregate([
+                ("consumption_gwh", "sum"), ("customers", "sum"),
+                ("growth_rate", "sum"), ("region_code", "count"),
+            ])
+            return {
+                value: _aggregate(count, consumption, customers, growth)
+                for value, consumption, customers, growth, count in zip(
+                    grouped[column].to_pylist(), grouped["consumption_gwh_sum"].to_pylist(),
+                    grouped["customers_sum"].to_pylist(), grouped["growth_rate_sum"].to_pylist(),
+                    grouped["region_code_count"].to_pylist())
+            }
+        return {}
+
+
+def _aggregate(count, consumption, customers, growth_rate_sum) -> Aggregate:
+    aggregate = Aggregate()
+    aggregate.count = count
+    aggregate.consumption_gwh = consumption or 0
+    aggregate.customers = customers or 0
+    aggregate.growth_rate_sum = growth_rate_sum or 0
+    return aggregate
+
+
+class RecordStream:
+    """record ทั้งหมดแบบ stream ทีละ batch (ไม่สร้าง list ของทุก record)"""
+
+    def __init__(self, dataset, rows: int):
+        self._dataset = dataset
+        self._rows = rows
+
+    def __len__(self):
+        return self._rows
+
+    def __iter__(self):
+        for batch in self._dataset.to_batches(batch_size=CHUNK_RECORDS):
+            for row in batch.to_pylist():
+                yield _clean(row)
+
+
+class ColumnarSnapshot:
+    """
+    snapshot ที่อ่านจาก Parquet (interface เดียวกับ EnergySnapshot ที่ API ใช้)
+
+    columnar = True บอก energy_query / energy_api ให้ใช้ page() / iter_query() ของ snapshot นี้
+    """
+
+    columnar = True
+
+    def __init__(self, dataset, version: str, source: str = None):
+        self.dataset = dataset
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.schema = dataset.schema
+        self.fields = [name for name in self.schema.names]
+
+        self._rows = dataset.count_rows()
+        keys = dataset.to_table(columns=["region_code", "year"])
+        self.region_codes = pc.unique(keys["region_code"]).to_pylist()
+        self.years = sorted(pc.unique(keys["year"]).to_pylist())
+        self.latest_year = self.years[-1] if self.years else None
+        self.records = RecordStream(dataset, self._rows)
+        self.aggregates = ColumnarAggregates(dataset)
+
+    def __len__(self):
+        return self._rows
+
+    def get_region(self, region_code: str, year: int = None):
+        """record ระดับภูมิภาคของ region_code (ค่าเริ่มต้น: ปีล่าสุดที่มีข้อมูล)"""
+        expression = _all([
+            ds.field("region_code") == region_code,
+            None if year is None else ds.field("year") == year,
+            _blank(self.schema, "province", ""),
+            _blank(self.schema, "month", 0),
+        ])
+        table = self.dataset.to_table(filter=expression)
+        if not table.num_rows:
+            return None
+        if year is None:
+            table = table.filter(pc.equal(table["year"], pc.max(table["year"])))
+        return _clean(table.slice(table.num_rows - 1).to_pylist()[0])
+
+    def _scan(self, query):
+        """batch ที่ผ่าน filter (push down) พร้อมคอลัมน์ key และตัดแถวก่อน cursor แล้ว"""
+        columns = _sort_columns(query)
+        values = _entry_values(query, query.cursor) if query.cursor is not None else None
+        scanner = self.dataset.scanner(filter=query_filter(self.schema, query), batch_size=BATCH_ROWS)
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            table = _with_keys(pa.Table.from_batches([batch]))
+            if query.sort != "key":
+                table = table.filter(pc.is_valid(table[query.sort]))
+            if values is not None:
+                try:
+                    table = table.filter(_after_cursor(table, columns, values, query.descending))
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError):
+                    from energy_query import QueryError
+                    raise QueryError("Cursor does not match the requested sort order")
+            if table.num_rows:
+                yield table
+
+    def _sort_keys(self, query):
+        order = "descending" if query.descending else "ascending"
+        return [(column, order) for column in _sort_columns(query)]
+
+    def _entry(self, query, row: dict):
+        key = (row["region_code"], row[_PROVINCE_KEY], row["year"], row[_MONTH_KEY])
+        return (key if query.sort == "key" else row[query.sort], key, 0)
+
+    def page(self, query):
+        """หนึ่งหน้าของ query: (records, entry ของ record สุดท้ายถ้ามีหน้าถัดไป ไม่เช่นนั้น None)"""
+        k = query.limit + 1
+        sort_keys = self._sort_keys(query)
+        best = None
+        for table in self._scan(query):
+            # เก็บเฉพาะ k แถวแรกตามลำดับ sort ของแต่ละ batch (top-k)
+            if table.num_rows > k:
+                table = table.take(pc.select_k_unstable(table, k, sort_keys))
+            best = table if best is None else pa.concat_tables([best, table])
+            if best.num_rows > 4 * k:
+                best = best.take(pc.select_k_unstable(best, k, sort_keys))
+
+        if best is None:
+            return [], None
+        rows = best.sort_by(sort_keys).slice(0, k).to_pylist()
+        page = rows[:query.limit]
+        last_entry = self._entry(query, page[-1]) if len(rows) > query.limit else None
+        return [_clean(row) for row in page], last_entry
+
+    def iter_query(self, query):
+        """
+        (entry, record) ทุกตัวที่ผ่านเงื่อนไข เรียงตาม sort (ใช้กับ export)
+
+        external merge sort: เรียงทีละไม่เกิน SORT_BUFFER_ROWS แถวในหน่วยความจำ ถ้าเกินเขียนเป็นไฟล์
+        Arrow IPC ชั่วคราว (run) แล้ว merge ทีละแถวตอนส่ง - หน่วยความจำคงที่ไม่ขึ้นกับขนาดผลลัพธ์
+        scan ทั้งหมดก่อนคืน iterator (error ของ query เกิดก่อนเริ่มส่ง response)
+        """
+        sort_keys = self._sort_keys(query)
+        spill = _SortSpill()
+        buffered, rows = [], 0
+        for table in self._scan(query):
+            buffered.append(table)
+            rows += table.num_rows
+            if rows >= SORT_BUFFER_ROWS:
+                spill.add(pa.concat_tables(buffered).sort_by(sort_keys))
+                buffered, rows = [], 0
+        last = pa.concat_tables(buffered).sort_by(sort_keys) if buffered else None
+
+        def records(table):
+            for batch in table.to_batches(max_chunksize=CHUNK_RECORDS):
+                yield from batch.to_pylist()
+
+        def walk():
+            if not spill.runs:
+                rows = records(last) if last is not None else ()
+            else:
+                runs = [spill.read(run) for run in spill.runs] + ([records(last)] if last is not None else [])
+                columns = _sort_columns(query)
+                rows = heapq.merge(*runs, key=lambda row: tuple(row[column] for column in columns),
+                                   reverse=query.descending)
+            try:
+                for row in rows:
+                    yield self._entry(query, row), _clean(row)
+            finally:
+                spill.close()
+
+        return walk()
+
+
+class _SortSpill:
+    """ไฟล์ชั่วคราวของ run ที่เรียงแล้วของ iter_query (ลบตอน close หรือเมื่อไม่มีใครอ้างถึงแล้ว)"""
+
+    def __init__(self):
+        self.runs = []
+        self._directory = None
+
+    def add(self, table: "pa.Table"):
+        if self._directory is None:
+            self._directory = tempfile.TemporaryDirectory(prefix="energy-export-")
+        path = Path(self._directory.name) / f"run{len(self.runs)}.arrow"
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=CHUNK_RECORDS):
+                writer.write_batch(batch)
+        self.runs.append(path)
+
+    def read(self, path: Path):
+        """แถวของ run ทีละ batch (memory map - ไม่โหลดทั้งไฟล์)"""
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield from reader.get_batch(i).to_pylist()
+
+    def close(self):
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+
+
+def load_columnar_snapshot(path: Path) -> ColumnarSnapshot:
+    """เปิดไฟล์/โฟลเดอร์ Parquet เป็น snapshot"""
+    return ColumnarSnapshot(open_dataset(path), version=data_version(path), source=str(path))
@@ -0,0 +1,188 @@
+"""
+Energy Data Export
+Level 4: stream ข้อมูลทั้งชุดเป็น NDJSON / CSV / Parquet ทีละ chunk
+
+ทุกรูปแบบเป็น generator - server ส่งข้อมูลออกไปทีละ chunk (chunked transfer encoding)
+โดยไม่ต้องสร้างไฟล์ทั้งก้อนในหน่วยความจำ และบีบอัด gzip / zstd ระหว่างทางได้
+
+Parquet ต้องใช้ pyarrow, zstd ต้องใช้ zstandard (ไม่มีจะใช้ gzip แทน)
+"""
+
+import csv
+import io
+import json
+import zlib
+
+CHUNK_RECORDS = 1000
+
+# คอลัมน์เดียวกับ level2_structured/energy_stats_2566.csv
+CSV_COLUMNS = ["region_th", "region_en", "consumption_gwh", "customers", "growth_rate", "year"]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "jsonl"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+# ชนิดข้อมูลของ field ที่รู้จัก (ตรงกับ level6_ai_ready/schema.json) สำหรับ Parquet
+PARQUET_TYPES = {
+    "region_code": "string", "province": "string",
+    "region_th": "string", "region_en": "string",
+    "year": "int64", "month": "int64",
+    "consumption_gwh": "float64", "customers": "int64", "growth_rate": "float64",
+    "consumption_per_capita": "float64", "avg_monthly_bill": "float64",
+    "population": "int64", "text_description": "string",
+    # คอลัมน์ของข้อมูลสรุป (/summary)
+    "total_consumption_gwh": "float64", "total_customers": "int64",
+    "average_growth_rate": "float64", "region_count": "int64", "record_count": "int64",
+}
+
+
+class ExportError(ValueError):
+    """ขอ export ในรูปแบบที่ทำไม่ได้"""
+    pass
+
+
+def _chunks(records, size: int = CHUNK_RECORDS):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_ndjson(records, fields=None):
+    """NDJSON หนึ่ง record ต่อบรรทัด"""
+    for chunk in _chunks(records):
+        if fields:
+            chunk = [{field: record.get(field) for field in fields} for record in chunk]
+        yield "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in chunk
+        ).encode("utf-8")
+
+
+def iter_csv(records, fields=None):
+    """CSV พร้อม header (ค่าเริ่มต้นใช้คอลัมน์เดียวกับไฟล์ Level 2)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields or CSV_COLUMNS,
+                            extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for chunk in _chunks(records):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """file-like ที่เก็บ bytes ที่ถูกเขียนไว้ให้ generator ดึงออกไปส่งต่อ"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def arrow_table(rows, fields):
+    """สร้าง pyarrow.Table จาก list ของ dict ตาม schema ของ field ที่รู้จัก"""
+    import pyarrow as pa
+
+    schema = pa.schema([(field, PARQUET_TYPES.get(field, "string")) for field in fields])
+    text_fields = {field for field in fields if PARQUET_TYPES.get(field, "string") == "string"}
+    columns = {
+        field: [_arrow_value(row.get(field), field in text_fields) for row in rows]
+        for field in fields
+    }
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def _arrow_value(value, is_text: bool):
+    # field ที่ไม่รู้จักถูกเก็บเป็น string (ค่าที่ไม่ใช่ string แปลงเป็น JSON)
+    if is_text and value is not None and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def iter_parquet(records, fields):
+    """
+    Parquet: หนึ่ง row group ต่อ chunk ส่งออกทันทีที่เขียนเสร็จ
+    fields ต้องระบุครบทุกคอลัมน์ (schema ต้องรู้ตั้งแต่ row group แรก)
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = arrow_table([], fields).schema
+
+    def generate():
+        sink = _ChunkSink()
+        with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+            for chunk in _chunks(records, CHUNK_RECORDS * 10):
+                writer.write_table(arrow_table(chunk, fields))
+                yield sink.drain()
+        yield sink.drain()
+
+    return generate()
+
+
+def negotiate_encoding(accept_encoding) -> str:
+    """เลือก Content-Encoding จาก Accept-Encoding: zstd > gzip > ไม่บีบอัด"""
+    if accept_encoding["zstd"]:
+        try:
+            import zstandard  # noqa: F401
+            return "zstd"
+        except ImportError:
+            pass
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def compress(chunks, encoding: str):
+    """บีบอัด stream ของ bytes ทีละ chunk"""
+    if encoding == "identity":
+        yield from chunks
+        return
+
+    if encoding == "zstd":
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip header
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(records, fmt: str, fields=None):
+    """คืน (generator ของ bytes, mimetype, นามสกุลไฟล์)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'. Must be one of {list(EXPORT_FORMATS)}")
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    writers = {"ndjson": iter_ndjson, "csv": iter_csv, "parquet": iter_parquet}
+    return writers[fmt](records, fields), mimetype, extension
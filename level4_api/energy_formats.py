@@ -0,0 +1,257 @@
+"""
+Energy Response Formats
+Level 4: แสดง resource เดียวกันได้หลายรูปแบบตาม Accept header (content negotiation)
+
+    application/json                     - ค่าเริ่มต้น
+    application/xml                      - รูปแบบเดียวกับ level3_open_format/energy_stats_2566.xml
+    text/csv                             - คอลัมน์เดียวกับ level2_structured/energy_stats_2566.csv
+    text/turtle                          - RDF แบบ level5_linked_data/energy_stats_2566.ttl
+    application/vnd.apache.arrow.stream  - Arrow IPC stream (ต้องใช้ pyarrow)
+    application/vnd.apache.parquet       - Parquet (ต้องใช้ pyarrow)
+
+เลือกรูปแบบด้วย ?format=json|xml|csv|turtle|arrow|parquet ได้ด้วย (มีผลเหนือ Accept)
+body ของแต่ละรูปแบบถูก render ครั้งเดียวต่อ data version แล้ว cache ใน ResponseCache
+"""
+
+import io
+from xml.sax.saxutils import escape, quoteattr
+
+from energy_export import CSV_COLUMNS, arrow_table, iter_csv
+from response_cache import encode_json
+
+FORMATS = {
+    "json": "application/json",
+    "xml": "application/xml",
+    "csv": "text/csv",
+    "turtle": "text/turtle",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+TURTLE_PREFIXES = """\
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix energy: <http://data.go.th/def/energy/> .
+@prefix region: <http://data.go.th/resource/region/> .
+@prefix stat: <http://data.go.th/resource/energy-stat/> .
+
+"""
+
+
+class FormatError(ValueError):
+    """รูปแบบที่ขอไม่รองรับ"""
+    pass
+
+
+def negotiate_format(request) -> str:
+    """เลือกรูปแบบจาก ?format= หรือ Accept header (ค่าเริ่มต้น json)"""
+    fmt = request.args.get("format")
+    if fmt:
+        if fmt not in FORMATS:
+            raise FormatError(f"Unknown format '{fmt}'. Must be one of {list(FORMATS)}")
+    else:
+        mimetype = request.accept_mimetypes.best_match(list(FORMATS.values()), default=FORMATS["json"])
+        fmt = next(name for name, candidate in FORMATS.items() if candidate == mimetype)
+
+    if fmt in ("arrow", "parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise FormatError("Arrow/Parquet output requires pyarrow (pip install pyarrow)")
+    return fmt
+
+
+# ===========================================
+# Rows: แปลง resource เป็นตาราง (ใช้กับ CSV / Arrow / Parquet)
+# ===========================================
+
+def _rows(kind: str, data):
+    if kind == "regions":
+        return list(data)
+    if kind == "region":
+        return [data]
+    # summary: แยกกลุ่มถ้ามี group_by ไม่เช่นนั้นเป็นแถวเดียวของยอดรวม
+    if "groups" in data:
+        return [{"year": data["year"], **group} for group in data["groups"]]
+    return [{key: value for key, value in data.items() if key != "groups"}]
+
+
+def _fields(rows):
+    return list(dict.fromkeys(field for row in rows for field in row))
+
+
+def render_csv(kind: str, data) -> bytes:
+    rows = _rows(kind, data)
+    fields = CSV_COLUMNS if kind != "summary" else _fields(rows)
+    return b"".join(iter_csv(rows, fields))
+
+
+def _arrow(kind: str, data):
+    rows = _rows(kind, data)
+    return arrow_table(rows, _fields(rows))
+
+
+def render_arrow(kind: str, data) -> bytes:
+    import pyarrow as pa
+
+    table = _arrow(kind, data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render_parquet(kind: str, data) -> bytes:
+    import pyarrow.parquet as pq
+
+    table = _arrow(kind, data)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+# ===========================================
+# XML (โครงสร้างเดียวกับไฟล์ Level 3)
+# ===========================================
+
+def _xml_region(record: dict, indent: str = "    ") -> str:
+    attributes = f"code={quoteattr(record['region_code'])}"
+    for name in ("province", "month"):
+        if record.get(name):
+            attributes += f" {name}={quoteattr(str(record[name]))}"
+
+    lines = [f"{indent}<region {attributes}>"]
+    for lang in ("th", "en"):
+        if record.get(f"region_{lang}"):
+            lines.append(f'{indent}    <name lang="{lang}">{escape(record[f"region_{lang}"])}</name>')
+    for field, tag in (("year", "year"), ("consumption_gwh", "consumptionGWh"),
+                       ("customers", "customers"), ("growth_rate", "growthRate")):
+        if record.get(field) is not None:
+            lines.append(f"{indent}    <{tag}>{record[field]}</{tag}>")
+    lines.append(f"{indent}</region>")
+    return "\n".join(lines)
+
+
+def _xml_summary(data: dict) -> str:
+    lines = [f'    <summary year="{data["year"]}">']
+    for field, tag in (("total_consumption_gwh", "totalConsumptionGWh"),
+                       ("total_customers", "totalCustomers"),
+                       ("average_growth_rate", "averageGrowthRate"),
+                       ("region_count", "regionCount")):
+        lines.append(f"        <{tag}>{data[field]}</{tag}>")
+    if "groups" in data:
+        group_by = data["group_by"]
+        lines.append(f'        <groups by="{group_by}">')
+        for group in data["groups"]:
+            lines.append(
+                f"            <group key={quoteattr(str(group[group_by]))}>"
+                f"<consumptionGWh>{group['consumption_gwh']}</consumptionGWh>"
+                f"<customers>{group['customers']}</customers>"
+                f"<averageGrowthRate>{group['average_growth_rate']}</averageGrowthRate>"
+                f"</group>"
+            )
+        lines.append("        </groups>")
+    lines.append("    </summary>")
+    return "\n".join(lines)
+
+
+def render_xml(kind: str, data) -> bytes:
+    if kind == "regions":
+        body = "    <regions>\n" + "\n\n".join(_xml_region(r, "        ") for r in data) + "\n    </regions>"
+    elif kind == "region":
+        body = _xml_region(data)
+    else:
+        body = _xml_summary(data)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<energyStatistics>\n'
+        + body + "\n</energyStatistics>\n"
+    ).encode("utf-8")
+
+
+# ===========================================
+# Turtle (คำศัพท์เดียวกับไฟล์ Level 5)
+# ===========================================
+
+def _literal(value) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _stat_id(record: dict) -> str:
+    parts = [str(record["year"]), record["region_code"]]
+    if record.get("province"):
+        parts.append(str(record["province"]).replace(" ", "_"))
+    if record.get("month"):
+        parts.append(f"{int(record['month']):02d}")
+    return "stat:" + "-".join(parts)
+
+
+def _turtle_stat(record: dict) -> str:
+    lines = [
+        _stat_id(record),
+        "    a energy:EnergyConsumptionStat ;",
+        f"    energy:region region:{record['region_code']} ;",
+        f'    energy:year "{record["year"]}"^^xsd:gYear ;',
+    ]
+    if record.get("province"):
+        lines.append(f"    energy:province {_literal(record['province'])}@th ;")
+    if record.get("month"):
+        lines.append(f'    energy:month "--{int(record["month"]):02d}"^^xsd:gMonth ;')
+    lines += [
+        f'    energy:consumptionGWh "{record["consumption_gwh"]}"^^xsd:decimal ;',
+        f'    energy:numberOfCustomers "{record["customers"]}"^^xsd:integer ;',
+        f'    energy:growthRate "{record["growth_rate"]}"^^xsd:decimal ;',
+        f"    dct:isPartOf <http://data.go.th/dataset/energy-consumption-{record['year']}> .",
+    ]
+    return "\n".join(lines)
+
+
+def _turtle_summary(data: dict) -> str:
+    subject = f"stat:summary-{data['year']}"
+    lines = [
+        subject,
+        "    a energy:EnergyConsumptionSummary ;",
+        f'    energy:year "{data["year"]}"^^xsd:gYear ;',
+        f'    energy:totalConsumptionGWh "{data["total_consumption_gwh"]}"^^xsd:decimal ;',
+        f'    energy:totalCustomers "{data["total_customers"]}"^^xsd:integer ;',
+        f'    energy:averageGrowthRate "{data["average_growth_rate"]}"^^xsd:decimal ;',
+        f'    energy:regionCount "{data["region_count"]}"^^xsd:integer .',
+    ]
+    for group in data.get("groups", []):
+        key = str(group[data["group_by"]]).replace(" ", "_")
+        lines += [
+            "",
+            f"{subject}-{data['group_by']}-{key}",
+            "    a energy:EnergyConsumptionSummary ;",
+            f"    dct:isPartOf {subject} ;",
+            f"    energy:{data['group_by']} {_literal(group[data['group_by']])} ;",
+            f'    energy:totalConsumptionGWh "{group["consumption_gwh"]}"^^xsd:decimal ;',
+            f'    energy:totalCustomers "{group["customers"]}"^^xsd:integer ;',
+            f'    energy:averageGrowthRate "{group["average_growth_rate"]}"^^xsd:decimal .',
+        ]
+    return "\n".join(lines)
+
+
+def render_turtle(kind: str, data) -> bytes:
+    if kind == "summary":
+        body = _turtle_summary(data)
+    else:
+        records = data if kind == "regions" else [data]
+        body = "\n\n".join(_turtle_stat(record) for record in records)
+    return (TURTLE_PREFIXES + body + "\n").encode("utf-8")
+
+
+RENDERERS = {
+    "xml": render_xml,
+    "csv": render_csv,
+    "turtle": render_turtle,
+    "arrow": render_arrow,
+    "parquet": render_parquet,
+}
+
+
+def encoder(fmt: str, kind: str):
+    """คืน (ฟังก์ชัน encode payload -> bytes, mimetype) สำหรับ ResponseCache"""
+    if fmt == "json":
+        return encode_json, FORMATS["json"]
+    render = RENDERERS[fmt]
+    return (lambda payload: render(kind, payload["data"])), FORMATS[fmt]
@@ -0,0 +1,248 @@
+"""
+Energy Query
+Level 4: filter, sort และแบ่งหน้า (cursor pagination) บน EnergySnapshot
+
+ทุก filter ใช้ index ที่สร้างไว้ตอนโหลดข้อมูล (ดู energy_store.py)
+    - region / province / year  -> hash index
+    - year_from / year_to, min_* / max_*  -> sorted index + bisect
+filter ที่เลือกได้น้อยที่สุดจะถูกใช้เป็นตัวตั้ง แล้วตรวจเงื่อนไขที่เหลือเฉพาะ record เหล่านั้น
+snapshot ที่อ่านจาก Parquet (columnar) ใช้ Arrow expression + top-k แทน (ดู energy_columnar.py)
+
+Query parameters:
+    region=TH-C,TH-NE          province=เชียงใหม่,ลำปาง
+    year=2565,2566             year_from=2560&year_to=2566
+    min_consumption_gwh=20000  max_growth_rate=3.5  min_customers=...
+    sort=-consumption_gwh      limit=100  cursor=<next_cursor จากหน้าก่อน>
+"""
+
+import base64
+import bisect
+import json
+
+from energy_store import SORTED_FIELDS
+
+RANGE_FIELDS = ["consumption_gwh", "growth_rate", "customers"]
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# parameter ที่ทำให้ /regions ต้อง query แทนการส่งข้อมูลทั้งหมด
+QUERY_PARAMS = (
+    {"region", "province", "year", "year_from", "year_to", "sort", "limit", "cursor"}
+    | {f"min_{field}" for field in RANGE_FIELDS}
+    | {f"max_{field}" for field in RANGE_FIELDS}
+)
+
+
+class QueryError(ValueError):
+    """Query parameter ไม่ถูกต้อง"""
+    pass
+
+
+class EnergyQuery:
+    """เงื่อนไขของ query ที่ parse แล้ว"""
+
+    def __init__(self, regions=None, provinces=None, years=None,
+                 year_range=(None, None), ranges=None,
+                 sort="key", descending=False, limit=DEFAULT_LIMIT, cursor=None):
+        self.regions = regions
+        self.provinces = provinces
+        self.years = years
+        self.year_range = year_range
+        self.ranges = ranges or {}
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.cursor = cursor
+
+
+def wants_query(args) -> bool:
+    """มี query parameter ใดๆ หรือไม่"""
+    return any(name in QUERY_PARAMS for name in args)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _number(args, name, cast=float):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise QueryError(f"Invalid value for '{name}': {value!r}")
+
+
+def parse_query(args) -> EnergyQuery:
+    """แปลง request.args เป็น EnergyQuery"""
+    regions = {code.upper() for code in _split(args["region"])} if "region" in args else None
+    provinces = set(_split(args["province"])) if "province" in args else None
+
+    years = None
+    if "year" in args:
+        try:
+            years = {int(year) for year in _split(args["year"])}
+        except ValueError:
+            raise QueryError(f"Invalid value for 'year': {args['year']!r}")
+
+    year_range = (_number(args, "year_from", int), _number(args, "year_to", int))
+
+    ranges = {}
+    for field in RANGE_FIELDS:
+        cast = int if field == "customers" else float
+        low, high = _number(args, f"min_{field}", cast), _number(args, f"max_{field}", cast)
+        if low is not None or high is not None:
+            ranges[field] = (low, high)
+
+    sort = args.get("sort", "key")
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort != "key" and sort not in SORTED_FIELDS:
+        raise QueryError(f"Cannot sort by '{sort}'. Must be one of {['key'] + SORTED_FIELDS}")
+
+    limit = _number(args, "limit", int)
+    if limit is None:
+        limit = DEFAULT_LIMIT
+    elif not 1 <= limit <= MAX_LIMIT:
+        raise QueryError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    return EnergyQuery(regions, provinces, years, year_range, ranges,
+                       sort, descending, limit, cursor)
+
+
+def _tuples(value):
+    """แปลง list ที่ได้จาก JSON กลับเป็น tuple (ซ้อนได้) เพื่อเทียบกับ index"""
+    if isinstance(value, list):
+        return tuple(_tuples(item) for item in value)
+    return value
+
+
+def encode_cursor(entry: tuple) -> str:
+    """เข้ารหัสตำแหน่งสุดท้ายของหน้า (value, key, position) เป็น cursor"""
+    raw = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        entry = _tuples(json.loads(raw))
+        if not isinstance(entry, tuple) or len(entry) != 3:
+            raise ValueError
+        return entry
+    except ValueError:
+        raise QueryError("Invalid cursor")
+
+
+def _candidates(snapshot, query):
+    """เลือก filter ที่ได้ชุด record เล็กที่สุดเป็นตัวตั้ง คืน list ตำแหน่ง หรือ None (ทุก record)"""
+    options = []
+
+    if query.regions is not None:
+        index = snapshot.positions["region_code"]
+        options.append([pos for code in query.regions for pos in index.get(code, [])])
+    if query.provinces is not None:
+        index = snapshot.positions["province"]
+        options.append([pos for name in query.provinces for pos in index.get(name, [])])
+    if query.years is not None:
+        index = snapshot.positions["year"]
+        options.append([pos for year in query.years for pos in index.get(year, [])])
+    if query.year_range != (None, None):
+        options.append(snapshot.range_positions("year", *query.year_range))
+    for field, (low, high) in query.ranges.items():
+        options.append(snapshot.range_positions(field, low, high))
+
+    if not options:
+        return None
+    return min(options, key=len)
+
+
+def _matcher(query):
+    """ฟังก์ชันตรวจว่า record ผ่านทุกเงื่อนไขหรือไม่"""
+    def in_range(value, bounds):
+        low, high = bounds
+        return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+    def matches(record):
+        if query.regions is not None and record["region_code"] not in query.regions:
+            return False
+        if query.provinces is not None and record.get("province") not in query.provinces:
+            return False
+        if query.years is not None and record["year"] not in query.years:
+            return False
+        if query.year_range != (None, None) and not in_range(record["year"], query.year_range):
+            return False
+        for field, bounds in query.ranges.items():
+            if not in_range(record.get(field), bounds):
+                return False
+        return True
+
+    return matches
+
+
+def iter_query(snapshot, query: EnergyQuery):
+    """
+    iterator ของ (entry, record) ทุกตัวที่ผ่านเงื่อนไข เรียงตาม sort และเริ่มหลัง cursor
+    (ไม่สนใจ limit - ใช้ได้ทั้งการแบ่งหน้าและการ export ทั้งชุด)
+    """
+    if getattr(snapshot, "columnar", False):
+        return snapshot.iter_query(query)
+
+    index = snapshot.sorted_index[query.sort]
+    candidates = _candidates(snapshot, query)
+    matches = _matcher(query)
+
+    if candidates is not None and len(candidates) < len(index) // 4:
+        # ชุดตั้งต้นเล็ก - เรียงเฉพาะ record ที่ผ่าน filter
+        records = snapshot.records
+        entries = sorted(
+            (records[pos][query.sort] if query.sort != "key" else snapshot.keys[pos],
+             snapshot.keys[pos], pos)
+            for pos in candidates
+            if matches(records[pos]) and (query.sort == "key" or records[pos].get(query.sort) is not None)
+        )
+        check = None
+    else:
+        # ชุดตั้งต้นใหญ่ - เดินตาม sorted index แล้วตรวจเงื่อนไขทีละ record
+        entries = index
+        check = matches
+
+    # หาจุดเริ่มหลัง cursor ทันที (error ต้องเกิดก่อนเริ่มส่ง response)
+    try:
+        if query.descending:
+            start = len(entries) if query.cursor is None else bisect.bisect_left(entries, query.cursor)
+            positions = range(start - 1, -1, -1)
+        else:
+            start = 0 if query.cursor is None else bisect.bisect_right(entries, query.cursor)
+            positions = range(start, len(entries))
+    except TypeError:
+        raise QueryError("Cursor does not match the requested sort order")
+
+    def walk():
+        for i in positions:
+            entry = entries[i]
+            record = snapshot.records[entry[2]]
+            if check is None or check(record):
+                yield entry, record
+
+    return walk()
+
+
+def run_query(snapshot, query: EnergyQuery):
+    """คืน (records ในหน้านี้, next_cursor หรือ None) - keyset pagination"""
+    if getattr(snapshot, "columnar", False):
+        page, last_entry = snapshot.page(query)
+        return page, encode_cursor(last_entry) if last_entry is not None else None
+
+    page = []
+    last_entry = None
+    for entry, record in iter_query(snapshot, query):
+        if len(page) == query.limit:
+            return page, encode_cursor(last_entry)
+        page.append(record)
+        last_entry = entry
+
+    return page, None
@@ -0,0 +1,194 @@
+"""
+Energy Semantic Search
+Level 4: ค้นหาข้อความของสถิติพลังงานด้วย vector index ที่ Level 6 สร้างไว้
+
+prepare_data.py สร้าง embeddings + index ใน level6_ai_ready/data/embeddings/
+(ดู level6_ai_ready/vector_index.py) API โหลด index แบบ memory-map ตอน request แรก
+จึงตอบได้ทันทีโดยไม่ต้องสร้าง index ใหม่ และโหลดใหม่เองเมื่อ prepare_data รันอีกครั้ง
+
+คำถามผ่าน RetrievalService (level6_ai_ready/retrieval.py): request ที่เข้ามาพร้อมกัน
+ถูกรวมเป็น batch เดียว และ vector ของคำถามที่เคยถามแล้วมาจาก LRU cache
+ถ้ามี BM25 index (embeddings/lexical/) จะรวมคะแนนคำที่ตรงตัวกับคะแนน vector (hybrid)
+
+ตั้ง ENERGY_VECTOR_INDEX เป็นโฟลเดอร์ embeddings เพื่อใช้ชุดอื่น
+ต้องติดตั้ง numpy pyarrow (ค้นด้วยข้อความต้องมี sentence-transformers ด้วย)
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+from metrics import SEARCH_BATCH_SIZE, SEARCH_DURATION, SEARCH_QUERIES
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# vector_index.py / embeddings.py อยู่ใน level6_ai_ready/ (ใน container ถูก copy มาไว้ข้างกัน)
+LEVEL6_DIR = REPO_DIR / "level6_ai_ready"
+
+# โฟลเดอร์ embeddings ที่ลองหาตามลำดับ ถ้าไม่ได้กำหนด ENERGY_VECTOR_INDEX
+# (หาใหม่ทุกครั้งที่ยังไม่พบ index - prepare_data รันหลัง server start ก็ใช้ได้เลย)
+DEFAULT_INDEX_DIRS = [
+    Path("/app/embeddings"),  # docker-compose mount
+    Path("/app/data/embeddings"),
+    LEVEL6_DIR / "data" / "embeddings",
+]
+
+DEFAULT_K = 5
+MAX_K = 100
+
+
+class SearchUnavailable(Exception):
+    """ยังค้นหาไม่ได้ (ไม่มี index หรือไม่ได้ติดตั้ง library ที่ต้องใช้)"""
+    pass
+
+
+class SearchError(ValueError):
+    """parameter ของการค้นหาไม่ถูกต้อง"""
+    pass
+
+
+def _level6():
+    """โมดูล vector_index, lexical_index และ retrieval ของ Level 6"""
+    if LEVEL6_DIR.is_dir() and str(LEVEL6_DIR) not in sys.path:
+        sys.path.append(str(LEVEL6_DIR))
+    try:
+        import lexical_index
+        import retrieval
+        import vector_index
+    except ImportError as e:
+        raise SearchUnavailable(f"Vector search requires numpy and pyarrow: {e}") from e
+    return vector_index, lexical_index, retrieval
+
+
+def _mtime(path: Path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def record_batch(queries, cache_hits, encode_seconds, search_seconds):
+    """ส่งสถิติของแต่ละ batch ไปที่ /metrics"""
+    SEARCH_QUERIES.inc("hit", amount=cache_hits)
+    SEARCH_QUERIES.inc("miss", amount=queries - cache_hits)
+    SEARCH_BATCH_SIZE.observe(queries)
+    SEARCH_DURATION.observe(encode_seconds, "encode")
+    SEARCH_DURATION.observe(search_seconds, "search")
+
+
+class SearchIndex:
+    """ถือ RetrievalService ของ index ที่โหลดแล้ว และโหลดใหม่เมื่อ index.json เปลี่ยน (prepare_data รันใหม่)"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else None  # None = หาจาก DEFAULT_INDEX_DIRS
+        self._service = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """ใช้ ENERGY_VECTOR_INDEX หรือโฟลเดอร์ตั้งต้นแรกที่มี index (หาตอนค้นหา ดู locate)"""
+        return cls(os.environ.get("ENERGY_VECTOR_INDEX"))
+
+    def locate(self):
+        """โฟลเดอร์ของ index ที่ใช้ได้ตอนนี้ (None = ยังไม่มี)"""
+        if self.directory is not None:
+            return self.directory
+        for path in DEFAULT_INDEX_DIRS:
+            if (path / "index" / "index.json").exists():
+                return path
+        return None
+
+    def get(self):
+        """RetrievalService ของ index ปัจจุบัน"""
+        directory = self.locate()
+        if directory is None:
+            raise SearchUnavailable(
+                "No vector index found; run level6_ai_ready/prepare_data.py or set ENERGY_VECTOR_INDEX"
+            )
+        index_stamp = _mtime(directory / "index" / "index.json")
+        if index_stamp is None:
+            raise SearchUnavailable(f"No vector index in {directory}")
+        stamp = (directory, index_stamp, _mtime(directory / "lexical" / "lexical.json"))
+        if stamp == self._stamp:
+            return self._service
+
+        with self._lock:
+            if stamp != self._stamp:
+                vector_index, lexical_index, retrieval = _level6()
+                try:
+                    index = vector_index.load_index(directory)
+                except (OSError, ValueError, KeyError) as e:
+                    raise SearchUnavailable(f"Cannot load vector index: {e}") from e
+                try:
+                    service = retrieval.RetrievalService(
+                        index, on_batch=record_batch, lexical=self._load_lexical(lexical_index, directory)
+                    )
+                except ValueError as e:
+                    # BM25 index ยังเป็นของข้อมูลชุดก่อน (prepare_data ยังสร้างไม่เสร็จ)
+                    print(f"⚠️  Lexical index not used: {e}")
+                    service = retrieval.RetrievalService(index, on_batch=record_batch)
+                # model เดิม: ใช้ encoder และ cache ของคำถามเดิมต่อ ไม่ต้องโหลด model ซ้ำ
+                previous = self._service
+                if previous is not None and previous.index.model == index.model:
+                    index.encoder = previous.index.encoder
+                    service.cache = previous.cache
+                self._service, self._stamp = service, stamp
+                if previous is not None:
+                    previous.close()
+        return self._service
+
+    @staticmethod
+    def _load_lexical(lexical_index, directory):
+        """BM25 index ถ้ามี (โหลดไม่ได้ = ค้นด้วย vector อย่างเดียว)"""
+        if lexical_index.lexical_info(directory) is None:
+            return None
+        try:
+            return lexical_index.load_lexical_index(directory)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"⚠️  Lexical index not loaded, using vector search only: {e}")
+            return None
+
+    def stats(self) -> dict:
+        """สถิติของ RetrievalService (ยังไม่มีการค้นหา = ยังไม่โหลด index)"""
+        if self._service is None:
+            return {"loaded": False}
+        lexical = self._service.lexical
+        return {"loaded": True, "index": self._service.index.info,
+                "lexical": None if lexical is None else lexical.info, **self._service.stats()}
+
+
+def parse_search(args) -> dict:
+    """แปลง query string (?q=&k=&region=&year=) เป็น parameter ของ similarity_search"""
+    query = (args.get("q") or "").strip()
+    if not query:
+        raise SearchError("Missing query parameter 'q'")
+    try:
+        k = int(args.get("k", DEFAULT_K))
+    except ValueError:
+        raise SearchError("Invalid k: must be an integer") from None
+    if not 1 <= k <= MAX_K:
+        raise SearchError(f"Invalid k: must be between 1 and {MAX_K}")
+
+    regions = [code.strip().upper() for code in (args.get("region") or "").split(",") if code.strip()]
+    try:
+        years = [int(year) for year in (args.get("year") or "").split(",") if year.strip()]
+    except ValueError:
+        raise SearchError("Invalid year: must be an integer") from None
+    return {"query": query, "k": k, "region_code": regions or None, "year": years or None}
+
+
+def run_search(search_index: SearchIndex, params: dict) -> list:
+    """ผลการค้นหา (list ของ record ที่มี score) - รวม batch กับ request อื่นที่เข้ามาพร้อมกัน"""
+    service = search_index.get()
+    try:
+        return service.retrieve(params["query"], k=params["k"],
+                                region_code=params["region_code"], year=params["year"])
+    except ImportError as e:
+        raise SearchUnavailable(
+            f"Text search requires sentence-transformers: pip install sentence-transformers ({e})"
+        ) from e
+    except ValueError as e:
+        # embeddings ที่สร้างด้วย placeholder ค้นด้วยข้อความไม่ได้
+        raise SearchUnavailable(str(e)) from e
@@ -0,0 +1,275 @@
+"""
+Energy Data Store
+Level 4: โหลดข้อมูลสถิติพลังงานจากไฟล์ Level 3/6 เข้าหน่วยความจำ พร้อม index
+
+รองรับไฟล์:
+    - level3_open_format/energy_stats_2566.json  (มี metadata + data)
+    - level6_ai_ready/data/energy_stats.jsonl    (หนึ่ง record ต่อบรรทัด)
+    - ไฟล์ .parquet หรือโฟลเดอร์ Parquet         (อ่านผ่าน Arrow ไม่โหลดเข้าหน่วยความจำ ดู energy_columnar.py)
+
+ข้อมูลถูกเก็บเป็น snapshot ที่ไม่เปลี่ยนแปลง (immutable) เมื่อไฟล์ถูกแก้ไข
+(mtime เปลี่ยน) store จะโหลด snapshot ใหม่แล้วสลับ reference ทีเดียว
+request ที่กำลังทำงานอยู่จึงยังใช้ snapshot เดิมได้จนจบ
+
+การใช้งาน:
+    store = EnergyStore.from_env()
+    snapshot = store.snapshot
+    snapshot.get_region("TH-NE")
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from energy_aggregates import SummaryAggregates, update_aggregates
+from metrics import RELOAD_DURATION, RELOADS
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# field ที่มี sorted index สำหรับ range filter และ sort
+SORTED_FIELDS = ["year", "consumption_gwh", "growth_rate", "customers"]
+
+# field ที่มี hash index (ค่า -> ตำแหน่ง record) สำหรับ filter แบบชุดค่า
+HASHED_FIELDS = ["region_code", "province", "year"]
+
+# ไฟล์ที่ลองหาตามลำดับ ถ้าไม่ได้กำหนด ENERGY_DATA_FILE
+DEFAULT_DATA_FILES = [
+    Path("/app/data/energy_stats_2566.json"),  # docker-compose mount
+    REPO_DIR / "level3_open_format" / "energy_stats_2566.json",
+    REPO_DIR / "level6_ai_ready" / "data" / "energy_stats.jsonl",
+]
+
+
+class DataLoadError(Exception):
+    """โหลดไฟล์ข้อมูลไม่สำเร็จ"""
+    pass
+
+
+def parse_records(raw: bytes, suffix: str) -> list:
+    """แปลงเนื้อหาไฟล์ (.json หรือ .jsonl) เป็น list ของ record"""
+    text = raw.decode("utf-8")
+
+    if suffix == ".jsonl":
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    document = json.loads(text)
+    if isinstance(document, list):
+        return document
+
+    # รูปแบบ Level 3: {"metadata": {...}, "data": [...]}
+    default_year = document.get("metadata", {}).get("year")
+    records = []
+    for record in document.get("data", []):
+        if "year" not in record and default_year is not None:
+            record = {**record, "year": default_year}
+        records.append(record)
+    return records
+
+
+class EnergySnapshot:
+    """ข้อมูลชุดหนึ่งที่โหลดแล้ว พร้อม lookup index (ห้ามแก้ไขหลังสร้าง)"""
+
+    def __init__(self, records: list, version: str, source: str = None, previous=None):
+        self.records = tuple(records)
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+
+        self.by_region = {}   # region_code -> [records]
+        self.by_year = {}     # year -> [records]
+        self.region_year = {}  # (region_code, year) -> record ระดับภูมิภาค
+
+        # key ที่ระบุ record แต่ละตัว ใช้เป็นตัวตัดสินลำดับเมื่อค่าที่ sort เท่ากัน
+        self.keys = [record_key(record) for record in self.records]
+
+        # hash index: field -> {value: [positions]}
+        self.positions = {field: {} for field in HASHED_FIELDS}
+
+        for pos, record in enumerate(self.records):
+            code = record["region_code"]
+            year = int(record["year"])
+            self.by_region.setdefault(code, []).append(record)
+            self.by_year.setdefault(year, []).append(record)
+            if is_region_total(record):
+                self.region_year[(code, year)] = record
+            for field in HASHED_FIELDS:
+                value = record.get(field)
+                if value not in (None, ""):
+                    self.positions[field].setdefault(value, []).append(pos)
+
+        # sorted index: field -> [(value, key, position)] เรียงจากน้อยไปมาก
+        # "key" คือการเรียงตาม record key (ค่าเริ่มต้นของ query)
+        self.sorted_index = {"key": sorted((k, k, pos) for pos, k in enumerate(self.keys))}
+        self.sorted_values = {}
+        for field in SORTED_FIELDS:
+            entries = sorted(
+                (record[field], self.keys[pos], pos)
+                for pos, record in enumerate(self.records)
+                if record.get(field) is not None
+            )
+            self.sorted_index[field] = entries
+            self.sorted_values[field] = [entry[0] for entry in entries]
+
+        # ผลรวมสำหรับ /summary - ถ้ามี snapshot เดิม ปรับเฉพาะ record ที่เปลี่ยน
+        if previous is not None:
+            self.aggregates = update_aggregates(previous, self.records, self.keys)
+        else:
+            self.aggregates = SummaryAggregates.build(self.records)
+
+        # ชื่อ field ทั้งหมดตามลำดับที่พบ (ใช้เป็นคอลัมน์ตอน export)
+        self.fields = list(dict.fromkeys(field for record in self.records for field in record))
+
+        self.years = sorted(self.by_year)
+        self.latest_year = self.years[-1] if self.years else None
+        self.region_codes = list(self.by_region)
+
+    def __len__(self):
+        return len(self.records)
+
+    def range_positions(self, field: str, low=None, high=None) -> list:
+        """ตำแหน่ง record ที่ low <= field <= high (ใช้ bisect บน sorted index)"""
+        values = self.sorted_values[field]
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        stop = len(values) if high is None else bisect.bisect_right(values, high)
+        return [entry[2] for entry in self.sorted_index[field][start:stop]]
+
+    def get_region(self, region_code: str, year: int = None):
+        """record ระดับภูมิภาคของ region_code (ค่าเริ่มต้น: ปีล่าสุดที่มีข้อมูล)"""
+        if year is not None:
+            return self.region_year.get((region_code, year))
+        for candidate in reversed(self.years):
+            record = self.region_year.get((region_code, candidate))
+            if record is not None:
+                return record
+        return None
+
+
+def record_key(record: dict) -> tuple:
+    """key ของ record: (region_code, province, year, month)"""
+    return (
+        record["region_code"],
+        record.get("province") or "",
+        int(record["year"]),
+        int(record.get("month") or 0),
+    )
+
+
+def is_region_total(record: dict) -> bool:
+    """record ระดับภูมิภาคทั้งปี (ไม่ใช่รายจังหวัดหรือรายเดือน)"""
+    return not record.get("province") and not record.get("month")
+
+
+def is_columnar(path: Path) -> bool:
+    """ไฟล์/โฟลเดอร์ Parquet ใช้ ColumnarSnapshot"""
+    return path.suffix == ".parquet" or path.is_dir()
+
+
+def data_stamp(path: Path) -> int:
+    """เวลาแก้ไขล่าสุดของไฟล์ข้อมูล (โฟลเดอร์: ไฟล์ที่แก้ไขล่าสุดในโฟลเดอร์)"""
+    if path.is_dir():
+        return max((file.stat().st_mtime_ns for file in path.rglob("*.parquet")),
+                   default=path.stat().st_mtime_ns)
+    return path.stat().st_mtime_ns
+
+
+def load_snapshot(path: Path, previous: EnergySnapshot = None) -> EnergySnapshot:
+    """อ่านไฟล์แล้วสร้าง snapshot ใหม่ (version = hash ของเนื้อหาไฟล์)"""
+    if is_columnar(path):
+        try:
+            from energy_columnar import load_columnar_snapshot
+            return load_columnar_snapshot(path)
+        except (ImportError, OSError, ValueError, KeyError, TypeError) as e:
+            raise DataLoadError(f"Cannot load {path}: {e}") from e
+
+    try:
+        raw = path.read_bytes()
+        version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+        return EnergySnapshot(
+            parse_records(raw, path.suffix), version=version, source=str(path),
+            previous=previous
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise DataLoadError(f"Cannot load {path}: {e}") from e
+
+
+class EnergyStore:
+    """ถือ snapshot ปัจจุบัน และ reload อัตโนมัติเมื่อไฟล์ข้อมูลเปลี่ยน"""
+
+    def __init__(self, path, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._mtime = data_stamp(self.path)
+        self._last_check = time.monotonic()
+        start = time.perf_counter()
+        self._snapshot = load_snapshot(self.path)
+        RELOAD_DURATION.observe(time.perf_counter() - start)
+        RELOADS.inc("initial")
+
+    @classmethod
+    def from_env(cls):
+        """สร้าง store จาก ENERGY_DATA_FILE หรือไฟล์ตั้งต้นใน repo"""
+        interval = float(os.environ.get("ENERGY_RELOAD_INTERVAL", 2.0))
+        env_path = os.environ.get("ENERGY_DATA_FILE")
+        if env_path:
+            return cls(env_path, check_interval=interval)
+
+        for path in DEFAULT_DATA_FILES:
+            if path.exists():
+                return cls(path, check_interval=interval)
+
+        raise DataLoadError(
+            "No energy data file found; set ENERGY_DATA_FILE "
+            f"(tried {[str(p) for p in DEFAULT_DATA_FILES]})"
+        )
+
+    @property
+    def snapshot(self) -> EnergySnapshot:
+        """snapshot ปัจจุบัน (ตรวจ mtime ไม่เกินทุก check_interval วินาที)"""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.reload_if_changed()
+        return self._snapshot
+
+    def on_reload(self, callback):
+        """ลงทะเบียน callback(snapshot) ที่จะถูกเรียกหลัง reload สำเร็จ"""
+        self._listeners.append(callback)
+        return callback
+
+    def reload_if_changed(self) -> bool:
+        """Reload ถ้า mtime ของไฟล์เปลี่ยน คืน True ถ้ามีการ reload"""
+        # thread อื่นที่เข้ามาระหว่าง reload จะใช้ snapshot เดิมไปก่อน ไม่ต้องรอ
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = time.monotonic()
+            try:
+                mtime = data_stamp(self.path)
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+
+            start = time.perf_counter()
+            try:
+                snapshot = load_snapshot(self.path, previous=self._snapshot)
+            except DataLoadError as e:
+                # ไฟล์อาจเขียนไม่เสร็จ - ใช้ข้อมูลเดิมต่อแล้วลองใหม่รอบหน้า
+                RELOADS.inc("failure")
+                print(f"⚠️  Reload failed, keeping previous data: {e}")
+                return False
+            RELOAD_DURATION.observe(time.perf_counter() - start)
+            RELOADS.inc("success")
+
+            self._mtime = mtime
+            self._snapshot = snapshot
+        finally:
+            self._reload_lock.release()
+
+        for callback in self._listeners:
+            callback(snapshot)
+        return True
@@ -0,0 +1,374 @@
+"""
+API Metrics (Prometheus text format)
+Level 4: เก็บ metrics ของ API โดยไม่ต้องพึ่ง library ภายนอก แล้วเปิดที่ /metrics
+
+- จำนวน request, latency histogram และขนาด response แยกตาม route
+- จำนวน request ที่กำลังประมวลผล (in-flight)
+- cache hit/miss ของ ResponseCache และเวลาที่ใช้ render/serialize
+- เวลาที่ใช้ reload ข้อมูลของ EnergyStore
+- ขนาด batch, cache hit/miss และเวลา encode/ค้นของ /search
+
+หลาย process (gunicorn): ตั้ง METRICS_DIR แล้วแต่ละ worker จะเขียน snapshot ของตัวเอง
+ลงไฟล์เป็นระยะ /metrics รวมทุกไฟล์ก่อนตอบ (ไม่งั้นแต่ละ scrape เห็นแค่ worker เดียว)
+counter ของ worker ที่ตายไปแล้วถูกรวมเก็บไว้ใน archive.json - ค่าไม่ลดลงเมื่อ worker restart
+
+การใช้งาน:
+    from metrics import init_metrics
+    init_metrics(app)           # middleware + GET /metrics
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from flask import Response, request
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+
+# ===========================================
+# Metric types
+# ===========================================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}  # label values (tuple) -> ค่า
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def dump(self) -> dict:
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels), "values": values}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge (รวมหลาย process ด้วยผลรวมของ process ที่ยังทำงานอยู่)"""
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        # [count ต่อ bucket (ไม่สะสม) ..., +Inf, sum]
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def dump(self) -> dict:
+        data = super().dump()
+        data["values"] = [[key, list(counts)] for key, counts in data["values"]]
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+class Registry:
+    """ชุดของ metrics ใน process นี้"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def reset(self):
+        """ล้างค่าทั้งหมด (เรียกใน worker หลัง fork - ค่าของ master ถูกนับแยกแล้ว)"""
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def dump(self) -> dict:
+        return {name: metric.dump() for name, metric in self._metrics.items()}
+
+
+REGISTRY = Registry()
+
+# --- HTTP (MetricsMiddleware) ---
+REQUESTS = REGISTRY.counter(
+    "energy_api_requests_total", "HTTP requests", ("method", "route", "status"))
+REQUEST_DURATION = REGISTRY.histogram(
+    "energy_api_request_duration_seconds", "Time from WSGI call to last body byte", ("method", "route"))
+RESPONSE_SIZE = REGISTRY.histogram(
+    "energy_api_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS)
+IN_FLIGHT = REGISTRY.gauge(
+    "energy_api_requests_in_flight", "Requests currently being served")
+
+# --- ResponseCache ---
+CACHE_REQUESTS = REGISTRY.counter(
+    "energy_api_response_cache_requests_total", "Response cache lookups", ("result",))
+RENDER_DURATION = REGISTRY.histogram(
+    "energy_api_render_duration_seconds", "Time to build and serialize a cached response", ("mimetype",))
+
+# --- EnergyStore ---
+RELOADS = REGISTRY.counter(
+    "energy_api_data_reloads_total", "Data file loads (initial, success, failure)", ("result",))
+RELOAD_DURATION = REGISTRY.histogram(
+    "energy_api_data_reload_duration_seconds", "Time to load and index the data file",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+# --- Search (energy_search.py) ---
+SEARCH_QUERIES = REGISTRY.counter(
+    "energy_api_search_queries_total", "Search queries by query-embedding cache result", ("cache",))
+SEARCH_BATCH_SIZE = REGISTRY.histogram(
+    "energy_api_search_batch_size", "Queries encoded and searched together",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+SEARCH_DURATION = REGISTRY.histogram(
+    "energy_api_search_batch_duration_seconds", "Time per search batch", ("stage",))
+
+
+# ===========================================
+# Text exposition format
+# ===========================================
+
+def _label_text(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(dumps: dict) -> str:
+    """แปลง dump (ของ process เดียวหรือที่รวมแล้ว) เป็น Prometheus text format"""
+    lines = []
+    for name, data in dumps.items():
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        labels = data["labels"]
+        for key, value in sorted(data["values"], key=lambda item: item[0]):
+            if data["kind"] != "histogram":
+                lines.append(f"{name}{_label_text(labels, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(data["buckets"] + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(f"{name}_bucket{_label_text(labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels, key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_label_text(labels, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ===========================================
+# หลาย process: แต่ละ worker เขียนไฟล์ /metrics รวมทุกไฟล์
+# ===========================================
+
+def _merge(target: dict, source: dict, include_gauges: bool = True):
+    for name, data in source.items():
+        if data["kind"] == "gauge" and not include_gauges:
+            continue
+        merged = target.setdefault(name, {**data, "values": []})
+        values = {tuple(key): value for key, value in merged["values"]}
+        for key, value in data["values"]:
+            key = tuple(key)
+            if key not in values:
+                values[key] = value
+            elif data["kind"] == "histogram":
+                values[key] = [a + b for a, b in zip(values[key], value)]
+            else:
+                values[key] = values[key] + value
+        merged["values"] = [[list(key), value] for key, value in values.items()]
+    return target
+
+
+def _write_json(path: Path, data):
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(data), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def flush(directory=None):
+    """เขียน snapshot ของ process นี้ลง METRICS_DIR/<pid>.json"""
+    directory = Path(directory or METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_json(directory / f"{os.getpid()}.json", REGISTRY.dump())
+
+
+def collect(directory=None) -> dict:
+    """รวม snapshot ของทุก process (worker ที่ตายแล้วถูกย้ายเข้า archive.json)"""
+    import fcntl
+
+    directory = Path(directory or METRICS_DIR)
+    flush(directory)
+    with open(directory / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = directory / "archive.json"
+        try:
+            archive = json.loads(archive_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            archive = {}
+
+        merged, archived = {}, False
+        for path in directory.glob("[0-9]*.json"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if _alive(int(path.stem)):
+                _merge(merged, data)
+            else:
+                # gauge ของ process ที่ตายแล้วไม่มีความหมาย เก็บเฉพาะ counter/histogram
+                _merge(archive, data, include_gauges=False)
+                path.unlink()
+                archived = True
+
+        if archived:
+            _write_json(archive_path, archive)
+    return _merge(merged, archive)
+
+
+def start_flusher(interval: float = FLUSH_INTERVAL):
+    """thread เบื้องหลังที่เขียน snapshot เป็นระยะ (เรียกใน worker หลัง fork)"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError as e:
+                print(f"⚠️  Cannot write metrics: {e}")
+
+    threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+
+
+# ===========================================
+# Middleware และ endpoint
+# ===========================================
+
+class _MeteredBody:
+    """ห่อ body ของ WSGI response เพื่อนับ bytes และจับเวลาจนส่ง byte สุดท้าย (รวม streaming)"""
+
+    def __init__(self, body, finish):
+        self._body = body
+        self._finish = finish
+        self._size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._finish(self._size)
+
+
+class MetricsMiddleware:
+    """WSGI middleware: นับ request, latency, ขนาด response และ in-flight แยกตาม route"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        status = ["500"]
+
+        def metered_start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def finish(size):
+            method = environ.get("REQUEST_METHOD", "GET")
+            route = environ.get("metrics.route", "unmatched")
+            REQUESTS.inc(method, route, status[0])
+            REQUEST_DURATION.observe(time.perf_counter() - start, method, route)
+            RESPONSE_SIZE.observe(size, route)
+            IN_FLIGHT.dec()
+
+        IN_FLIGHT.inc()
+        try:
+            body = self.wsgi_app(environ, metered_start_response)
+        except Exception:
+            finish(0)
+            raise
+        return _MeteredBody(body, finish)
+
+
+def init_metrics(app, path: str = "/metrics"):
+    """ติดตั้ง middleware และ endpoint /metrics ให้ Flask app"""
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+    # ต้องลงทะเบียนก่อน before_request อื่น (เช่น rate limit) จะได้รู้ route เสมอ
+    @app.before_request
+    def record_route():
+        rule = request.url_rule
+        request.environ["metrics.route"] = rule.rule if rule is not None else "unmatched"
+
+    @app.route(path)
+    def metrics():
+        """Prometheus metrics"""
+        dumps = collect() if METRICS_DIR else REGISTRY.dump()
+        return Response(render(dumps), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,209 @@
+"""
+Rate Limiting (Token Bucket)
+Level 4: จำกัดจำนวน request ต่อ client (IP หรือ API key) ไม่ให้ burst เดียวกิน worker ทั้ง pool
+
+แต่ละ client มี bucket จุ burst token เติมคืน rate token ต่อวินาที
+หนึ่ง request ใช้หนึ่ง token ถ้าไม่มี token เหลือตอบ 429 พร้อม Retry-After
+
+Backend:
+    LocalRateLimiter - bucket อยู่ใน process (ค่าเริ่มต้น, แต่ละ gunicorn worker นับแยกกัน)
+    RedisRateLimiter - bucket อยู่ใน Redis ใช้ร่วมกันทุก worker/container (ต้องใช้ redis)
+
+ตั้งค่าผ่าน environment variable:
+    RATE_LIMIT_RATE=20            token ต่อวินาที (0 = ปิด rate limit)
+    RATE_LIMIT_BURST=40           จำนวน request สูงสุดที่ยิงติดกันได้
+    RATE_LIMIT_REDIS_URL=redis://redis:6379/0   ใช้ Redis แทน bucket ใน process
+    RATE_LIMIT_TRUST_PROXY=1      ใช้ IP จาก X-Forwarded-For (เมื่ออยู่หลัง reverse proxy)
+    RATE_LIMIT_API_KEYS=k1,k2     API key ที่ได้ bucket ของตัวเอง (key อื่นนับตาม IP)
+    RATE_LIMIT_API_KEYS_FILE=/run/secrets/api_keys   ไฟล์ API key หนึ่ง key ต่อบรรทัด
+
+การใช้งาน:
+    from rate_limit import init_rate_limit, limiter_from_env
+    init_rate_limit(app, limiter_from_env())
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 40
+MAX_BUCKETS = 100_000  # จำนวน bucket สูงสุดในหน่วยความจำ (เกินแล้วลบ bucket ที่ไม่ได้ใช้นานที่สุด)
+
+
+class Decision:
+    """ผลการตรวจ rate limit ของหนึ่ง request"""
+
+    __slots__ = ("allowed", "remaining", "retry_after")
+
+    def __init__(self, allowed: bool, remaining: float, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+
+class LocalRateLimiter:
+    """Token bucket ในหน่วยความจำของ process"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, max_buckets: int = MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # key -> [tokens, เวลาที่อัปเดตล่าสุด] เรียงจากใช้ล่าสุดน้อยไปมาก
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, cost: int = 1) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # LRU: ลบ bucket ที่ไม่ได้ใช้นานที่สุด (O(1) ต่อ request)
+                while len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = [float(self.burst), now]
+            else:
+                self._buckets.move_to_end(key)
+
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return Decision(True, bucket[0])
+            bucket[0] = tokens
+            return Decision(False, tokens, (cost - tokens) / self.rate)
+
+
+# Token bucket แบบ atomic ใน Redis (ใช้เวลาของ Redis - ทุก worker ใช้นาฬิกาเดียวกัน)
+_REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """
+    Token bucket ใน Redis ใช้ร่วมกันทุก worker และทุก container
+
+    ถ้า Redis ใช้งานไม่ได้ชั่วคราวจะปล่อย request ผ่าน (fail open) - API ไม่ล่มตาม Redis
+    """
+
+    def __init__(self, client, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 prefix: str = "energy-api:ratelimit:"):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=0.1), **kwargs)
+
+    def allow(self, key: str, cost: int = 1) -> Decision:
+        try:
+            allowed, tokens = self._script(keys=[self.prefix + key], args=[self.rate, self.burst, cost])
+        except Exception as e:
+            print(f"Rate limit backend error (allowing request): {e}")
+            return Decision(True, self.burst)
+        tokens = float(tokens)
+        if allowed:
+            return Decision(True, tokens)
+        return Decision(False, tokens, (cost - tokens) / self.rate)
+
+
+def limiter_from_env():
+    """สร้าง limiter ตาม environment variable (คืน None ถ้าปิด rate limit)"""
+    rate = float(os.environ.get("RATE_LIMIT_RATE", DEFAULT_RATE))
+    burst = int(os.environ.get("RATE_LIMIT_BURST", DEFAULT_BURST))
+    if rate <= 0:
+        return None
+
+    url = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if url:
+        try:
+            return RedisRateLimiter.from_url(url, rate=rate, burst=burst)
+        except ImportError:
+            print("RATE_LIMIT_REDIS_URL requires redis (pip install redis) - using in-process buckets")
+    return LocalRateLimiter(rate, burst)
+
+
+def api_keys_from_env() -> frozenset:
+    """API key ที่ลงทะเบียนไว้ (RATE_LIMIT_API_KEYS และ/หรือ RATE_LIMIT_API_KEYS_FILE)"""
+    keys = os.environ.get("RATE_LIMIT_API_KEYS", "").split(",")
+    path = os.environ.get("RATE_LIMIT_API_KEYS_FILE")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            keys.extend(f.read().splitlines())
+    return frozenset(key.strip() for key in keys if key.strip())
+
+
+def client_key(trust_proxy: bool = False, api_keys=frozenset()) -> str:
+    """
+    ระบุ client จาก X-API-Key ที่อยู่ใน api_keys ไม่เช่นนั้นใช้ IP
+    (key ที่ไม่ได้ลงทะเบียนไม่ได้ bucket ใหม่ - สุ่ม key ทุก request ก็ยังนับตาม IP)
+    """
+    api_key = request.headers.get("X-API-Key")
+    if api_key and api_key in api_keys:
+        return "key:" + api_key
+    if trust_proxy and request.access_route:
+        return "ip:" + request.access_route[0]
+    return "ip:" + (request.remote_addr or "unknown")
+
+
+def init_rate_limit(app, limiter, exempt=("/", "/health"), trust_proxy: bool = None, api_keys=None):
+    """
+    ติดตั้ง rate limit ให้ทุก route ของ app ยกเว้น path ใน exempt
+    api_keys: API key ที่ได้ bucket แยกจาก IP (None = อ่านจาก environment variable)
+    """
+    if limiter is None:
+        return
+    if trust_proxy is None:
+        trust_proxy = os.environ.get("RATE_LIMIT_TRUST_PROXY") == "1"
+    api_keys = api_keys_from_env() if api_keys is None else frozenset(api_keys)
+    exempt = set(exempt)
+
+    @app.before_request
+    def check_rate_limit():
+        if request.path in exempt or request.method == "OPTIONS":
+            return None
+        decision = limiter.allow(client_key(trust_proxy, api_keys))
+        g.rate_limit = decision
+        if decision.allowed:
+            return None
+
+        retry_after = max(1, math.ceil(decision.retry_after))
+        response = jsonify({
+            "status": "error",
+            "message": "Rate limit exceeded",
+            "retry_after": retry_after
+        })
+        response.status_code = 429
+        response.headers["Retry-After"] = str(retry_after)
+        return response
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        decision = g.pop("rate_limit", None)
+        if decision is not None:
+            response.headers["X-RateLimit-Limit"] = str(limiter.burst)
+            response.headers["X-RateLimit-Remaining"] = str(int(decision.remaining))
+        return response
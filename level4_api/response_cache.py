@@ -0,0 +1,160 @@
+"""
+Pre-serialized Response Cache
+Level 4: เก็บ response ที่ encode เป็น bytes แล้ว พร้อม ETag
+
+ข้อมูลใน API ไม่เปลี่ยนระหว่าง deploy (หรือเปลี่ยนเฉพาะตอน reload)
+จึง serialize แต่ละ response เพียงครั้งเดียว แล้วตอบ request ถัดไปด้วย bytes เดิม
+ถ้า client ส่ง If-None-Match ที่ตรงกับ ETag จะตอบ 304 โดยไม่ต้องส่ง body
+request ที่มาพร้อมกันด้วย key เดียวกันรอผลจากการ render ครั้งเดียว (SingleFlight)
+
+การใช้งาน:
+    cache = ResponseCache()
+
+    @app.route("/api/v1/energy/summary")
+    def get_summary():
+        return cache.respond("summary", build_summary)
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from flask import Response, request
+
+from metrics import CACHE_REQUESTS, RENDER_DURATION
+
+
+def encode_json(payload) -> bytes:
+    """Encode payload เป็น JSON bytes (UTF-8, ไม่ escape ภาษาไทย)"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """สร้าง strong ETag จากเนื้อหา body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CachedBody:
+    """Response body ที่ encode แล้ว พร้อม ETag (headers: header เพิ่มเติมที่ส่งไปกับ body นี้เสมอ)"""
+
+    __slots__ = ("body", "etag", "mimetype", "headers")
+
+    def __init__(self, body: bytes, mimetype: str = "application/json", headers: dict = None):
+        self.body = body
+        self.etag = make_etag(body)
+        self.mimetype = mimetype
+        self.headers = headers or {}
+
+
+class _Call:
+    """การคำนวณหนึ่งครั้งที่ request อื่นรอผลร่วมกันได้"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    รวม request ที่ซ้ำกันและมาพร้อมกันให้คำนวณเพียงครั้งเดียว (request coalescing)
+
+    thread แรกของแต่ละ key เป็นผู้คำนวณ thread อื่นที่มาระหว่างนั้นรอแล้วได้ผลเดียวกัน
+    (รวมถึง exception) เมื่อคำนวณเสร็จ key จะถูกลบ - request ถัดไปคำนวณใหม่
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0  # จำนวน request ที่ได้ผลจากการคำนวณของ request อื่น
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class ResponseCache:
+    """Cache ของ response bytes ตาม key (เช่น route + parameter)"""
+
+    def __init__(self, cache_control: str = "no-cache"):
+        self.cache_control = cache_control
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, key, render, encode=encode_json,
+            mimetype: str = "application/json") -> CachedBody:
+        """คืน body ที่ cache ไว้ ถ้ายังไม่มีจะเรียก render() แล้ว encode ครั้งเดียว"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            CACHE_REQUESTS.inc("hit")
+            return entry
+
+        # key ต่างกัน render พร้อมกันได้ key เดียวกัน render ครั้งเดียว
+        filled = []
+        entry = self._flight.do(
+            key, lambda: filled.append(True) or self._fill(key, render, encode, mimetype)
+        )
+        if not filled:
+            CACHE_REQUESTS.inc("coalesced")
+        return entry
+
+    def _fill(self, key, render, encode, mimetype) -> CachedBody:
+        entry = self._entries.get(key)
+        if entry is not None:
+            CACHE_REQUESTS.inc("hit")
+            return entry
+
+        CACHE_REQUESTS.inc("miss")
+        start = time.perf_counter()
+        entry = CachedBody(encode(render()), mimetype)
+        RENDER_DURATION.observe(time.perf_counter() - start, mimetype)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        """ล้าง cache ทั้งหมด (เรียกเมื่อข้อมูลถูก reload)"""
+        with self._lock:
+            self._entries = {}
+
+    def respond(self, key, render, status: int = 200) -> Response:
+        """สร้าง Flask Response จาก cache พร้อมรองรับ conditional GET (304)"""
+        entry = self.get(key, render)
+        return self.make_response(entry, status)
+
+    def make_response(self, entry: CachedBody, status: int = 200) -> Response:
+        """ตอบ 304 ถ้า If-None-Match ตรงกับ ETag ไม่เช่นนั้นส่ง bytes ที่ cache ไว้"""
+        if status == 200 and request.if_none_match.contains_weak(entry.etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, status=status, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers["Cache-Control"] = self.cache_control
+        response.headers.extend(entry.headers)
+        return response
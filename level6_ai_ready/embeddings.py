@@ -0,0 +1,328 @@
+"""
+Embedding Generation
+Level 6: สร้าง text embeddings แบบ batch ด้วยหลาย process พร้อม cache ถาวร
+
+    encoder = load_encoder(batch_size=64, workers=4)
+    cache = EmbeddingCache("data/.cache/embeddings.sqlite")
+    embed_missing(encoder, cache, {text_hash: text, ...})
+    vectors = cache.get_many(encoder.name, hashes)
+
+cache ใช้ SQLite มี key เป็น (ชื่อ model, hash ของข้อความ) ข้อความที่เคย encode
+แล้วจึงไม่ถูก encode ซ้ำไม่ว่าจะอยู่ record ไหน และทุก chunk ที่ encode เสร็จถูก
+commit ทันที - ถ้าการรันถูกขัดจังหวะ รอบถัดไปจะทำต่อจากจุดที่ค้างไว้
+
+ผลลัพธ์เก็บเป็นไฟล์ binary ในโฟลเดอร์ data/embeddings/:
+    vectors.npy       matrix ขนาด (จำนวน record, dim) ชนิด float32 / float16 / int8
+    scales.npy        scale ต่อแถว (เฉพาะ int8: vector = vectors[i] * scales[i])
+    metadata.parquet  ข้อมูลของแต่ละแถว (region_code, year, text, ...) ลำดับเดียวกับ vectors
+    info.json         model, dim, dtype, count
+
+    store = StoredEmbeddings("data/embeddings")   # memory-map ไม่อ่านทั้งไฟล์
+    store.vectors[i], store.metadata, store.dense(rows)
+
+รัน: pip install sentence-transformers numpy
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+PLACEHOLDER_MODEL = "placeholder"
+PLACEHOLDER_DIM = 384
+
+# จำนวนข้อความที่ encode ต่อรอบก่อน commit ลง cache (= ความถี่ของ checkpoint)
+CHECKPOINT_TEXTS = 4096
+
+# ชนิดข้อมูลที่เก็บ vector ได้
+DTYPES = ("float32", "float16", "int8")
+
+# SQLite จำกัดจำนวน parameter ต่อ query
+_QUERY_CHUNK = 500
+
+
+class EmbeddingCache:
+    """vector ที่ encode แล้ว เก็บเป็น float32 bytes ใน SQLite"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def _select(self, columns: str, model: str, hashes: list):
+        for start in range(0, len(hashes), _QUERY_CHUNK):
+            chunk = hashes[start:start + _QUERY_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            yield from self._db.execute(
+                f"SELECT {columns} FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                [model, *chunk],
+            )
+
+    def missing(self, model: str, hashes) -> list:
+        """hash ที่ยังไม่มีใน cache"""
+        hashes = list(dict.fromkeys(hashes))
+        found = {row[0] for row in self._select("text_hash", model, hashes)}
+        return [h for h in hashes if h not in found]
+
+    def get_many(self, model: str, hashes) -> dict:
+        """{text_hash: vector float32} ของ hash ที่มีใน cache"""
+        return {
+            text_hash: np.frombuffer(blob, dtype=np.float32)
+            for text_hash, blob in self._select("text_hash, vector", model, list(set(hashes)))
+        }
+
+    def put_many(self, model: str, hashes: list, vectors: np.ndarray):
+        """บันทึก vector แล้ว commit ทันที (checkpoint)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+            [(model, h, vector.shape[0], vector.tobytes()) for h, vector in zip(hashes, vectors)],
+        )
+        self._db.commit()
+
+    def count(self, model: str) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+# ===========================================
+# Encoders
+# ===========================================
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """โหลด model หนึ่งครั้งต่อ worker process และจำกัด thread ไม่ให้แย่ง CPU กัน"""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_in_worker(task) -> np.ndarray:
+    texts, batch_size = task
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class Encoder:
+    """encode ข้อความด้วย sentence-transformers (โหลด model เมื่อ encode ครั้งแรก)"""
+
+    cacheable = True
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = 64, workers: int = 1):
+        self.name = model_name
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self._model = None
+        self._pool = None
+
+    def encode(self, texts: list) -> np.ndarray:
+        """คืน matrix float32 ขนาด (len(texts), dim)"""
+        if self.workers == 1 or len(texts) < self.batch_size * 2:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"   Loading {self.name}...")
+                self._model = SentenceTransformer(self.name, device="cpu")
+            vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+            return np.asarray(vectors, dtype=np.float32)
+
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            print(f"   Starting {self.workers} encode workers ({threads} threads each)...")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.name, threads)
+            )
+        # แบ่งเป็นก้อนละหลาย batch ให้ทุก worker มีงานเท่าๆ กัน (ลำดับผลลัพธ์คงเดิม)
+        size = max(self.batch_size, -(-len(texts) // (self.workers * 4)))
+        tasks = [(texts[i:i + size], self.batch_size) for i in range(0, len(texts), size)]
+        return np.vstack(list(self._pool.map(_encode_in_worker, tasks))).astype(np.float32)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class PlaceholderEncoder:
+    """vector ศูนย์ สำหรับกรณีไม่มี sentence-transformers (ไม่ต้อง cache)"""
+
+    name = PLACEHOLDER_MODEL
+    cacheable = False
+
+    def encode(self, texts: list) -> np.ndarray:
+        return np.zeros((len(texts), PLACEHOLDER_DIM), dtype=np.float32)
+
+    def close(self):
+        pass
+
+
+def load_encoder(batch_size: int = 64, workers: int = 1):
+    """Encoder ของ sentence-transformers หรือ PlaceholderEncoder ถ้าไม่ได้ติดตั้ง"""
+    if importlib.util.find_spec("sentence_transformers") is None:
+        print("\n⚠️  sentence-transformers not installed")
+        print("   Install with: pip install sentence-transformers")
+        print("   Creating placeholder embeddings instead...")
+        return PlaceholderEncoder()
+    return Encoder(EMBEDDING_MODEL, batch_size=batch_size, workers=workers)
+
+
+def embed_missing(encoder, cache: EmbeddingCache, texts: dict,
+                  checkpoint: int = CHECKPOINT_TEXTS) -> int:
+    """
+    encode ข้อความใน {text_hash: text} ที่ยังไม่มีใน cache คืนจำนวนที่ encode
+
+    encode ทีละ checkpoint ข้อความแล้ว commit ลง cache ทันที
+    """
+    missing = cache.missing(encoder.name, list(texts))
+    for start in range(0, len(missing), checkpoint):
+        chunk = missing[start:start + checkpoint]
+        cache.put_many(encoder.name, chunk, encoder.encode([texts[h] for h in chunk]))
+        print(f"   Encoded {start + len(chunk):,}/{len(missing):,} new texts")
+    return len(missing)
+
+
+# ===========================================
+# Binary storage
+# ===========================================
+
+def quantize_int8(vectors: np.ndarray) -> tuple:
+    """(int8 matrix, scale ต่อแถว) แบบ symmetric: vector ~= q * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0  # vector ศูนย์
+    quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class EmbeddingWriter:
+    """
+    เขียน vectors.npy + metadata.parquet ทีละ batch
+
+    ต้องรู้จำนวนแถวล่วงหน้า (ใช้ open_memmap เขียนตรงลงไฟล์ ไม่ต้องถือ matrix ในหน่วยความจำ)
+    เขียนลงโฟลเดอร์ชั่วคราวแล้วสลับตอน close() - reader ไม่เห็นไฟล์ที่เขียนไม่เสร็จ
+    """
+
+    def __init__(self, directory, count: int, dtype: str = "float32", model: str = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+        self.directory = Path(directory)
+        self.staging = self.directory.with_name(self.directory.name + ".tmp")
+        self.count = count
+        self.dtype = dtype
+        self.model = model
+        self.dim = None
+        self._row = 0
+        self._vectors = None
+        self._scales = None
+        self._metadata = None
+
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.staging.mkdir(parents=True)
+
+    def add(self, vectors: np.ndarray, metadata: list):
+        """เพิ่ม vector (float32) และ metadata ของแต่ละแถว"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._vectors is None:
+            self.dim = vectors.shape[1]
+            self._vectors = np.lib.format.open_memmap(
+                self.staging / "vectors.npy", mode="w+", dtype=self.dtype, shape=(self.count, self.dim)
+            )
+            if self.dtype == "int8":
+                self._scales = np.lib.format.open_memmap(
+                    self.staging / "scales.npy", mode="w+", dtype="float32", shape=(self.count,)
+                )
+
+        end = self._row + len(vectors)
+        if self.dtype == "int8":
+            self._vectors[self._row:end], self._scales[self._row:end] = quantize_int8(vectors)
+        else:
+            self._vectors[self._row:end] = vectors.astype(self.dtype)
+
+        table = pa.Table.from_pylist(metadata)
+        if self._metadata is None:
+            self._metadata = pq.ParquetWriter(self.staging / "metadata.parquet", table.schema,
+                                              compression="zstd")
+        self._metadata.write_table(table.cast(self._metadata.schema))
+        self._row = end
+
+    def close(self):
+        """ปิดไฟล์ เขียน info.json แล้วสลับเข้าที่ (แทนที่ผลลัพธ์เดิม)"""
+        if self._row != self.count:
+            raise ValueError(f"Expected {self.count} embeddings, got {self._row}")
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        if self._scales is not None:
+            self._scales.flush()
+            del self._scales
+        if self._metadata is not None:
+            self._metadata.close()
+
+        info = {"model": self.model, "dim": self.dim, "dtype": self.dtype, "count": self.count}
+        with open(self.staging / "info.json", "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+        old = self.directory.with_name(self.directory.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if self.directory.exists():
+            self.directory.rename(old)
+        self.staging.rename(self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def abort(self):
+        """ทิ้งไฟล์ที่เขียนไม่เสร็จ (ผลลัพธ์เดิมใน directory ไม่ถูกแตะ)"""
+        if self._metadata is not None:
+            self._metadata.close()
+        self._vectors = self._scales = self._metadata = None
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+class StoredEmbeddings:
+    """embeddings ที่เขียนด้วย EmbeddingWriter (vectors เป็น memory map - zero copy)"""
+
+    def __init__(self, directory, mmap: bool = True):
+        import pyarrow.parquet as pq
+
+        self.directory = Path(directory)
+        with open(self.directory / "info.json", "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        mode = "r" if mmap else None
+        self.vectors = np.load(self.directory / "vectors.npy", mmap_mode=mode)
+        scales = self.directory / "scales.npy"
+        self.scales = np.load(scales, mmap_mode=mode) if scales.exists() else None
+        self.metadata = pq.read_table(self.directory / "metadata.parquet")
+
+    @property
+    def model(self) -> str:
+        return self.info["model"]
+
+    def __len__(self):
+        return self.info["count"]
+
+    def dense(self, rows=slice(None)) -> np.ndarray:
+        """vector float32 ของแถวที่เลือก (int8 ถูกคูณ scale กลับ)"""
+        vectors = self.vectors[rows]
+        if self.scales is not None:
+            return vectors.astype(np.float32) * self.scales[rows][..., None]
+        return np.asarray(vectors, dtype=np.float32)
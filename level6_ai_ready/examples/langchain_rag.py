@@ -2,86 +2,110 @@
 Example: RAG (Retrieval-Augmented Generation) with LangChain
 Level 6: AI-Ready Government Data
 
-รัน: pip install langchain langchain-community faiss-cpu sentence-transformers
+รัน: pip install langchain langchain-community sentence-transformers
+     python ../prepare_data.py     # สร้าง embeddings + vector index ครั้งเดียว
      python langchain_rag.py
 
+ใช้ vector index ที่ prepare_data.py บันทึกไว้ (ดู vector_index.py) โหลดแบบ memory-map
+จึงค้นได้ทันทีโดยไม่ต้อง encode เอกสารและสร้าง index ใหม่ทุกครั้งที่รัน
+คำถามถูก encode และค้นเป็น batch ผ่าน RetrievalService (ดู retrieval.py)
+และรวมคะแนนกับ BM25 (lexical_index.py) ถ้ามี - คำถามที่มีชื่อภูมิภาค/ตัวเลขตรงตัวจึงได้เอกสารที่ถูกต้อง
+
 หมายเหตุ: ตัวอย่างนี้ใช้ local embeddings ไม่ต้องใช้ OpenAI API
 """
 
 import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from jsonl_reader import iter_records
+from prepare_data import document_text
+
 
 def load_documents():
-    """โหลดข้อมูลเป็น documents"""
+    """โหลดข้อมูลเป็น documents (generator - อ่านไฟล์ทีละบรรทัด)"""
     data_dir = Path(__file__).parent.parent / "data"
     jsonl_path = data_dir / "energy_stats.jsonl"
 
-    documents = []
-    with open(jsonl_path, "r", encoding="utf-8") as f:
-        for line in f:
-            record = json.loads(line)
-            # สร้าง document text
-            doc_text = f"""
-ข้อมูลสถิติพลังงานไฟฟ้า {record['region_th']} ({record['region_en']}) ปี {record['year']}
-
-- รหัสภูมิภาค: {record['region_code']}
-- ปริมาณการใช้ไฟฟ้า: {record['consumption_gwh']:,} GWh
-- จำนวนผู้ใช้ไฟฟ้า: {record['customers']:,} ราย
-- อัตราการเติบโต: {record['growth_rate']}%
-- การใช้ไฟฟ้าต่อหัว: {record.get('consumption_per_capita', 'N/A')} kWh/คน
-- ค่าไฟเฉลี่ยต่อเดือน: {record.get('avg_monthly_bill', 'N/A')} บาท
-
-{record.get('text_description', '')}
-""".strip()
-
-            documents.append({
-                "text": doc_text,
-                "metadata": {
-                    "region_code": record["region_code"],
-                    "region_th": record["region_th"],
-                    "year": record["year"]
-                }
-            })
-
-    return documents
-
-
-def create_vectorstore(documents):
-    """สร้าง vector store จาก documents"""
-    try:
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-        from langchain_community.vectorstores import FAISS
-        from langchain.schema import Document
+    for record in iter_records(jsonl_path):
+        # สร้าง document text (รูปแบบเดียวกับที่ prepare_data.py ใช้สร้าง lexical index)
+        doc_text = document_text(record)
 
-        print("Creating vector store...")
+        yield {
+            "text": doc_text,
+            "metadata": {
+                "region_code": record["region_code"],
+                "region_th": record["region_th"],
+                "year": record["year"]
+            }
+        }
 
-        # Create Document objects
-        docs = [
-            Document(page_content=d["text"], metadata=d["metadata"])
-            for d in documents
-        ]
 
-        # Use local embeddings (no API needed)
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-        )
+def load_vector_index():
+    """โหลด vector index ที่ prepare_data.py สร้างไว้ใน data/embeddings/index/"""
+    embeddings_dir = Path(__file__).parent.parent / "data" / "embeddings"
+    try:
+        from embeddings import PLACEHOLDER_MODEL
+        from vector_index import load_index
+
+        index = load_index(embeddings_dir)
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}")
+        print("Install with: pip install numpy pyarrow sentence-transformers")
+        return None
+    except (FileNotFoundError, ValueError) as e:
+        print(f"⚠️  {e}")
+        print("   Run: python prepare_data.py")
+        return None
+
+    if index.model == PLACEHOLDER_MODEL:
+        print("⚠️  Embeddings were created without sentence-transformers")
+        print("   Install with: pip install sentence-transformers แล้วรัน python prepare_data.py อีกครั้ง")
+        return None
 
-        # Create FAISS vector store
-        vectorstore = FAISS.from_documents(docs, embeddings)
+    print(f"✅ Loaded {index.kind} vector index with {len(index)} documents ({index.model})")
+    return index
 
-        print(f"✅ Created vector store with {len(docs)} documents")
 
-        return vectorstore
+def load_lexical_index():
+    """โหลด BM25 index (data/embeddings/lexical/) ถ้ามี - ไม่มีจะค้นด้วย vector อย่างเดียว"""
+    from lexical_index import lexical_info, load_lexical_index as load
 
+    embeddings_dir = Path(__file__).parent.parent / "data" / "embeddings"
+    if lexical_info(embeddings_dir) is None:
+        print("⚠️  No lexical index - using vector search only (run python prepare_data.py)")
+        return None
+    try:
+        lexical = load(embeddings_dir)
     except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
-        print("Install with: pip install langchain langchain-community faiss-cpu sentence-transformers")
+        print(f"⚠️  {e} - using vector search only")
         return None
+    print(f"✅ Loaded BM25 index ({lexical.info['tokenizer']}, {lexical.info['terms']:,} terms) - hybrid search")
+    return lexical
+
+
+def as_retriever(index, k: int = 2):
+    """ห่อ VectorIndex / RetrievalService เป็น LangChain retriever (ใช้กับ RetrievalQA ได้)"""
+    from langchain_core.documents import Document
+    from langchain_core.retrievers import BaseRetriever
+
+    class VectorIndexRetriever(BaseRetriever):
+        def _get_relevant_documents(self, query, *, run_manager=None):
+            return [
+                Document(page_content=result["text"], metadata={
+                    "region_code": result["region_code"],
+                    "region_th": result["region_th"],
+                    "year": result["year"],
+                    "score": result["score"],
+                })
+                for result in index.similarity_search(query, k=k)
+            ]
+
+    return VectorIndexRetriever()
 
 
-def simple_rag_demo(vectorstore):
+def simple_rag_demo(service):
     """Demo RAG แบบง่าย (ไม่ใช้ LLM)"""
     print("\n" + "=" * 60)
     print("SIMPLE RAG DEMO (Retrieval Only)")
@@ -91,23 +115,27 @@ def simple_rag_demo(vectorstore):
         "ภูมิภาคไหนใช้ไฟฟ้ามากที่สุด",
         "ภาคอีสานมีการเติบโตเท่าไหร่",
         "ภาคตะวันออกมีผู้ใช้ไฟฟ้ากี่ราย",
+        "ภาคอีสานมีการเติบโตเท่าไหร่ครับ?",  # คำถามเดิม - ใช้ vector จาก cache
     ]
 
-    for question in questions:
+    # Retrieve relevant documents (encode ทุกคำถามใน call เดียว และค้นใน index ครั้งเดียว)
+    for question, results in zip(questions, service.retrieve_many(questions, k=2)):
         print(f"\n❓ Question: {question}")
 
-        # Retrieve relevant documents
-        docs = vectorstore.similarity_search(question, k=2)
-
         print("📄 Retrieved Documents:")
-        for i, doc in enumerate(docs, 1):
-            print(f"\n  [{i}] {doc.metadata['region_th']}")
+        for i, result in enumerate(results, 1):
+            print(f"\n  [{i}] {result['region_th']} ({result['year']}) score={result['score']:.3f}")
             # Show first 200 chars
-            preview = doc.page_content[:200] + "..."
+            preview = result["text"][:200] + "..."
             print(f"      {preview}")
 
+    stats = service.stats()
+    print(f"\n⏱️  {stats['queries']} questions in {stats['batches']} batch(es), "
+          f"encoded {stats['encoded']}, cache hit rate {stats['cache_hit_rate']:.0%}, "
+          f"p50 latency {stats['latency_ms']['p50']:.1f} ms")
+
 
-def full_rag_demo(vectorstore):
+def full_rag_demo(service):
     """Demo RAG แบบเต็ม (ใช้ LLM)"""
     print("\n" + "=" * 60)
     print("FULL RAG DEMO (with LLM)")
@@ -126,7 +154,7 @@ def full_rag_demo(vectorstore):
         qa_chain = RetrievalQA.from_chain_type(
             llm=llm,
             chain_type="stuff",
-            retriever=vectorstore.as_retriever(search_kwargs={"k": 2}),
+            retriever=as_retriever(service, k=2),
             return_source_documents=True
         )
 
@@ -152,59 +180,68 @@ def full_rag_demo(vectorstore):
         print("  3. Run this script again")
 
 
+def qa_pairs_for(doc) -> list:
+    """สร้าง Q&A pairs จาก document เดียว"""
+    pairs = []
+    region = doc["metadata"]["region_th"]
+    text = doc["text"]
+
+    # Extract info
+    lines = text.split("\n")
+    consumption = None
+    growth = None
+    customers = None
+
+    for line in lines:
+        if "ปริมาณการใช้ไฟฟ้า" in line:
+            consumption = line.split(":")[1].strip()
+        elif "อัตราการเติบโต" in line:
+            growth = line.split(":")[1].strip()
+        elif "จำนวนผู้ใช้ไฟฟ้า" in line:
+            customers = line.split(":")[1].strip()
+
+    # Create Q&A pairs
+    if consumption:
+        pairs.append({
+            "instruction": f"{region}มีการใช้ไฟฟ้าเท่าไหร่ในปี 2566",
+            "input": "",
+            "output": f"{region}มีการใช้ไฟฟ้า {consumption} ในปี 2566"
+        })
+
+    if growth:
+        pairs.append({
+            "instruction": f"อัตราการเติบโตของการใช้ไฟฟ้าใน{region}เป็นเท่าไหร่",
+            "input": "",
+            "output": f"{region}มีอัตราการเติบโตของการใช้ไฟฟ้า {growth}"
+        })
+
+    return pairs
+
+
 def create_qa_dataset(documents):
     """สร้าง Q&A dataset สำหรับ fine-tuning"""
     print("\n" + "=" * 60)
     print("CREATING Q&A DATASET FOR FINE-TUNING")
     print("=" * 60)
 
-    qa_pairs = []
-
-    # Generate Q&A pairs from data
-    for doc in documents:
-        region = doc["metadata"]["region_th"]
-        text = doc["text"]
-
-        # Extract info
-        lines = text.split("\n")
-        consumption = None
-        growth = None
-        customers = None
-
-        for line in lines:
-            if "ปริมาณการใช้ไฟฟ้า" in line:
-                consumption = line.split(":")[1].strip()
-            elif "อัตราการเติบโต" in line:
-                growth = line.split(":")[1].strip()
-            elif "จำนวนผู้ใช้ไฟฟ้า" in line:
-                customers = line.split(":")[1].strip()
-
-        # Create Q&A pairs
-        if consumption:
-            qa_pairs.append({
-                "instruction": f"{region}มีการใช้ไฟฟ้าเท่าไหร่ในปี 2566",
-                "input": "",
-                "output": f"{region}มีการใช้ไฟฟ้า {consumption} ในปี 2566"
-            })
-
-        if growth:
-            qa_pairs.append({
-                "instruction": f"อัตราการเติบโตของการใช้ไฟฟ้าใน{region}เป็นเท่าไหร่",
-                "input": "",
-                "output": f"{region}มีอัตราการเติบโตของการใช้ไฟฟ้า {growth}"
-            })
-
-    # Save as JSONL for fine-tuning
+    count = 0
+    samples = []
+
+    # Save as JSONL for fine-tuning (เขียนทีละ document ไม่สะสมทั้ง dataset)
     output_path = Path(__file__).parent.parent / "data" / "qa_finetune.jsonl"
     with open(output_path, "w", encoding="utf-8") as f:
-        for qa in qa_pairs:
-            f.write(json.dumps(qa, ensure_ascii=False) + "\n")
-
-    print(f"✅ Created {len(qa_pairs)} Q&A pairs")
+        for doc in documents:
+            for qa in qa_pairs_for(doc):
+                f.write(json.dumps(qa, ensure_ascii=False) + "\n")
+                count += 1
+                if len(samples) < 3:
+                    samples.append(qa)
+
+    print(f"✅ Created {count} Q&A pairs")
     print(f"   Saved to: {output_path}")
 
     print("\nSample Q&A pairs:")
-    for qa in qa_pairs[:3]:
+    for qa in samples:
         print(f"\n  Q: {qa['instruction']}")
         print(f"  A: {qa['output']}")
 
@@ -214,22 +251,21 @@ def main():
     print("LANGCHAIN RAG EXAMPLE - Level 6 AI-Ready Data")
     print("=" * 60)
 
-    # Load documents
-    documents = load_documents()
-    print(f"\nLoaded {len(documents)} documents")
+    # Load vector index (สร้างไว้แล้วโดย prepare_data.py)
+    index = load_vector_index()
 
-    # Create vector store
-    vectorstore = create_vectorstore(documents)
+    if index:
+        from retrieval import RetrievalService
+        service = RetrievalService(index, lexical=load_lexical_index())
 
-    if vectorstore:
         # Simple RAG demo (retrieval only)
-        simple_rag_demo(vectorstore)
+        simple_rag_demo(service)
 
         # Full RAG demo (with LLM)
-        full_rag_demo(vectorstore)
+        full_rag_demo(service)
 
     # Create Q&A dataset for fine-tuning
-    create_qa_dataset(documents)
+    create_qa_dataset(load_documents())
 
     print("\n" + "=" * 60)
     print("✅ RAG demo complete!")
@@ -10,20 +10,40 @@ import pandas as pd
 from pathlib import Path
 
 
-def load_data():
-    """โหลดข้อมูลจาก Parquet หรือ CSV"""
+def load_data(years=None, regions=None, columns=None):
+    """
+    โหลดข้อมูลจาก Parquet หรือ CSV
+
+    years/regions: อ่านเฉพาะ partition year=.../region_code=... ที่ต้องการ
+    columns: อ่านเฉพาะคอลัมน์ที่ระบุ
+    """
     data_dir = Path(__file__).parent.parent / "data"
 
-    # ลอง Parquet ก่อน (เร็วกว่า)
+    filters = []
+    if years:
+        filters.append(("year", "in", [int(year) for year in years]))
+    if regions:
+        filters.append(("region_code", "in", list(regions)))
+
+    # ลอง Parquet ก่อน (เร็วกว่า) - prepare_data.py เขียนเป็นโฟลเดอร์แบ่ง partition
+    # filter บนคอลัมน์ partition ทำให้ไม่ต้องเปิดไฟล์ของ partition อื่นเลย
     parquet_path = data_dir / "energy_stats.parquet"
     if parquet_path.exists():
         print("Loading from Parquet...")
-        return pd.read_parquet(parquet_path)
+        df = pd.read_parquet(parquet_path, columns=columns, filters=filters or None)
+        if "year" in df.columns:
+            df["year"] = df["year"].astype("int64")  # ค่าจากชื่อโฟลเดอร์ถูกอ่านเป็น category
+        return df
 
     # Fallback to CSV
     csv_path = data_dir / "energy_stats_clean.csv"
     print("Loading from CSV...")
-    return pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, usecols=columns)
+    if years:
+        df = df[df["year"].isin([int(year) for year in years])]
+    if regions:
+        df = df[df["region_code"].isin(list(regions))]
+    return df
 
 
 def basic_analysis(df: pd.DataFrame):
@@ -9,7 +9,7 @@ Level 6: AI-Ready Government Data
          Production ML ต้องใช้ข้อมูลหลายปี/หลายจังหวัด
 """
 
-import json
+import sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
@@ -19,18 +19,18 @@ from sklearn.linear_model import LinearRegression, Ridge
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from jsonl_reader import iter_batches
+
 
 def load_data():
     """โหลดข้อมูล"""
     data_dir = Path(__file__).parent.parent / "data"
     jsonl_path = data_dir / "energy_stats.jsonl"
 
-    records = []
-    with open(jsonl_path, "r", encoding="utf-8") as f:
-        for line in f:
-            records.append(json.loads(line))
-
-    return pd.DataFrame(records)
+    # สร้าง DataFrame ทีละ batch - ไม่ต้องถือ list ของ dict ทั้งไฟล์
+    frames = [pd.DataFrame(batch) for batch in iter_batches(jsonl_path)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 
 def prepare_features(df: pd.DataFrame):
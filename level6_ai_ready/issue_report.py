@@ -0,0 +1,140 @@
+"""
+Validation Issue Report
+Level 6: เขียนปัญหาที่ DataValidator พบลงไฟล์ทันทีระหว่างตรวจ (ไม่ต้องเก็บไว้ใน memory)
+
+รูปแบบเลือกตามนามสกุลของไฟล์:
+
+    report.jsonl    หนึ่งบรรทัดต่อปัญหา {"file", "row", "rule", "severity", "message", "value"}
+                    บรรทัดสุดท้ายเป็นสรุป {"summary": {...}}
+    report.sarif    SARIF 2.1.0 (results เขียนต่อท้ายทีละรายการ ปิด JSON ตอน close)
+                    เปิดใน GitHub code scanning / VS Code SARIF Viewer ได้
+
+รัน: python validation.py --report reports/validation.sarif
+"""
+
+import json
+import os
+from json.encoder import encode_basestring
+
+SARIF_VERSION = "2.1.0"
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "energy-stats-validation"
+
+
+class ReportWriter:
+    """
+    เขียนปัญหาลงไฟล์ report แบบ streaming
+    rules: rule -> (severity, ข้อความ) ของ CompiledSchema
+    artifact: ไฟล์ข้อมูลที่กำลังตรวจ (ใส่ในทุกปัญหาที่เขียนหลังจากนี้)
+    """
+
+    def __init__(self, path, rules: dict, fmt: str = None):
+        self.path = str(path)
+        self.rules = rules
+        self.format = fmt or ("sarif" if self.path.endswith((".sarif", ".sarif.json")) else "jsonl")
+        if self.format not in ("jsonl", "sarif"):
+            raise ValueError(f"Unknown report format {self.format!r}. Must be 'jsonl' or 'sarif'")
+        self.artifact = None
+        self.written = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        if self.format == "sarif":
+            self._write_sarif_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rule: str, rows, values=None):
+        """เขียนปัญหาของ rule เดียวกันหลายแถว (rows/values แบบเดียวกับ IssueLog.extend)"""
+        rows = rows.tolist() if hasattr(rows, "tolist") else list(rows)
+        values = values.tolist() if hasattr(values, "tolist") else values
+        template = self.rules[rule][1]
+        pairs = zip(rows, values if values is not None else (None,) * len(rows))
+        entry = self._entry_format(rule)
+        self._file.write("".join(entry(row, template.format(value=value), value) for row, value in pairs))
+
+    def emit(self, row, rule: str, message: str, value=None):
+        """เขียนปัญหาหนึ่งรายการที่มีข้อความแล้ว"""
+        self._file.write(self._entry_format(rule)(row, message, value))
+
+    def _entry_format(self, rule: str):
+        """
+        ฟังก์ชัน (row, message, value) -> ข้อความของปัญหาหนึ่งรายการในรูปแบบของ report
+        ส่วนที่เหมือนกันทุกรายการของ rule (rule, severity, ไฟล์) encode เป็น JSON ครั้งเดียว
+        """
+        severity = self.rules[rule][0]
+        if self.format == "jsonl":
+            head = f'{{"file": {_json(self.artifact)}, "row": '
+            middle = f', "rule": {_json(rule)}, "severity": {_json(severity)}, "message": '
+
+            def entry(row, message, value):
+                self.written += 1
+                return f'{head}{_json(row)}{middle}{_string(message)}, "value": {_json(value)}}}\n'
+            return entry
+
+        head = f'{{"ruleId": {_json(rule)}, "level": {_json(severity)}, "message": {{"text": '
+        location = None
+        if self.artifact:
+            location = f'"locations": [{{"physicalLocation": {{"artifactLocation": {{"uri": {_json(self.artifact)}}}'
+
+        def result(row, message, value):
+            text = f"{head}{_string(message)}}}"
+            if location is not None:
+                region = "" if row is None else f', "region": {{"startLine": {row}}}'
+                text = f"{text}, {location}{region}}}}}]"
+            text = ("\n" if not self.written else ",\n") + text + "}"
+            self.written += 1
+            return text
+        return result
+
+    def copy(self, part_path, row_offset: int = 0):
+        """เขียนปัญหาจากไฟล์ JSONL ของ shard (ReportWriter แบบ jsonl) เลขแถวบวก row_offset"""
+        with open(part_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if "summary" in entry:
+                    continue
+                row = entry["row"]
+                self.emit(None if row is None else row + row_offset, entry["rule"],
+                          entry["message"], entry["value"])
+
+    def close(self, summary: dict = None):
+        """ปิดไฟล์ (summary: สรุปผลที่เขียนต่อท้าย เช่น จำนวนปัญหาแต่ละ rule)"""
+        if self._file.closed:
+            return
+        if self.format == "jsonl":
+            if summary is not None:
+                self._file.write(json.dumps({"summary": summary}, ensure_ascii=False, default=str) + "\n")
+        else:
+            self._file.write("\n]")
+            if summary is not None:
+                self._file.write(',\n"properties": ' + json.dumps(summary, ensure_ascii=False, default=str))
+            self._file.write("\n}]}\n")
+        self._file.close()
+
+    def _write_sarif_header(self):
+        rules = [{"id": rule, "shortDescription": {"text": message},
+                  "defaultConfiguration": {"level": severity}}
+                 for rule, (severity, message) in self.rules.items()]
+        driver = {"name": TOOL_NAME, "rules": rules}
+        header = json.dumps({"version": SARIF_VERSION, "$schema": SARIF_SCHEMA}, ensure_ascii=False)
+        self._file.write(header[:-1] + ', "runs": [{"tool": '
+                         + json.dumps({"driver": driver}, ensure_ascii=False) + ',\n"results": [')
+
+
+def _string(text: str) -> str:
+    """JSON ของข้อความ (ไม่ escape ภาษาไทย)"""
+    return encode_basestring(text)
+
+
+def _json(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return json.dumps(value, ensure_ascii=False, default=str)
@@ -0,0 +1,222 @@
+"""
+Streaming JSONL Reader
+Level 6: อ่านไฟล์ JSONL ทีละ batch แทนการโหลดทั้งไฟล์เป็น list
+
+ไฟล์ JSONL รายเดือนมีขนาดหลาย GB ทุกขั้นตอนของ Level 6 จึงอ่านผ่านโมดูลนี้
+ซึ่งถือ record ในหน่วยความจำไม่เกินหนึ่ง batch:
+
+    for record in iter_records(path): ...              # ทีละ record
+    for batch in iter_batches(path, 10_000): ...       # list ของ dict ขนาดคงที่
+    for batch in iter_arrow_batches(path): ...         # pyarrow.RecordBatch
+    for first, lines in iter_line_blocks(path): ...    # บรรทัดดิบ (parse ทั้งก้อนเอง)
+
+line_shards แบ่งไฟล์เป็นช่วง byte ที่ขอบตรงต้นบรรทัด ให้หลาย process อ่านคนละช่วงพร้อมกัน
+
+ใช้ orjson ถ้าติดตั้งไว้ (เร็วกว่า json มาตรฐานหลายเท่า) ไม่มีก็ใช้ json ปกติ
+
+รัน: pip install orjson pyarrow   (ไม่บังคับ)
+"""
+
+import io
+import json
+import os
+from itertools import islice
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    # orjson.JSONDecodeError เป็น subclass ของ json.JSONDecodeError จึงจับแบบเดียวกันได้
+    def _reject_constant(name):
+        raise ValueError(f"{name} is not valid JSON")
+
+    def loads(data):
+        """json.loads ที่ไม่รับ NaN/Infinity (ให้ผลเหมือน orjson)"""
+        return json.loads(data, parse_constant=_reject_constant)
+
+# จำนวน record ต่อ batch ตั้งต้น
+BATCH_SIZE = 10_000
+
+
+def batched(iterable, size: int):
+    """แบ่ง iterable เป็น list ขนาดไม่เกิน size"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_numbered_records(filepath, on_error=None):
+    """yield (เลขบรรทัด, record) - on_error(เลขบรรทัด, exception) ถ้ากำหนดจะข้ามบรรทัดที่เสีย"""
+    for first_line, lines in iter_line_blocks(filepath):
+        yield from parse_lines(lines, first_line, on_error, filepath)
+
+
+def iter_line_blocks(filepath, size: int = BATCH_SIZE, start: int = 0, end: int = None):
+    """
+    yield (เลขบรรทัดแรก, list ของบรรทัดแบบ bytes) ทีละไม่เกิน size บรรทัด (ยังไม่ parse)
+    start/end: อ่านเฉพาะช่วง byte นั้น (ดู line_shards) เลขบรรทัดนับ 1 จาก start
+    """
+    # อ่านแบบ binary: orjson/json parse bytes ได้โดยตรง ไม่ต้อง decode ก่อน
+    with open_range(filepath, start, end) as f:
+        line_num = 1
+        while lines := list(islice(f, size)):
+            yield line_num, lines
+            line_num += len(lines)
+
+
+# ===========================================
+# Byte-range shards
+# ===========================================
+
+class _ByteRange(io.RawIOBase):
+    """อ่านไฟล์เฉพาะ byte [start, end)"""
+
+    def __init__(self, filepath, start: int, end: int):
+        self._file = open(filepath, "rb")
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._left)
+        if size <= 0:
+            return 0
+        count = self._file.readinto(memoryview(buffer)[:size])
+        self._left -= count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_range(filepath, start: int = 0, end: int = None):
+    """เปิดไฟล์แบบ binary เฉพาะช่วง byte [start, end) - end = None คือถึงท้ายไฟล์"""
+    if not start and end is None:
+        return open(filepath, "rb")
+    if end is None:
+        end = os.path.getsize(filepath)
+    return io.BufferedReader(_ByteRange(filepath, start, end), buffer_size=1 << 20)
+
+
+def line_shards(filepath, count: int, start: int = 0) -> list:
+    """
+    แบ่งไฟล์ (ตั้งแต่ byte start) เป็นไม่เกิน count ช่วง [start, end) ที่ขอบตรงต้นบรรทัดพอดี
+    แต่ละช่วงอ่านแยกกันได้ (เช่น คนละ process) โดยไม่มีบรรทัดถูกตัดครึ่ง
+    """
+    size = os.path.getsize(filepath)
+    bounds = [start]
+    with open(filepath, "rb") as f:
+        for i in range(1, count):
+            position = start + (size - start) * i // count
+            if position <= bounds[-1]:
+                continue
+            f.seek(position - 1)
+            f.readline()  # ไปต้นบรรทัดถัดไป (ถ้า position อยู่ต้นบรรทัดพอดีจะอยู่ที่ position)
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return [(begin, end) for begin, end in zip(bounds, bounds[1:]) if begin < end]
+
+
+def parse_lines(lines, first_line: int = 1, on_error=None, source="<lines>"):
+    """yield (เลขบรรทัด, record) จากบรรทัด JSONL (ข้ามบรรทัดว่าง กติกา on_error เหมือน iter_numbered_records)"""
+    for line_num, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+        except ValueError as e:
+            if on_error is None:
+                raise ValueError(f"{source}:{line_num}: Invalid JSON - {e}") from e
+            on_error(line_num, e)
+            continue
+        yield line_num, record
+
+
+def iter_records(filepath, on_error=None):
+    """yield record ทีละตัวจากไฟล์ JSONL"""
+    for _, record in iter_numbered_records(filepath, on_error):
+        yield record
+
+
+def iter_batches(filepath, batch_size: int = BATCH_SIZE, on_error=None):
+    """yield list ของ record ขนาด batch_size (batch สุดท้ายอาจเล็กกว่า)"""
+    return batched(iter_records(filepath, on_error), batch_size)
+
+
+def iter_arrow_batches(filepath, batch_size: int = BATCH_SIZE, schema=None,
+                       types: dict = None, on_error=None):
+    """
+    yield pyarrow.RecordBatch ขนาด batch_size
+
+    ถ้าไม่กำหนด schema จะอนุมานจากข้อมูล: schema ขยายเมื่อพบ field ใหม่
+    (batch ก่อนหน้าจึงอาจมีคอลัมน์น้อยกว่า ดู conform_batch) ถ้ากำหนด schema
+    จะใช้ schema นั้นกับทุก batch และ field ที่ไม่อยู่ใน schema จะถูกตัดทิ้ง
+    (types: {field: pyarrow type} ใช้แทนชนิดที่อนุมานได้)
+    """
+    return to_arrow_batches(iter_batches(filepath, batch_size, on_error), schema, types)
+
+
+def to_arrow_batches(batches, schema=None, types: dict = None):
+    """แปลง list ของ record แต่ละ batch เป็น pyarrow.RecordBatch (กติกา schema เหมือน iter_arrow_batches)"""
+    pa = _pyarrow()
+    fixed = schema is not None
+
+    for batch in batches:
+        if not fixed:
+            schema = extend_schema(schema, batch, types)
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+def extend_schema(schema, batch: list, types: dict = None):
+    """
+    schema หลังพบ record ของ batch (list ของ dict) - ใช้หา schema ของทั้งไฟล์ได้
+    โดยไม่ต้องแปลงทุก batch เป็น Arrow (ได้ผลเท่ากับ schema สุดท้ายของ to_arrow_batches)
+    """
+    pa = _pyarrow()
+    names = list(dict.fromkeys(name for record in batch for name in record))
+    # อนุมานใหม่เฉพาะเมื่อมี field ใหม่ หรือ field ที่ยังเป็น null ทั้งหมด
+    # (from_pylist อนุมานจาก key ของ record แรกเท่านั้น จึงสร้างทีละคอลัมน์เอง)
+    if schema is None or any(
+        name not in schema.names or pa.types.is_null(schema.field(name).type)
+        for name in names
+    ):
+        inferred = pa.RecordBatch.from_pydict(
+            {name: [record.get(name) for record in batch] for name in names}
+        ).schema
+        schema = merge_schema(schema, inferred, types)
+    return schema
+
+
+def merge_schema(schema, inferred, types: dict = None):
+    """เพิ่ม field ใหม่จาก inferred ต่อท้าย schema (field ที่เคยเป็น null ใช้ชนิดใหม่)"""
+    pa = _pyarrow()
+    fields = {field.name: field for field in schema or []}
+    for field in inferred:
+        current = fields.get(field.name)
+        if current is None or pa.types.is_null(current.type):
+            fields[field.name] = pa.field(field.name, (types or {}).get(field.name, field.type))
+    return pa.schema(list(fields.values()))
+
+
+def conform_batch(batch, schema):
+    """ปรับ RecordBatch ให้ตรง schema (คอลัมน์ที่ขาดเติมเป็น null)"""
+    pa = _pyarrow()
+    columns = [
+        batch.column(field.name).cast(field.type)
+        if field.name in batch.schema.names else pa.nulls(batch.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("pyarrow is required for Arrow batches: pip install pyarrow")
+    return pa
@@ -0,0 +1,235 @@
+"""
+Lexical Index (BM25)
+Level 6: inverted index สำหรับค้นด้วยคำตรงตัว (ชื่อภูมิภาค ตัวเลข รหัส) ใช้คู่กับ vector index
+
+    build_lexical_index(documents, "data/embeddings")     # documents: ข้อความตามลำดับแถวของ embeddings
+    lexical = load_lexical_index("data/embeddings")
+    lexical.search("ภาคอีสาน 22,180 GWh", k=10)           # (rows, scores)
+
+dense embedding ขนาดเล็กมักสับสนคำที่ใกล้กัน เช่น "ภาคอีสาน" กับ "ภาคตะวันออก"
+BM25 ให้คะแนนคำที่ตรงกันจริง RetrievalService (retrieval.py) จึงรวมคะแนนทั้งสองแบบ
+
+ตัดคำภาษาไทยด้วย pythainlp (newmm) ถ้าติดตั้งไว้ ไม่มีจะใช้ bigram ของตัวอักษรไทยแทน
+ก่อนตัดคำ: ตัวเลขไทยเป็นเลขอารบิก ตัด "," ในตัวเลข และแทนชื่อเรียกอื่นของภูมิภาค (อีสาน -> ตะวันออกเฉียงเหนือ)
+
+เก็บใน data/embeddings/lexical/ (ถูกลบพร้อม embeddings เมื่อเขียนใหม่):
+    lexical.json   tokenizer, count, k1, b
+    vocab.json     คำ -> term id
+    offsets.npy    posting ของ term i คือ [offsets[i], offsets[i + 1])
+    rows.npy       แถวของแต่ละ posting
+    weights.npy    คะแนน BM25 ของคำนั้นในแถวนั้น (คำนวณไว้ตอนสร้าง - ค้นด้วยการบวกอย่างเดียว)
+
+รัน: pip install numpy pythainlp   (pythainlp ไม่บังคับ)
+"""
+
+import importlib.util
+import json
+import re
+import shutil
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+LEXICAL_DIR = "lexical"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# คำที่อยู่ในเกินสัดส่วนนี้ของเอกสาร (เช่น "ภาค", "ไฟฟ้า") ถูกข้ามตอนค้น ถ้า query มีคำอื่นที่เจาะจงกว่า
+COMMON_TERM_RATIO = 0.5
+
+# ชื่อเรียกอื่น -> ชื่อที่ใช้ในข้อมูล (แทนที่ทั้งตอนสร้าง index และตอนค้น)
+ALIASES = {
+    "อีสาน": "ตะวันออกเฉียงเหนือ",
+    "ปักษ์ใต้": "ใต้",
+}
+
+_THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+_NUMBER_COMMA = re.compile(r"(?<=\d),(?=\d{3})")
+_THAI = re.compile(r"[\u0e01-\u0e4e]")
+_TOKEN = re.compile(r"[\u0e01-\u0e4e]+|[a-z]+(?:-[a-z]+)*|\d+(?:\.\d+)?")
+_ALIAS = re.compile("|".join(map(re.escape, ALIASES)))
+
+
+def default_tokenizer() -> str:
+    """newmm ถ้าติดตั้ง pythainlp ไม่เช่นนั้น bigram"""
+    return "newmm" if importlib.util.find_spec("pythainlp") else "bigram"
+
+
+def normalize_text(text: str) -> str:
+    """ข้อความก่อนตัดคำ (ตัวพิมพ์เล็ก เลขอารบิก ไม่มี , ในตัวเลข แทนชื่อเรียกอื่นแล้ว)"""
+    text = unicodedata.normalize("NFC", text).lower().translate(_THAI_DIGITS)
+    text = text.replace("\u0e4d\u0e32", "\u0e33")  # นิคหิต + สระอา -> สระอำ
+    text = _NUMBER_COMMA.sub("", text)
+    return _ALIAS.sub(lambda match: ALIASES[match.group()], text)
+
+
+class Tokenizer:
+    """ตัดข้อความเป็นคำ: ภาษาไทยด้วย newmm หรือ bigram, อังกฤษ/ตัวเลข/รหัสตามช่องว่าง"""
+
+    def __init__(self, engine: str = None):
+        self.engine = engine or default_tokenizer()
+        if self.engine == "newmm":
+            try:
+                from pythainlp.corpus import thai_stopwords
+                from pythainlp.tokenize import word_tokenize
+            except ImportError:
+                raise ImportError("pythainlp is required for the newmm tokenizer: pip install pythainlp")
+            self._word_tokenize = word_tokenize
+            self._stopwords = frozenset(thai_stopwords())
+        elif self.engine != "bigram":
+            raise ValueError(f"Unknown tokenizer {self.engine!r}. Must be 'newmm' or 'bigram'")
+
+    def _thai(self, run: str):
+        if self.engine == "newmm":
+            for word in self._word_tokenize(run, engine="newmm", keep_whitespace=False):
+                if word not in self._stopwords:
+                    yield word
+        elif len(run) == 1:
+            yield run
+        else:
+            for i in range(len(run) - 1):
+                yield run[i:i + 2]
+
+    def __call__(self, text: str) -> list:
+        tokens = []
+        for match in _TOKEN.finditer(normalize_text(text)):
+            token = match.group()
+            if _THAI.match(token):
+                tokens.extend(self._thai(token))
+            else:
+                tokens.append(token)
+        return tokens
+
+
+# ===========================================
+# Build
+# ===========================================
+
+def build_lexical_index(documents, embeddings_dir, tokenizer: str = None,
+                        k1: float = BM25_K1, b: float = BM25_B):
+    """
+    สร้าง BM25 index จาก documents (iterable ของข้อความ ลำดับเดียวกับแถวของ embeddings)
+    แล้วบันทึกใน embeddings_dir/lexical/ คืน LexicalIndex ที่โหลดแล้ว
+
+    posting ถูกเก็บเป็น array แบบ compact ระหว่างอ่าน ไม่ถือข้อความทั้งหมดไว้
+    """
+    tokenize = Tokenizer(tokenizer)
+    vocab = {}
+    term_ids, rows, tfs, lengths = array("q"), array("q"), array("q"), array("q")
+
+    for row, text in enumerate(documents):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(tf)
+
+    count = len(lengths)
+    term_ids = np.frombuffer(term_ids, dtype=np.int64)
+    rows = np.frombuffer(rows, dtype=np.int64)
+    tfs = np.frombuffer(tfs, dtype=np.int64).astype(np.float32)
+    lengths = np.frombuffer(lengths, dtype=np.int64).astype(np.float32)
+
+    # เรียง posting ตาม term (ภายใน term เรียงตามแถว) -> CSR
+    order = np.argsort(term_ids, kind="stable")
+    term_ids, rows, tfs = term_ids[order], rows[order], tfs[order]
+    df = np.bincount(term_ids, minlength=len(vocab))
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+
+    # BM25: idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    avgdl = float(lengths.mean()) if count else 0.0
+    idf = np.log1p((count - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = k1 * (1 - b + b * lengths[rows] / (avgdl or 1.0))
+    weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    output = Path(embeddings_dir) / LEXICAL_DIR
+    staging = output.with_name(output.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    np.save(staging / "offsets.npy", offsets)
+    np.save(staging / "rows.npy", rows.astype(np.int32 if count < 2 ** 31 else np.int64))
+    np.save(staging / "weights.npy", weights)
+    with open(staging / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    info = {"tokenizer": tokenize.engine, "count": count, "terms": len(vocab),
+            "postings": len(rows), "k1": k1, "b": b, "avgdl": round(avgdl, 3)}
+    with open(staging / "lexical.json", "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output, ignore_errors=True)
+    staging.rename(output)
+    return LexicalIndex(embeddings_dir)
+
+
+def lexical_info(embeddings_dir) -> dict:
+    """lexical.json ของ index ที่สร้างไว้ (None ถ้ายังไม่มี)"""
+    try:
+        with open(Path(embeddings_dir) / LEXICAL_DIR / "lexical.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_lexical_index(embeddings_dir):
+    """โหลด BM25 index ที่สร้างไว้ (posting เป็น memory map)"""
+    return LexicalIndex(embeddings_dir)
+
+
+# ===========================================
+# Search
+# ===========================================
+
+class LexicalIndex:
+    """BM25 index ที่บันทึกไว้ ค้นด้วยการรวม weight ของ posting ของคำใน query"""
+
+    def __init__(self, embeddings_dir):
+        self.directory = Path(embeddings_dir) / LEXICAL_DIR
+        self.info = lexical_info(embeddings_dir)
+        if self.info is None:
+            raise FileNotFoundError(f"No lexical index in {self.directory} (run build_lexical_index first)")
+        self.tokenize = Tokenizer(self.info["tokenizer"])
+        with open(self.directory / "vocab.json", "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        self.offsets = np.load(self.directory / "offsets.npy")
+        self.rows = np.load(self.directory / "rows.npy", mmap_mode="r")
+        self.weights = np.load(self.directory / "weights.npy", mmap_mode="r")
+
+    def __len__(self):
+        return self.info["count"]
+
+    def terms(self, query: str) -> list:
+        """term id ของคำใน query ที่มีใน index (ข้ามคำที่พบบ่อยเกินไปถ้ามีคำอื่น)"""
+        ids = [self.vocab[token] for token in dict.fromkeys(self.tokenize(query)) if token in self.vocab]
+        limit = COMMON_TERM_RATIO * len(self)
+        specific = [i for i in ids if self.offsets[i + 1] - self.offsets[i] <= limit]
+        return specific or ids
+
+    def search(self, query: str, k: int = 10, mask=None) -> tuple:
+        """(rows, scores) ของ k แถวที่คะแนน BM25 สูงสุด (mask: แถวที่อนุญาต ดู VectorIndex.filter_mask)"""
+        ids = self.terms(query)
+        if not ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        weights = np.concatenate([self.weights[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        if mask is not None:
+            keep = mask[rows]
+            rows, weights = rows[keep], weights[keep]
+        # รวมคะแนนของแต่ละแถว (แถวเดียวกันจากหลายคำ)
+        unique, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return unique[top].astype(np.int64), scores[top]
+
+    def search_many(self, queries: list, k: int = 10, mask=None) -> list:
+        """[(rows, scores)] ของแต่ละ query"""
+        return [self.search(query, k, mask) for query in queries]
@@ -0,0 +1,160 @@
+"""
+Prepare Manifest
+Level 6: บันทึก hash ของไฟล์ input และของแต่ละ partition ให้ prepare_data.py
+ทำงานซ้ำเฉพาะส่วนที่เปลี่ยน
+
+โครงสร้าง data/prepare_manifest.json:
+    {
+      "version": 1,
+      "input": {"path": ..., "size": ..., "mtime_ns": ..., "digest": ...},
+      "partitions": {"year=2566/region_code=TH-C": {"digest": ..., "rows": ...}},
+      "stages": {
+        "parquet": {"partitions": {...}, "schema": ..., "options": {...}},
+        "embeddings": {"partitions": {...}, "model": ...},
+        "hf_dataset": {"partitions": {...}, "schema": ...}
+      }
+    }
+
+digest ของ partition คือ hash ที่รวม hash ของทุก record ใน partition (ตามลำดับในไฟล์)
+แต่ละ stage จำ digest ที่ตัวเองประมวลผลไว้ล่าสุด stage ที่ล้มเหลวกลางทางจึงถูกทำซ้ำรอบหน้า
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+try:
+    import orjson
+
+    def canonical_json(record: dict) -> bytes:
+        """JSON ที่เรียง key แล้ว (ใช้คำนวณ hash ให้ได้ค่าเดิมทุกครั้ง)"""
+        return orjson.dumps(record, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    def canonical_json(record: dict) -> bytes:
+        """JSON ที่เรียง key แล้ว (ใช้คำนวณ hash ให้ได้ค่าเดิมทุกครั้ง)"""
+        return json.dumps(record, sort_keys=True, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path, chunk_size: int = 1 << 20) -> str:
+    """hash ของเนื้อหาไฟล์ (อ่านทีละ chunk)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_digest(record: dict) -> bytes:
+    """hash ของ record หนึ่งตัว (ไม่ขึ้นกับลำดับ key)"""
+    return hashlib.blake2b(canonical_json(record), digest_size=16).digest()
+
+
+def text_digest(text: str) -> str:
+    """hash ของข้อความที่นำไปสร้าง embedding"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PartitionDigests:
+    """สะสม hash ของ record แยกตาม partition ระหว่างอ่านไฟล์"""
+
+    def __init__(self):
+        self._digests = {}
+        self._rows = {}
+
+    def add(self, partition: str, record: dict):
+        if partition not in self._digests:
+            self._digests[partition] = hashlib.blake2b(digest_size=16)
+            self._rows[partition] = 0
+        self._digests[partition].update(record_digest(record))
+        self._rows[partition] += 1
+
+    def result(self) -> dict:
+        """{partition: {"digest": ..., "rows": ...}}"""
+        return {
+            partition: {"digest": digest.hexdigest(), "rows": self._rows[partition]}
+            for partition, digest in sorted(self._digests.items())
+        }
+
+
+class Manifest:
+    """สถานะของการรัน prepare_data ครั้งล่าสุด"""
+
+    def __init__(self, path, data: dict = None):
+        self.path = Path(path)
+        self.data = data or {"version": MANIFEST_VERSION, "stages": {}}
+
+    @classmethod
+    def load(cls, path):
+        """อ่าน manifest (ไม่มีไฟล์/อ่านไม่ได้/คนละ version = เริ่มใหม่ทั้งหมด)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        data.setdefault("stages", {})
+        return cls(path, data)
+
+    def save(self):
+        """เขียน manifest แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    # ----- input -----
+
+    def input_unchanged(self, path) -> bool:
+        """ไฟล์ input เหมือนรอบก่อนหรือไม่ (เช็ค size/mtime ก่อน แล้วค่อย hash เนื้อหา)"""
+        previous = self.data.get("input")
+        if not previous or previous.get("path") != str(path) or "partitions" not in self.data:
+            return False
+        stat = os.stat(path)
+        if stat.st_size != previous["size"]:
+            return False
+        if stat.st_mtime_ns == previous["mtime_ns"]:
+            return True
+        if file_digest(path) != previous["digest"]:
+            return False
+        previous["mtime_ns"] = stat.st_mtime_ns  # แค่ถูก touch เนื้อหาเดิม
+        return True
+
+    def record_input(self, path, partitions: dict):
+        """บันทึก hash ของ input และ digest ของทุก partition"""
+        stat = os.stat(path)
+        self.data["input"] = {
+            "path": str(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": file_digest(path),
+        }
+        self.data["partitions"] = partitions
+
+    @property
+    def partitions(self) -> dict:
+        return self.data.get("partitions", {})
+
+    # ----- stages -----
+
+    def stage(self, name: str) -> dict:
+        return self.data["stages"].get(name, {})
+
+    def set_stage(self, name: str, partitions: dict, **state):
+        """บันทึกว่า stage ประมวลผล partitions ชุดนี้เสร็จแล้ว แล้ว save ทันที"""
+        self.data["stages"][name] = {
+            "partitions": {key: value["digest"] for key, value in partitions.items()},
+            **state,
+        }
+        self.save()
+
+    def changes(self, name: str, partitions: dict) -> tuple:
+        """(partition ที่ใหม่หรือเปลี่ยน, partition ที่ถูกลบ) เทียบกับที่ stage ทำไว้"""
+        done = self.stage(name).get("partitions", {})
+        changed = {key for key, value in partitions.items() if done.get(key) != value["digest"]}
+        removed = set(done) - set(partitions)
+        return changed, removed
@@ -3,12 +3,33 @@ Prepare AI-Ready Data
 Level 6: แปลงข้อมูลให้พร้อมใช้กับ AI/ML
 
 รัน: pip install pandas pyarrow sentence-transformers
-     python prepare_data.py
+     python prepare_data.py [--workers 4] [--row-group-size 131072] [--compression zstd]
+                            [--embed-workers 4] [--embed-batch-size 64] [--index flat|ivf|hnsw]
+
+ทุกขั้นตอนอ่านไฟล์ JSONL แบบ streaming ทีละ batch (ดู jsonl_reader.py)
+จึงใช้หน่วยความจำคงที่ไม่ว่าไฟล์จะใหญ่แค่ไหน
+
+Parquet ถูกเขียนเป็น dataset แบบ Hive partition (year=.../region_code=.../part-0.parquet)
+ใน data/energy_stats.parquet/ - reader เลือกอ่านเฉพาะ partition ที่ต้องใช้ได้
 """
 
-import json
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from jsonl_reader import (
+    BATCH_SIZE, batched, conform_batch, extend_schema, iter_batches, iter_line_blocks, parse_lines,
+    to_arrow_batches,
+)
+from embeddings import (
+    CHECKPOINT_TEXTS, DTYPES, EmbeddingCache, EmbeddingWriter, embed_missing, load_encoder,
+)
+from lexical_index import build_lexical_index, default_tokenizer, lexical_info
+from manifest import Manifest, PartitionDigests, text_digest
+from vector_index import INDEX_KINDS, build_index, index_info
+
 # Check dependencies
 def check_dependencies():
     missing = []
@@ -28,120 +49,595 @@ def check_dependencies():
     return True
 
 
-def load_jsonl(filepath: str) -> list:
-    """Load JSONL file"""
-    records = []
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            records.append(json.loads(line.strip()))
-    return records
-
-
-def create_parquet(records: list, output_path: str):
-    """สร้างไฟล์ Parquet"""
-    import pandas as pd
-
-    df = pd.DataFrame(records)
-
-    # Set proper dtypes
-    df["region_code"] = df["region_code"].astype("category")
-    df["year"] = df["year"].astype("int64")
-    df["consumption_gwh"] = df["consumption_gwh"].astype("float64")
-    df["customers"] = df["customers"].astype("int64")
-    df["growth_rate"] = df["growth_rate"].astype("float64")
-
-    # Save as Parquet
-    df.to_parquet(output_path, engine="pyarrow", index=False)
-    print(f"✅ Created Parquet: {output_path}")
-    print(f"   Shape: {df.shape}")
-    print(f"   Size: {Path(output_path).stat().st_size:,} bytes")
+def parquet_types() -> dict:
+    """ชนิดข้อมูลของคอลัมน์หลักใน Parquet"""
+    import pyarrow as pa
+
+    return {
+        "region_code": pa.dictionary(pa.int32(), pa.string()),  # category
+        "year": pa.int64(),
+        "consumption_gwh": pa.float64(),
+        "customers": pa.int64(),
+        "growth_rate": pa.float64(),
+    }
+
+
+# ===========================================
+# Partitioned Parquet dataset
+# ===========================================
+
+# คอลัมน์ที่ใช้แบ่ง partition (ตามลำดับโฟลเดอร์)
+PARTITION_COLUMNS = ["year", "region_code"]
+
+# manifest ของการรันครั้งล่าสุด (อยู่ใน data/)
+MANIFEST_FILE = "prepare_manifest.json"
+
+# ค่าตั้งต้นของการเขียนไฟล์ Parquet
+PARQUET_OPTIONS = {
+    "row_group_size": 128 * 1024,
+    "compression": "zstd",
+    "use_dictionary": True,
+}
+
+
+def partition_path(key: tuple) -> str:
+    """โฟลเดอร์ของ partition: (2566, "TH-C") -> year=2566/region_code=TH-C"""
+    return "/".join(f"{column}={value}" for column, value in zip(PARTITION_COLUMNS, key))
+
+
+def split_partitions(batch) -> dict:
+    """แยก RecordBatch ตามค่า partition -> {key: batch ที่ไม่มีคอลัมน์ partition}"""
+    import pyarrow as pa
+
+    keys = zip(*(batch.column(column).to_pylist() for column in PARTITION_COLUMNS))
+    positions = {}
+    for i, key in enumerate(keys):
+        positions.setdefault(key, []).append(i)
+
+    # ค่า partition อยู่ในชื่อโฟลเดอร์แล้ว ไม่ต้องเก็บซ้ำในไฟล์
+    data = batch.select([name for name in batch.schema.names if name not in PARTITION_COLUMNS])
+    return {key: data.take(pa.array(rows)) for key, rows in positions.items()}
+
+
+def write_partition(task) -> int:
+    """worker: อ่าน spill files ของ partition หนึ่งแล้วเขียนเป็น Parquet คืนจำนวนแถว"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spill_paths, target, schema, options = task
+    row_group_size = options["row_group_size"]
+    rows = 0
+
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    with pq.ParquetWriter(
+        target, schema,
+        compression=options["compression"],
+        use_dictionary=options["use_dictionary"],
+        write_statistics=True,  # min/max ต่อ row group ให้ reader ข้าม row group ได้
+    ) as writer:
+        # รวม batch เล็กๆ ให้เต็ม row group ก่อนเขียน
+        pending, pending_rows = [], 0
+        for spill_path in spill_paths:
+            with pa.memory_map(spill_path) as source:
+                for batch in pa.ipc.open_stream(source):
+                    pending.append(conform_batch(batch, schema))
+                    pending_rows += batch.num_rows
+                    rows += batch.num_rows
+                    if pending_rows >= row_group_size:
+                        table = pa.Table.from_batches(pending)
+                        full = pending_rows - pending_rows % row_group_size
+                        writer.write_table(table.slice(0, full), row_group_size=row_group_size)
+                        rest = table.slice(full)
+                        pending, pending_rows = rest.to_batches(), rest.num_rows
+            os.remove(spill_path)
+        if pending_rows:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+
+    return rows
+
+
+def remove_partition(root: Path, partition: str):
+    """ลบโฟลเดอร์ของ partition และโฟลเดอร์แม่ที่ว่างแล้ว (เช่น year=... ที่ไม่เหลือ region)"""
+    path = root / partition
+    shutil.rmtree(path, ignore_errors=True)
+    for parent in path.parents:
+        if parent == root:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break  # ยังมี partition อื่นอยู่
+
+
+def replace_dir(staging: Path, output: Path):
+    """สลับ dataset ใหม่เข้าที่ output (ลบไฟล์/โฟลเดอร์เดิม)"""
+    if output.is_dir():
+        old = output.with_name(output.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        output.rename(old)
+        staging.rename(output)
+        shutil.rmtree(old)
+        return
+    if output.exists():
+        output.unlink()  # ไฟล์ Parquet เดี่ยวจากเวอร์ชันก่อน
+    staging.rename(output)
+
+
+def record_partition(record: dict) -> str:
+    """partition ของ record (ชื่อโฟลเดอร์ เช่น year=2566/region_code=TH-C)"""
+    return partition_path((int(record["year"]), record["region_code"]))
+
+
+def scan_partitions(jsonl_path, batch_size: int = BATCH_SIZE):
+    """
+    อ่าน JSONL หนึ่งรอบโดยไม่แปลงเป็น Arrow และไม่พักข้อมูลลงดิสก์
+    คืน (digests ของแต่ละ partition, schema ของทั้งไฟล์, blocks)
+    blocks: {partition: [(start, end) ช่วง byte ของ block ที่มี record ของ partition]}
+    """
+    digests = PartitionDigests()
+    blocks = {}
+    schema = None
+
+    def records():
+        position = 0
+        for first_line, lines in iter_line_blocks(jsonl_path, batch_size):
+            block = (position, position + sum(map(len, lines)))
+            position = block[1]
+            for _, record in parse_lines(lines, first_line, source=jsonl_path):
+                partition = record_partition(record)
+                digests.add(partition, record)
+                found = blocks.setdefault(partition, [])
+                if not found or found[-1] != block:
+                    found.append(block)
+                yield record
+
+    # แบ่ง batch แบบเดียวกับ iter_batches schema จึงตรงกับที่ to_arrow_batches อนุมานได้
+    for batch in batched(records(), batch_size):
+        schema = extend_schema(schema, batch, parquet_types())
+    return digests.result(), schema, blocks
+
+
+def iter_partition_batches(jsonl_path, ranges, partitions: set, batch_size: int = BATCH_SIZE):
+    """yield batch ของ record เฉพาะ partition ที่ระบุ โดยอ่านเฉพาะช่วง byte ใน ranges"""
+    def records():
+        for start, end in ranges:
+            for first_line, lines in iter_line_blocks(jsonl_path, batch_size, start, end):
+                for _, record in parse_lines(lines, first_line, source=jsonl_path):
+                    if record_partition(record) in partitions:
+                        yield record
+
+    return batched(records(), batch_size)
+
+
+def merge_ranges(ranges) -> list:
+    """รวมช่วง byte ที่ติดกันหรือซ้อนกัน (เรียงตาม start)"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def create_parquet(jsonl_path, output_path: str, manifest: Manifest, batch_size: int = BATCH_SIZE,
+                   workers: int = None, **options) -> dict:
+    """
+    สร้าง/ปรับ Parquet dataset แบบ Hive partition ตาม year/region_code
+    คืน {partition: {"digest", "rows"}} ของข้อมูลทั้งหมด
+
+    ขั้นที่ 1: อ่าน JSONL แบบ streaming พัก record แต่ละ partition เป็น Arrow IPC
+              - ถ้ามี dataset เดิม อ่านรอบแรกเพื่อ hash อย่างเดียว (scan_partitions)
+                แล้วพักเฉพาะ partition ที่ digest เปลี่ยน โดยอ่านเฉพาะ block ที่มี partition นั้น
+    ขั้นที่ 2: worker processes เขียนเฉพาะ partition ที่ใหม่หรือเปลี่ยนเป็น Parquet พร้อมกัน
+    """
+    import pyarrow as pa
+
+    options = {**PARQUET_OPTIONS, **options}
+    output = Path(output_path)
+    staging = output.with_name(output.name + ".tmp")
+    spill_dir = staging / "_spill"
+
+    # เขียนใหม่ทั้งหมดถ้า schema/ตัวเลือกเปลี่ยน หรือยังไม่มี dataset เดิม
+    # ไม่อย่างนั้นเขียนเฉพาะ partition ที่ digest ต่างจากรอบก่อน
+    stage = manifest.stage("parquet")
+    full = not output.is_dir() or stage.get("options") != options
+    digests = PartitionDigests()
+    partitions = schema = None
+
+    if full:
+        # ต้องเขียนทุก partition อยู่แล้ว - hash ไประหว่างพักข้อมูลในรอบเดียว
+        def hashed(batches):
+            for records in batches:
+                for record in records:
+                    digests.add(record_partition(record), record)
+                yield records
+
+        source = hashed(iter_batches(jsonl_path, batch_size))
+    else:
+        partitions, schema, blocks = scan_partitions(jsonl_path, batch_size)
+        full = stage.get("schema") != str(schema)
+        changed, removed = manifest.changes("parquet", partitions)
+        if full:
+            changed, removed = set(partitions), set()
+        ranges = merge_ranges(block for partition in changed for block in blocks[partition])
+        source = iter_partition_batches(jsonl_path, ranges, changed, batch_size)
+        skipped = len(partitions) - len(changed)
+
+    shutil.rmtree(staging, ignore_errors=True)
+    spill_dir.mkdir(parents=True)
+
+    # schema ของ stream ขยายได้เมื่อพบ field ใหม่ - เปิด spill file ใหม่ทุกครั้งที่ schema
+    # ของ partition เปลี่ยน แล้วให้ worker ปรับทุก batch ให้ตรง schema สุดท้าย
+    spills = {}  # key -> [spill paths]
+    open_spills = {}  # key -> (file, ipc writer, schema)
+    batch = None
+
+    def close(key):
+        sink, writer, _ = open_spills.pop(key)
+        writer.close()
+        sink.close()
 
-
-def create_embeddings(records: list, output_path: str):
-    """สร้าง text embeddings (ถ้ามี sentence-transformers)"""
     try:
-        from sentence_transformers import SentenceTransformer
-        print("\nGenerating embeddings with SentenceTransformer...")
-
-        model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-
-        texts = [r.get("text_description", r["region_th"]) for r in records]
-        embeddings = model.encode(texts)
-
-        # Save embeddings with metadata
-        embedding_data = []
-        for i, record in enumerate(records):
-            embedding_data.append({
-                "region_code": record["region_code"],
-                "region_th": record["region_th"],
-                "text": texts[i],
-                "embedding": embeddings[i].tolist()
-            })
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(embedding_data, f, ensure_ascii=False, indent=2)
+        for batch in to_arrow_batches(source, schema, types=parquet_types()):
+            for key, part in split_partitions(batch).items():
+                if key in open_spills and not open_spills[key][2].equals(part.schema):
+                    close(key)
+                if key not in open_spills:
+                    path = spill_dir / f"{sum(map(len, spills.values()))}.arrow"
+                    sink = pa.OSFile(str(path), "wb")
+                    open_spills[key] = (sink, pa.ipc.new_stream(sink, part.schema), part.schema)
+                    spills.setdefault(key, []).append(str(path))
+                open_spills[key][1].write_batch(part)
+    finally:
+        for key in list(open_spills):
+            close(key)
+
+    if partitions is None:
+        partitions = digests.result()
+        changed, removed, skipped = set(partitions), set(), 0
+        if batch is not None:
+            schema = batch.schema  # schema สุดท้ายครอบคลุมทุก field ที่พบ
+    if not partitions:
+        shutil.rmtree(staging)
+        print(f"⚠️  No records in {jsonl_path} - Parquet not created")
+        return partitions
+
+    data_schema = pa.schema([field for field in schema if field.name not in PARTITION_COLUMNS])
+    tasks = [
+        (paths, str(staging / partition_path(key) / "part-0.parquet"), data_schema, options)
+        for key, paths in spills.items()
+    ]
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = sum(pool.map(write_partition, tasks))
+    else:
+        rows = sum(map(write_partition, tasks))
+    spill_dir.rmdir()
+
+    if full:
+        replace_dir(staging, output)
+    else:
+        # สลับทีละไฟล์ (os.replace เป็น atomic) partition ที่ไม่เปลี่ยนไม่ถูกแตะเลย
+        for partition in changed:
+            target = output / partition / "part-0.parquet"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / partition / "part-0.parquet", target)
+        for partition in removed:
+            remove_partition(output, partition)
+        shutil.rmtree(staging)
+
+    manifest.set_stage("parquet", partitions, schema=str(schema), options=options)
+
+    size = sum(file.stat().st_size for file in output.rglob("*.parquet"))
+    total = sum(value["rows"] for value in partitions.values())
+    print(f"✅ {'Created' if full else 'Updated'} Parquet dataset: {output_path}")
+    print(f"   Shape: ({total}, {len(schema)})")
+    print(f"   Partitions: {len(partitions)} ({' / '.join(PARTITION_COLUMNS)}), "
+          f"written: {len(tasks)} ({rows} rows), skipped: {skipped}, "
+          f"removed: {len(removed)}, workers: {workers}")
+    print(f"   Size: {size:,} bytes ({options['compression']}, "
+          f"row group {options['row_group_size']:,} rows)")
+    return partitions
+
+
+def dataset_schema(parquet_path):
+    """schema ของ Parquet dataset รวมคอลัมน์ partition (dictionary -> ชนิดค่าจริง)"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = ds.dataset(parquet_path, format="parquet", partitioning="hive").schema
+    return pa.schema([
+        field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ])
+
+
+def iter_partition_records(parquet_path, partitions, batch_size: int = BATCH_SIZE,
+                           drop_nulls: bool = True):
+    """อ่าน record ของ partition ที่ระบุจาก Parquet dataset (ใส่คอลัมน์ partition คืน)"""
+    import pyarrow.parquet as pq
+
+    for partition in sorted(partitions):
+        values = dict(part.split("=", 1) for part in partition.split("/"))
+        values["year"] = int(values["year"])
+        parquet_file = pq.ParquetFile(Path(parquet_path) / partition / "part-0.parquet")
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                if drop_nulls:
+                    row = {name: value for name, value in row.items() if value is not None}
+                yield {**values, **row}
+
+
+# ===========================================
+# Embeddings
+# ===========================================
+
+def embedding_text(record: dict) -> str:
+    """ข้อความของ record ที่นำไปสร้าง embedding"""
+    return record.get("text_description", record["region_th"])
+
+
+def document_text(record: dict) -> str:
+    """เอกสารของ record สำหรับ RAG และ lexical index (ข้อมูลหลัก + text_description)"""
+    def number(field, fmt="{:,}"):
+        value = record.get(field)
+        return "N/A" if value is None else fmt.format(value)
+
+    place = record["region_th"]
+    if record.get("province"):
+        place = f"{record['province']} {place}"
+    period = f"ปี {record['year']}" + (f" เดือน {record['month']}" if record.get("month") else "")
+
+    return f"""
+ข้อมูลสถิติพลังงานไฟฟ้า {place} ({record.get('region_en', '')}) {period}
+
+- รหัสภูมิภาค: {record['region_code']}
+- ปริมาณการใช้ไฟฟ้า: {number('consumption_gwh')} GWh
+- จำนวนผู้ใช้ไฟฟ้า: {number('customers')} ราย
+- อัตราการเติบโต: {number('growth_rate', '{}')}%
+- การใช้ไฟฟ้าต่อหัว: {number('consumption_per_capita', '{}')} kWh/คน
+- ค่าไฟเฉลี่ยต่อเดือน: {number('avg_monthly_bill', '{}')} บาท
+
+{record.get('text_description', '')}
+""".strip()
+
+
+def embedding_metadata(record: dict, text: str, text_hash: str) -> dict:
+    """ข้อมูลของแถวใน metadata.parquet"""
+    return {
+        "region_code": record["region_code"],
+        "region_th": record["region_th"],
+        "year": record["year"],
+        "province": record.get("province"),
+        "month": record.get("month"),
+        "text": text,
+        "text_hash": text_hash,
+    }
+
+
+def create_embeddings(parquet_path, output_path: str, manifest: Manifest, partitions: dict,
+                      batch_size: int = BATCH_SIZE, embed_batch_size: int = 64, workers: int = 1,
+                      dtype: str = "float32"):
+    """
+    สร้าง text embeddings (ถ้ามี sentence-transformers) เป็น vectors.npy + metadata.parquet
+
+    encode เฉพาะข้อความของ partition ที่ใหม่/เปลี่ยน และยังไม่มีใน cache
+    (data/.cache/embeddings.sqlite) แล้วเขียนผลลัพธ์ทั้งชุดจาก cache
+    (partition ที่ไม่เปลี่ยนแต่ไม่มีใน cache เช่น ลบ data/.cache ไป ถูก encode ตอนเขียน)
+    """
+    import numpy as np
+
+    encoder = load_encoder(batch_size=embed_batch_size, workers=workers)
+    cache = EmbeddingCache(Path(output_path).parent / ".cache" / "embeddings.sqlite")
+
+    stage = manifest.stage("embeddings")
+    changed, removed = manifest.changes("embeddings", partitions)
+    if stage.get("model") != encoder.name:
+        changed, removed = set(partitions), set()
+    unchanged = not changed and not removed and stage.get("dtype") == dtype
+    if unchanged and (Path(output_path) / "info.json").exists():
+        print(f"✅ Embeddings up to date: {output_path}")
+        cache.close()
+        return
 
-        print(f"✅ Created Embeddings: {output_path}")
-        print(f"   Embedding dim: {len(embeddings[0])}")
-
-    except ImportError:
-        print("\n⚠️  sentence-transformers not installed")
-        print("   Install with: pip install sentence-transformers")
-        print("   Creating placeholder embeddings instead...")
-
-        # Create placeholder embeddings
-        embedding_data = []
-        for record in records:
-            embedding_data.append({
-                "region_code": record["region_code"],
-                "region_th": record["region_th"],
-                "text": record.get("text_description", record["region_th"]),
-                "embedding": [0.0] * 384,  # Placeholder
-                "note": "Placeholder - install sentence-transformers for real embeddings"
-            })
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(embedding_data, f, ensure_ascii=False, indent=2)
-
-        print(f"✅ Created Placeholder Embeddings: {output_path}")
-
-
-def create_huggingface_dataset(records: list, output_dir: str):
-    """สร้าง HuggingFace Dataset format"""
     try:
-        from datasets import Dataset
+        # 1) encode ข้อความที่ยังไม่มีใน cache (commit ทุก checkpoint - รันซ้ำแล้วทำต่อได้)
+        encoded = 0
+        if encoder.cacheable:
+            pending = {}
+            for records in batched(iter_partition_records(parquet_path, changed), batch_size):
+                for record in records:
+                    text = embedding_text(record)
+                    pending[text_digest(text)] = text
+                if len(pending) >= CHECKPOINT_TEXTS:
+                    encoded += embed_missing(encoder, cache, pending)
+                    pending.clear()
+            encoded += embed_missing(encoder, cache, pending)
+
+        # 2) เขียน matrix ของทุก partition (ลำดับตาม partition) โดยดึง vector จาก cache
+        count = sum(value["rows"] for value in partitions.values())
+        writer = EmbeddingWriter(output_path, count, dtype=dtype, model=encoder.name)
+        try:
+            for records in batched(iter_partition_records(parquet_path, partitions), batch_size):
+                texts = [embedding_text(record) for record in records]
+                hashes = [text_digest(text) for text in texts]
+                if encoder.cacheable:
+                    found = cache.get_many(encoder.name, hashes)
+                    if len(found) < len(set(hashes)):
+                        # partition ที่ไม่เปลี่ยนแต่ cache ไม่มี vector (cache ถูกลบ/ย้ายเครื่อง)
+                        missing = {h: text for h, text in zip(hashes, texts) if h not in found}
+                        encoded += embed_missing(encoder, cache, missing)
+                        found.update(cache.get_many(encoder.name, list(missing)))
+                    vectors = np.stack([found[text_hash] for text_hash in hashes])
+                else:
+                    vectors = encoder.encode(texts)
+                writer.add(vectors, [
+                    embedding_metadata(record, text, text_hash)
+                    for record, text, text_hash in zip(records, texts, hashes)
+                ])
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+    finally:
+        encoder.close()
+        cache.close()
+
+    manifest.set_stage("embeddings", partitions, model=encoder.name, dtype=dtype)
+
+    label = "Embeddings" if encoder.cacheable else "Placeholder Embeddings"
+    size = sum(file.stat().st_size for file in Path(output_path).iterdir())
+    print(f"✅ Created {label}: {output_path}")
+    print(f"   Shape: ({count}, {writer.dim}) {dtype}, size: {size:,} bytes")
+    print(f"   Newly encoded: {encoded}, partitions updated: {len(changed)}, removed: {len(removed)}")
+
+
+def create_vector_index(embeddings_dir: str, kind: str = "flat"):
+    """สร้าง vector index ใน data/embeddings/index/ (ข้ามถ้ามี index ชนิดเดิมของ embeddings ชุดนี้แล้ว)"""
+    previous = index_info(embeddings_dir)
+    if previous is not None and previous["kind"] == kind:
+        print(f"✅ Vector index up to date: {embeddings_dir}/index ({kind})")
+        return
 
-        dataset = Dataset.from_list(records)
-        dataset.save_to_disk(output_dir)
-        print(f"✅ Created HuggingFace Dataset: {output_dir}")
+    try:
+        index = build_index(embeddings_dir, kind=kind)
+    except ImportError as e:
+        print(f"\n⚠️  {e}")
+        return
+    params = {name: value for name, value in index.info.items() if name in ("nlist", "m")}
+    print(f"✅ Created Vector Index: {index.directory} ({kind}, {len(index)} vectors"
+          + "".join(f", {name}={value}" for name, value in params.items()) + ")")
+
+
+def create_lexical_index(parquet_path, embeddings_dir: str, partitions: dict,
+                         batch_size: int = BATCH_SIZE):
+    """สร้าง BM25 index ของ document_text ใน data/embeddings/lexical/ (ลำดับแถวเดียวกับ embeddings)"""
+    count = sum(value["rows"] for value in partitions.values())
+    previous = lexical_info(embeddings_dir)
+    if previous is not None and previous["count"] == count and previous["tokenizer"] == default_tokenizer():
+        print(f"✅ Lexical index up to date: {embeddings_dir}/lexical ({previous['tokenizer']})")
+        return
+
+    documents = (document_text(record)
+                 for record in iter_partition_records(parquet_path, partitions, batch_size))
+    lexical = build_lexical_index(documents, embeddings_dir)
+    info = lexical.info
+    print(f"✅ Created Lexical Index (BM25): {lexical.directory}")
+    print(f"   Tokenizer: {info['tokenizer']}, terms: {info['terms']:,}, postings: {info['postings']:,}")
+    if info["tokenizer"] == "bigram":
+        print("   (ตัดคำภาษาไทยได้แม่นยำกว่าด้วย: pip install pythainlp)")
+
+
+def create_huggingface_dataset(parquet_path, output_dir: str, manifest: Manifest, partitions: dict):
+    """สร้าง HuggingFace Dataset format - แทนที่เฉพาะแถวของ partition ที่เปลี่ยน"""
+    try:
+        from datasets import Dataset, Features, concatenate_datasets, load_from_disk
+
+        output = Path(output_dir)
+        schema = manifest.stage("parquet").get("schema")
+        changed, removed = manifest.changes("hf_dataset", partitions)
+        full = not output.exists() or manifest.stage("hf_dataset").get("schema") != schema
+        if full:
+            changed, removed = set(partitions), set()
+        if not changed and not removed:
+            print(f"✅ HuggingFace Dataset up to date: {output_dir}")
+            return
+
+        # from_generator เขียนลง Arrow cache ทีละส่วน ไม่ต้องมี list ของทุก record
+        parts = []
+        if not full:
+            stale = changed | removed
+            previous = load_from_disk(str(output))
+            parts.append(previous.filter(
+                lambda years, regions: [
+                    partition_path((year, region)) not in stale
+                    for year, region in zip(years, regions)
+                ],
+                input_columns=["year", "region_code"], batched=True,
+            ))
+        if changed:
+            # กำหนด features จาก schema ของ Parquet - คอลัมน์ที่ batch แรกเป็น null ทั้งหมด
+            # จะได้ชนิดที่ถูกต้อง และต่อกับ dataset เดิมได้
+            features = Features.from_arrow_schema(dataset_schema(parquet_path))
+            parts.append(Dataset.from_generator(
+                iter_partition_records,
+                features=features,
+                # HuggingFace ต้องการทุกคอลัมน์ในทุกแถว จึงคงค่า null ไว้
+                gen_kwargs={"parquet_path": str(parquet_path), "partitions": sorted(changed),
+                            "drop_nulls": False},
+            ))
+        dataset = concatenate_datasets(parts) if len(parts) > 1 else parts[0]
+
+        # save_to_disk ทับโฟลเดอร์ที่กำลังเปิดอยู่ไม่ได้ - เขียนที่ใหม่แล้วสลับ
+        staging = output.with_name(output.name + ".tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        dataset.save_to_disk(str(staging))
+        replace_dir(staging, output)
+        manifest.set_stage("hf_dataset", partitions, schema=schema)
+        print(f"✅ {'Created' if full else 'Updated'} HuggingFace Dataset: {output_dir} "
+              f"(partitions updated: {len(changed)}, removed: {len(removed)})")
 
     except ImportError:
         print("\n⚠️  datasets library not installed")
         print("   Install with: pip install datasets")
 
 
-def print_summary(records: list):
-    """แสดงสรุปข้อมูล"""
+def print_summary(parquet_path: str):
+    """แสดงสรุปข้อมูล (อ่านเฉพาะคอลัมน์ที่ใช้จาก Parquet)"""
     import pandas as pd
+    import pyarrow.dataset as ds
 
-    df = pd.DataFrame(records)
+    numeric = ["consumption_gwh", "customers", "growth_rate"]
+    columns = ds.dataset(parquet_path, format="parquet", partitioning="hive").schema.names
+    df = pd.read_parquet(parquet_path, columns=["region_code", "region_th"] + numeric)
 
     print("\n" + "=" * 60)
     print("DATA SUMMARY")
     print("=" * 60)
 
     print(f"\nRecords: {len(df)}")
-    print(f"Columns: {list(df.columns)}")
+    print(f"Columns: {columns}")
 
     print("\nNumerical Statistics:")
-    print(df[["consumption_gwh", "customers", "growth_rate"]].describe())
+    print(df[numeric].describe())
 
     print("\nRegions:")
-    for _, row in df.iterrows():
-        print(f"  {row['region_code']}: {row['region_th']} - {row['consumption_gwh']:,.0f} GWh")
+    regions = df.groupby(["region_code", "region_th"], observed=True, sort=False)["consumption_gwh"].sum()
+    for (code, name), consumption in regions.items():
+        print(f"  {code}: {name} - {consumption:,.0f} GWh")
+
+
+def parse_args(argv=None):
+    """ตัวเลือกการเขียน Parquet"""
+    parser = argparse.ArgumentParser(description="Prepare AI-ready data (Level 6)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="จำนวน process ที่เขียน partition พร้อมกัน (default: จำนวน CPU)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="จำนวน record ต่อ batch ตอนอ่าน JSONL")
+    parser.add_argument("--row-group-size", type=int, default=PARQUET_OPTIONS["row_group_size"])
+    parser.add_argument("--compression", default=PARQUET_OPTIONS["compression"],
+                        choices=["zstd", "snappy", "gzip", "lz4", "brotli", "none"])
+    parser.add_argument("--no-dictionary", action="store_true",
+                        help="ปิด dictionary encoding")
+    parser.add_argument("--embed-batch-size", type=int, default=64,
+                        help="จำนวนข้อความต่อ batch ตอน encode embeddings")
+    parser.add_argument("--embed-workers", type=int, default=1,
+                        help="จำนวน process ที่ encode embeddings พร้อมกัน (CPU)")
+    parser.add_argument("--embedding-dtype", default="float32", choices=DTYPES,
+                        help="ชนิดข้อมูลของ vectors.npy (int8 = quantize พร้อม scale ต่อแถว)")
+    parser.add_argument("--index", default="flat", choices=INDEX_KINDS,
+                        help="ชนิดของ vector index (hnsw ต้องติดตั้ง hnswlib)")
+    parser.add_argument("--full", action="store_true",
+                        help="ไม่ใช้ manifest เดิม สร้างทุกอย่างใหม่ทั้งหมด")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
 
-
-def main():
     print("=" * 60)
     print("PREPARING AI-READY DATA (Level 6)")
     print("=" * 60)
@@ -152,25 +648,56 @@ def main():
     data_dir = Path(__file__).parent / "data"
     jsonl_path = data_dir / "energy_stats.jsonl"
 
-    # Load data
-    print(f"\nLoading data from {jsonl_path}...")
-    records = load_jsonl(jsonl_path)
-    print(f"Loaded {len(records)} records")
+    parquet_path = data_dir / "energy_stats.parquet"
+    options = {
+        "row_group_size": args.row_group_size,
+        "compression": args.compression,
+        "use_dictionary": not args.no_dictionary,
+    }
+
+    # manifest จำ hash ของ input/partition จากรอบก่อน - ทำเฉพาะส่วนที่เปลี่ยน
+    manifest_path = data_dir / MANIFEST_FILE
+    manifest = Manifest(manifest_path) if args.full else Manifest.load(manifest_path)
 
-    # Create Parquet
     print("\n--- Creating Parquet ---")
-    create_parquet(records, str(data_dir / "energy_stats.parquet"))
+    stage = manifest.stage("parquet")
+    if (manifest.input_unchanged(jsonl_path) and parquet_path.is_dir()
+            and stage.get("options") == options and not manifest.changes("parquet", manifest.partitions)[0]):
+        partitions = manifest.partitions
+        print(f"✅ Input unchanged since last run: {jsonl_path}")
+    else:
+        # อ่าน JSONL แบบ streaming
+        print(f"\nStreaming data from {jsonl_path}...")
+        partitions = create_parquet(
+            jsonl_path, str(parquet_path), manifest,
+            batch_size=args.batch_size, workers=args.workers, **options,
+        )
+        manifest.record_input(jsonl_path, partitions)
+        manifest.save()
+    if not partitions:
+        return 1
+    print(f"Loaded {sum(value['rows'] for value in partitions.values())} records")
 
     # Create Embeddings
     print("\n--- Creating Embeddings ---")
-    create_embeddings(records, str(data_dir / "embeddings.json"))
+    create_embeddings(parquet_path, str(data_dir / "embeddings"), manifest, partitions,
+                      batch_size=args.batch_size, embed_batch_size=args.embed_batch_size,
+                      workers=args.embed_workers, dtype=args.embedding_dtype)
+
+    # Create Vector Index (ค้นหาได้ทันทีโดยไม่ต้องสร้าง index ใหม่ทุกครั้ง)
+    print("\n--- Creating Vector Index ---")
+    create_vector_index(str(data_dir / "embeddings"), args.index)
+
+    # Create Lexical Index (BM25 - ใช้คู่กับ vector index ใน RetrievalService)
+    print("\n--- Creating Lexical Index ---")
+    create_lexical_index(parquet_path, str(data_dir / "embeddings"), partitions, args.batch_size)
 
     # Create HuggingFace Dataset (optional)
     print("\n--- Creating HuggingFace Dataset ---")
-    create_huggingface_dataset(records, str(data_dir / "hf_dataset"))
+    create_huggingface_dataset(parquet_path, str(data_dir / "hf_dataset"), manifest, partitions)
 
     # Print summary
-    print_summary(records)
+    print_summary(parquet_path)
 
     print("\n" + "=" * 60)
     print("✅ AI-Ready data preparation complete!")
@@ -0,0 +1,323 @@
+"""
+Retrieval Service
+Level 6: ค้นเอกสารให้คำถามจำนวนมาก (chatbot / RAG) โดยรวมคำถามเป็น batch
+
+    service = RetrievalService(load_index("data/embeddings"))
+    service.retrieve_many(["ภาคอีสานใช้ไฟเท่าไหร่", ...], k=4)   # encode 1 ครั้ง + ค้น 1 ครั้ง
+    service.retrieve("ภาคอีสานใช้ไฟเท่าไหร่ครับ", k=4)           # เรียกพร้อมกันจากหลาย thread ได้
+    service.stats()
+
+- คำถามที่ส่งเข้ามาพร้อมกันจากหลาย thread ถูกรวมเป็น batch (รอไม่เกิน max_wait วินาที)
+  แล้ว encode ใน call เดียว และค้นใน index ครั้งเดียว (ดู VectorIndex.search_many)
+- vector ของคำถามเก็บใน LRU cache โดยใช้ข้อความที่ normalize แล้วเป็น key
+  (ช่องว่าง เครื่องหมายวรรคตอน คำลงท้ายสุภาพ อักขระที่มองไม่เห็น) คำถามซ้ำจึงไม่ต้อง encode อีก
+- ถ้าส่ง lexical (BM25 ดู lexical_index.py) มาด้วย จะค้นทั้งสองแบบแล้วรวมคะแนน (hybrid):
+  คะแนน = alpha * vector + (1 - alpha) * BM25 หลังปรับคะแนนแต่ละแบบเป็นช่วง 0-1
+- stats() คืน throughput, latency (p50/p95/p99), ขนาด batch และ cache hit rate
+"""
+
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+QUERY_CACHE_SIZE = 10_000
+MAX_BATCH = 64
+MAX_WAIT = 0.002          # วินาทีที่รอคำถามอื่นมารวม batch
+LATENCY_WINDOW = 10_000   # จำนวน latency ล่าสุดที่ใช้คำนวณ percentile
+
+# hybrid: น้ำหนักของคะแนน vector และจำนวนผู้สมัครจากแต่ละ index ต่อผลลัพธ์ที่ต้องการ
+HYBRID_ALPHA = 0.5
+CANDIDATE_FACTOR = 4
+
+# อักขระที่มองไม่เห็น (zero width) ที่มักติดมากับข้อความที่ copy มา
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+_PUNCTUATION = re.compile(r"[\s?!.,;:\"'“”‘’()\[\]{}ๆ]+")
+# คำลงท้ายที่ไม่เปลี่ยนความหมายของคำถาม
+_PARTICLES = ("ครับผม", "ครับ", "คับ", "ค่ะ", "คะ", "จ้ะ", "จ้า", "นะ")
+
+
+def normalize_query(text: str) -> str:
+    """รูปแบบมาตรฐานของคำถาม (ใช้เป็น key ของ cache และเป็นข้อความที่นำไป encode)"""
+    # NFC ไม่ใช้ NFKC: NFKC แยกสระอำเป็นนิคหิต + สระอา
+    text = unicodedata.normalize("NFC", text).translate(_INVISIBLE).lower()
+    # พิมพ์สระอำเป็นนิคหิต + สระอา (ํา) ให้เป็นสระอำ (ำ)
+    text = text.replace("\u0e4d\u0e32", "\u0e33")
+    text = _PUNCTUATION.sub(" ", text).strip()
+    stripped = True
+    while stripped:
+        stripped = False
+        for particle in _PARTICLES:
+            if text.endswith(particle) and len(text) > len(particle):
+                text = text[:-len(particle)].rstrip()
+                stripped = True
+    return " ".join(text.split())
+
+
+class LRUCache:
+    """cache ขนาดจำกัด ลบ key ที่ไม่ได้ใช้นานที่สุดเมื่อเต็ม (thread-safe)"""
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _scaled(scores: np.ndarray) -> np.ndarray:
+    """ปรับคะแนนเป็นช่วง 0-1 (min-max) - คะแนนเท่ากันทั้งหมดได้ 1"""
+    low, high = (scores.min(), scores.max()) if len(scores) else (0.0, 0.0)
+    if high == low:
+        return np.ones(len(scores), dtype=np.float32)
+    return (scores - low) / (high - low)
+
+
+def fuse(vector: tuple, lexical: tuple, k: int, alpha: float = HYBRID_ALPHA) -> tuple:
+    """
+    รวมผลของ vector index และ BM25 เป็น (rows, scores, parts) k แถว
+
+    parts[i] คือ (คะแนน vector, คะแนน BM25) เดิมของแถว i (None ถ้า index นั้นไม่พบแถวนี้)
+    """
+    combined, parts = {}, {}
+    for side, weight, (rows, scores) in ((0, alpha, vector), (1, 1.0 - alpha, lexical)):
+        for row, raw, part in zip(rows.tolist(), scores.tolist(), _scaled(scores).tolist()):
+            combined[row] = combined.get(row, 0.0) + weight * part
+            parts.setdefault(row, [None, None])[side] = raw
+    rows = sorted(combined, key=combined.get, reverse=True)[:k]
+    return (np.array(rows, dtype=np.int64), np.array([combined[row] for row in rows], dtype=np.float32),
+            [parts[row] for row in rows])
+
+
+def _filter_key(filters: dict) -> tuple:
+    """key ของ filter ที่ใช้จัดกลุ่มคำถามใน batch (list -> tuple)"""
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+        for name, value in filters.items() if value is not None
+    ))
+
+
+class RetrievalService:
+    """ค้นด้วย VectorIndex (และ LexicalIndex ถ้ามี) แบบรวม batch พร้อม LRU cache ของ vector คำถาม"""
+
+    def __init__(self, index, cache_size: int = QUERY_CACHE_SIZE, max_batch: int = MAX_BATCH,
+                 max_wait: float = MAX_WAIT, on_batch=None, lexical=None, alpha: float = HYBRID_ALPHA):
+        if lexical is not None and len(lexical) != len(index):
+            raise ValueError(f"Lexical index has {len(lexical)} rows, vector index has {len(index)}")
+        self.index = index
+        self.lexical = lexical
+        self.alpha = alpha
+        self.cache = LRUCache(cache_size)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # on_batch(queries, cache_hits, encode_seconds, search_seconds) - เช่น ส่งต่อเป็น metrics
+        self.on_batch = on_batch
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._started = time.monotonic()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = {"queries": 0, "batches": 0, "cache_hits": 0, "encoded": 0}
+        self._seconds = {"encode": 0.0, "search": 0.0, "lexical": 0.0, "busy": 0.0}
+
+    # ----- batch -----
+
+    def embed(self, queries: list) -> tuple:
+        """(matrix ของ vector คำถาม, จำนวน cache hit) - encode เฉพาะข้อความที่ไม่อยู่ใน cache ใน call เดียว"""
+        keys = [normalize_query(query) for query in queries]
+        vectors = {}
+        for key in dict.fromkeys(keys):
+            vector = self.cache.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+
+        start = time.perf_counter()
+        if missing:
+            for key, vector in zip(missing, self.index.encode(missing)):
+                vector = np.asarray(vector, dtype=np.float32)
+                self.cache.put(key, vector)
+                vectors[key] = vector
+        encode_seconds = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._counts["encoded"] += len(missing)
+            self._seconds["encode"] += encode_seconds
+        # คำถามที่ซ้ำกันใน batch เดียวกันนับเป็น hit (encode ครั้งเดียว)
+        return np.stack([vectors[key] for key in keys]), len(queries) - len(missing)
+
+    def retrieve_many(self, queries: list, k: int = 4, **filters) -> list:
+        """ผลการค้นของทุกคำถาม (filter เดียวกัน) - encode หนึ่งครั้ง ค้นหนึ่งครั้ง"""
+        start = time.perf_counter()
+        results = self._search_batch(queries, k, filters)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._latencies.extend([elapsed] * len(queries))
+        return results
+
+    def _search_batch(self, queries: list, k: int, filters: dict) -> list:
+        if not queries:
+            return []
+        start = time.perf_counter()
+        matrix, hits = self.embed(queries)
+        encoded = time.perf_counter()
+        lexical_seconds = 0.0
+        if self.lexical is None:
+            found = self.index.search_many(matrix, k, **filters)
+            results = [self.index.results(rows, scores) for rows, scores in found]
+        else:
+            depth = k * CANDIDATE_FACTOR
+            dense = self.index.search_many(matrix, depth, **filters)
+            lexical_start = time.perf_counter()
+            sparse = self.lexical.search_many(queries, depth, self.index.filter_mask(**filters))
+            lexical_seconds = time.perf_counter() - lexical_start
+            results = [self._hybrid_results(*fuse(d, s, k, self.alpha)) for d, s in zip(dense, sparse)]
+        end = time.perf_counter()
+
+        with self._stats_lock:
+            self._counts["queries"] += len(queries)
+            self._counts["batches"] += 1
+            self._counts["cache_hits"] += hits
+            self._seconds["search"] += end - encoded
+            self._seconds["lexical"] += lexical_seconds
+            self._seconds["busy"] += end - start
+        if self.on_batch is not None:
+            self.on_batch(len(queries), hits, encoded - start, end - encoded)
+        return results
+
+    def _hybrid_results(self, rows, scores, parts) -> list:
+        results = self.index.results(rows, scores)
+        for result, (vector_score, lexical_score) in zip(results, parts):
+            result["vector_score"] = None if vector_score is None else round(vector_score, 6)
+            result["lexical_score"] = None if lexical_score is None else round(lexical_score, 6)
+        return results
+
+    # ----- คำถามเดี่ยว (รวม batch อัตโนมัติ) -----
+
+    def retrieve(self, query: str, k: int = 4, **filters) -> list:
+        """ผลการค้นของคำถามเดียว - รอรวม batch กับคำถามที่เข้ามาพร้อมกัน"""
+        submitted = time.perf_counter()
+        future = Future()
+        with self._worker_lock:
+            queued = not self._closed
+            if queued:
+                self._start_worker()
+                self._queue.put((query, k, filters, future))
+        try:
+            if not queued:
+                # service ถูกปิดแล้ว (index ถูกเปลี่ยน) - ค้นเองใน thread นี้
+                return self._search_batch([query], k, filters)[0]
+            return future.result()
+        finally:
+            with self._stats_lock:
+                self._latencies.append(time.perf_counter() - submitted)
+
+    def similarity_search(self, query: str, k: int = 4, **filters) -> list:
+        """เหมือน VectorIndex.similarity_search (ใช้แทนกันได้)"""
+        return self.retrieve(query, k, **filters)
+
+    def _start_worker(self):
+        # สร้าง thread เมื่อใช้ครั้งแรก (หลัง gunicorn fork worker แล้ว) - เรียกขณะถือ _worker_lock
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="retrieval-batcher", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self) -> list:
+        """รอคำถามแรก แล้วรับคำถามที่ตามมาภายใน max_wait (ไม่เกิน max_batch)"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        running = True
+        while running:
+            groups = {}
+            for item in self._next_batch():
+                if item is None:  # close() - ตอบคำถามที่รับมาแล้วให้ครบก่อนหยุด
+                    running = False
+                    continue
+                _, k, filters, _ = item
+                groups.setdefault((k, _filter_key(filters)), []).append(item)
+
+            for (k, _), items in groups.items():
+                try:
+                    results = self._search_batch([item[0] for item in items], k, items[0][2])
+                except Exception as e:
+                    for item in items:
+                        item[3].set_exception(e)
+                    continue
+                for item, result in zip(items, results):
+                    item[3].set_result(result)
+
+    def close(self):
+        """หยุด thread ที่รวม batch (เช่น เมื่อเปลี่ยนไปใช้ index ใหม่)"""
+        with self._worker_lock:
+            self._closed = True
+            if self._worker is not None and self._worker.is_alive():
+                self._queue.put(None)
+
+    # ----- stats -----
+
+    def stats(self) -> dict:
+        """throughput, latency และ cache hit rate ตั้งแต่เริ่ม service"""
+        with self._stats_lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+            latencies = np.array(self._latencies)
+        uptime = time.monotonic() - self._started
+        queries = counts["queries"]
+
+        stats = {
+            "queries": queries,
+            "batches": counts["batches"],
+            "avg_batch_size": round(queries / counts["batches"], 2) if counts["batches"] else 0.0,
+            "cache_size": len(self.cache),
+            "cache_hits": counts["cache_hits"],
+            "cache_hit_rate": round(counts["cache_hits"] / queries, 4) if queries else 0.0,
+            "encoded": counts["encoded"],
+            "encode_seconds": round(seconds["encode"], 4),
+            "search_seconds": round(seconds["search"], 4),
+            "lexical_seconds": round(seconds["lexical"], 4),
+            "mode": "vector" if self.lexical is None else "hybrid",
+            "uptime_seconds": round(uptime, 2),
+            "queries_per_second": round(queries / uptime, 2) if uptime else 0.0,
+            # ความเร็วตอนทำงานจริง (ไม่นับเวลาที่ไม่มีคำถาม)
+            "busy_queries_per_second": round(queries / seconds["busy"], 2) if seconds["busy"] else 0.0,
+        }
+        if len(latencies):
+            p50, p95, p99, top = (float(value) * 1000 for value in
+                                  np.percentile(latencies, [50, 95, 99, 100]))
+            stats["latency_ms"] = {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+                                   "max": round(top, 3)}
+        return stats
@@ -0,0 +1,339 @@
+"""
+Schema Compiler
+Level 6: แปลง schema.json (JSON Schema) เป็นชุดตรวจสอบที่ DataValidator ใช้ได้ทันที
+
+compile_schema() อ่าน schema ครั้งเดียวแล้วสร้างกฎต่อ field ไว้ล่วงหน้า (cache ตาม path + mtime)
+แต่ละกฎมีสองแบบที่ให้ผลเดียวกัน:
+
+    check.test(value)      ค่าเดียว (ตรวจทีละ record)
+    check.failed(values)   ทั้งคอลัมน์ -> numpy mask (ตรวจแบบ columnar ด้วย numpy / pyarrow.compute)
+
+จึงไม่ต้องตีความ schema ใหม่ทุก record และไม่ต้องเขียน validator ใหม่เมื่อมี dataset/schema ใหม่
+
+keyword ที่รองรับ: required, properties.*.type (string, integer, number), enum, minLength,
+maxLength, pattern, minimum, maximum, exclusiveMinimum, exclusiveMaximum และส่วนขยาย
+
+    "x-warning": {"maximum": 100000}           (ใน property) กฎที่ไม่ผ่านเป็น warning แทน error
+    "x-unique": ["region_code", "year"]        (ระดับบนสุด) key ที่ห้ามซ้ำ
+    "x-complete": ["region_code"]              (ระดับบนสุด) ทุกค่าใน enum ต้องพบอย่างน้อยหนึ่งครั้ง
+
+รัน: pip install pyarrow   (ไม่บังคับ - ไม่มีจะใช้ได้เฉพาะ check.test)
+"""
+
+import json
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # ตรวจทีละ record ได้อย่างเดียว
+    np = pa = pc = None
+
+SCHEMA_PATH = Path(__file__).parent / "schema.json"
+
+TYPES = ("string", "integer", "number")
+
+# ตัวเลขในรูปข้อความที่ยอมรับ (ใช้ทั้งแบบ record และแบบ columnar ให้ผลตรงกัน)
+NUMBER_PATTERN = r"^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$"
+INTEGER_PATTERN = r"^\s*[+-]?\d{1,18}\s*$"
+_NUMBER = re.compile(NUMBER_PATTERN)
+_INTEGER = re.compile(INTEGER_PATTERN)
+
+# integer ต้องอยู่ในช่วง int64 (ค่านอกช่วงเป็นปัญหาชนิดข้อมูล ไม่ใช่ exception ตอน cast)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class Check(NamedTuple):
+    """กฎหนึ่งข้อของ field (test: ค่าเดียวผ่านหรือไม่, failed: mask ของแถวที่ไม่ผ่านทั้งคอลัมน์)"""
+    rule: str
+    severity: str
+    message: str
+    test: Callable
+    failed: Callable
+
+
+class FieldRules(NamedTuple):
+    """กฎทั้งหมดของ field หนึ่ง (ตรวจหลังแปลงค่าตาม type ได้แล้วเท่านั้น)"""
+    name: str
+    type: str
+    required: bool
+    type_rule: str
+    checks: tuple
+
+
+class CompiledSchema:
+    """schema ที่แปลงเป็นกฎแล้ว: fields, rules (rule -> (severity, ข้อความ)), unique, complete"""
+
+    def __init__(self, schema: dict, source=None):
+        self.source = source if source is not None else schema
+        self.title = schema.get("title", "")
+        self.required = list(schema.get("required", []))
+        properties = schema.get("properties", {})
+        unknown = [name for name in self.required if name not in properties]
+        if unknown:
+            raise ValueError(f"Required fields without properties in schema: {unknown}")
+
+        self.fields = [
+            _compile_field(name, spec, name in self.required) for name, spec in properties.items()
+        ]
+        self.unique = list(schema.get("x-unique", []))
+        self.complete = {name: list(properties[name].get("enum", [])) for name in schema.get("x-complete", [])}
+
+        # rule -> (severity, ข้อความ) เรียงตามลำดับที่แสดงในรายงาน ({value} = ค่าที่ไม่ผ่าน)
+        self.rules = {
+            "invalid_json": ("error", "Invalid JSON - {value}"),
+            "invalid_record": ("error", "Record must be a JSON object, got {value}"),
+            "invalid_csv": ("error", "Invalid CSV row - expected {value[0]} columns, got {value[1]}"),
+        }
+        for name in self.required:
+            self.rules[f"{name}:required"] = ("error", f"Missing required field '{_literal(name)}'")
+        for field in self.fields:
+            self.rules[field.type_rule] = ("error", f"Invalid {_literal(field.name)} value '{{value}}'")
+            for check in field.checks:
+                self.rules[check.rule] = (check.severity, check.message)
+        if self.unique:
+            pairs = ", ".join(f"{_literal(name)}={{value[{i}]}}" for i, name in enumerate(self.unique))
+            self.rules["duplicate"] = ("error", f"Duplicate record for {pairs}")
+        for name in self.complete:
+            self.rules[f"{name}:complete"] = ("warning", f"Missing data for {_literal(name)}: {{value}}")
+
+    @property
+    def columns(self) -> list:
+        """ชื่อ field ทั้งหมดที่มีกฎ"""
+        return [field.name for field in self.fields]
+
+    def arrow_schema(self):
+        """pyarrow schema ตามชนิดใน schema (ใช้ parse JSONL ด้วย pyarrow.json)"""
+        types = {"string": pa.string(), "integer": pa.int64(), "number": pa.float64()}
+        return pa.schema([(field.name, types[field.type]) for field in self.fields])
+
+
+def load_schema(path=SCHEMA_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_schema(schema=None) -> CompiledSchema:
+    """
+    CompiledSchema ของ schema (path ของไฟล์ schema.json หรือ dict - None = schema.json ของ Level 6)
+    ไฟล์เดิมที่ยังไม่แก้ไขได้ผลจาก cache ไม่ต้อง compile ซ้ำ
+    """
+    if isinstance(schema, dict):
+        return _compile_text(json.dumps(schema, sort_keys=True, ensure_ascii=False))
+    path = Path(schema or SCHEMA_PATH).resolve()
+    return _compile_file(str(path), path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _compile_file(path: str, mtime_ns: int) -> CompiledSchema:
+    return CompiledSchema(load_schema(path), source=path)
+
+
+@lru_cache(maxsize=32)
+def _compile_text(text: str) -> CompiledSchema:
+    return CompiledSchema(json.loads(text))
+
+
+# ===========================================
+# Field rules
+# ===========================================
+
+def _compile_field(name: str, spec: dict, required: bool) -> FieldRules:
+    kind = spec.get("type", "string")
+    if kind not in TYPES:
+        raise ValueError(f"Unsupported type {kind!r} for field {name!r}. Must be one of {TYPES}")
+
+    checks = list(_value_checks(name, spec, kind, "error"))
+    warning = spec.get("x-warning")
+    if warning:
+        checks.extend(_value_checks(name, warning, kind, "warning"))
+    return FieldRules(name, kind, required, f"{name}:type", tuple(checks))
+
+
+def _value_checks(name: str, spec: dict, kind: str, severity: str):
+    """Check ของ keyword ใน spec (severity = warning: กฎจาก x-warning)"""
+    prefix = f"{name}:" if severity == "error" else f"{name}:warning_"
+    field = _literal(name)
+
+    if "enum" in spec:
+        allowed = list(spec["enum"])
+        allowed_set = frozenset(allowed)
+        yield Check(f"{prefix}enum", severity,
+                    f"Invalid {field} '{{value}}'. Must be one of {_literal(allowed)}",
+                    lambda value: not isinstance(value, (list, dict)) and value in allowed_set,
+                    lambda values: ~is_in(values, allowed))
+
+    if kind == "string":
+        if "minLength" in spec:
+            limit = spec["minLength"]
+            yield Check(f"{prefix}min_length", severity,
+                        f"{field} '{{value}}' is shorter than {limit} characters",
+                        lambda value: len(str(value)) >= limit,
+                        lambda values: _to_numpy(pc.less(pc.utf8_length(_as_string(values)), limit)))
+        if "maxLength" in spec:
+            limit = spec["maxLength"]
+            yield Check(f"{prefix}max_length", severity,
+                        f"{field} '{{value}}' is longer than {limit} characters",
+                        lambda value: len(str(value)) <= limit,
+                        lambda values: _to_numpy(pc.greater(pc.utf8_length(_as_string(values)), limit)))
+        if "pattern" in spec:
+            pattern = spec["pattern"]
+            regex = re.compile(pattern)
+            yield Check(f"{prefix}pattern", severity,
+                        f"Invalid {field} '{{value}}'. Must match {_literal(pattern)}",
+                        lambda value: regex.search(str(value)) is not None,
+                        lambda values: ~_to_numpy(pc.match_substring_regex(_as_string(values), pattern)))
+        return
+
+    # integer / number
+    low, high = spec.get("minimum"), spec.get("maximum")
+    if severity == "warning":
+        if low is not None:
+            yield _bound(f"{prefix}minimum", severity, f"{field}={{value}} seems unusually low", low, False, True)
+        if high is not None:
+            yield _bound(f"{prefix}maximum", severity, f"{field}={{value}} seems unusually high", high, False, False)
+    elif low is not None and high is not None:
+        yield Check(f"{prefix}range", severity, f"{field} {{value}} out of range [{low}, {high}]",
+                    lambda value: low <= value <= high,
+                    lambda values: (values < low) | (values > high))
+    elif low is not None:
+        yield _bound(f"{prefix}minimum", severity, f"{field} must be >= {low}, got {{value}}", low, False, True)
+    elif high is not None:
+        yield _bound(f"{prefix}maximum", severity, f"{field} must be <= {high}, got {{value}}", high, False, False)
+
+    if "exclusiveMinimum" in spec:
+        limit = spec["exclusiveMinimum"]
+        message = (f"{field} must be positive, got {{value}}" if limit == 0
+                   else f"{field} must be greater than {limit}, got {{value}}")
+        yield _bound(f"{prefix}exclusive_minimum", severity, message, limit, True, True)
+    if "exclusiveMaximum" in spec:
+        limit = spec["exclusiveMaximum"]
+        yield _bound(f"{prefix}exclusive_maximum", severity,
+                     f"{field} must be less than {limit}, got {{value}}", limit, True, False)
+
+
+def _bound(rule: str, severity: str, message: str, limit, exclusive: bool, lower: bool) -> Check:
+    """Check ของขอบเขตด้านเดียว (lower: ค่าต้องไม่ต่ำกว่า limit)"""
+    if lower and exclusive:
+        return Check(rule, severity, message, lambda value: value > limit, lambda values: values <= limit)
+    if lower:
+        return Check(rule, severity, message, lambda value: value >= limit, lambda values: values < limit)
+    if exclusive:
+        return Check(rule, severity, message, lambda value: value < limit, lambda values: values >= limit)
+    return Check(rule, severity, message, lambda value: value <= limit, lambda values: values > limit)
+
+
+def _literal(value) -> str:
+    """ข้อความที่ฝังใน template ของ str.format โดยไม่ให้ { } ถูกตีความ"""
+    return str(value).replace("{", "{{").replace("}", "}}")
+
+
+# ===========================================
+# Value parsing (record)
+# ===========================================
+
+def parse_value(kind: str, value):
+    """แปลงค่าตาม type ของ schema (None ถ้าแปลงไม่ได้ - string ใช้ค่าเดิม)"""
+    if kind == "integer":
+        return parse_int(value)
+    if kind == "number":
+        return parse_float(value)
+    return value
+
+
+def parse_float(value):
+    """แปลงเป็นตัวเลข (None ถ้าไม่ใช่ตัวเลข เช่น "abc", true หรือ list)"""
+    if isinstance(value, str):
+        return float(value) if _NUMBER.match(value) else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    try:
+        return float(value)
+    except OverflowError:  # จำนวนเต็มที่ใหญ่เกิน float
+        return None
+
+
+def parse_int(value):
+    """แปลงเป็นจำนวนเต็ม (None ถ้าไม่ใช่จำนวนเต็มในช่วง int64 เช่น "abc", "12.5", 2566.5 หรือ 1e20)"""
+    if isinstance(value, str):
+        return int(value) if _INTEGER.match(value) else None
+    number = parse_float(value)
+    if number is None or math.isinf(number) or number != int(number):
+        return None
+    number = int(value)
+    return number if INT64_MIN <= number <= INT64_MAX else None
+
+
+# ===========================================
+# Column checks (pyarrow.compute)
+# ===========================================
+
+def parse_column(kind: str, column):
+    """
+    แปลงคอลัมน์ตาม type ของ schema: (ค่า, mask ของแถวที่แปลงไม่ได้)
+    integer/number ได้ numpy array (แถวที่แปลงไม่ได้มีค่า 0) string ได้ Arrow array แบบ string
+    """
+    if kind == "integer":
+        return parse_numbers(column, integer=True)
+    if kind == "number":
+        return parse_numbers(column)
+    return _as_string(column), np.zeros(len(column), dtype=bool)
+
+
+def is_string_type(column) -> bool:
+    return pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+
+
+def missing_mask(column):
+    """numpy mask ของแถวที่ไม่มีค่า (null หรือ "")"""
+    if is_string_type(column):
+        return _to_numpy(pc.equal(column, ""), fill=True)
+    return pc.is_null(column).to_numpy(zero_copy_only=False)
+
+
+def is_in(column, allowed):
+    """numpy mask ของแถวที่ค่าอยู่ใน allowed (column: Arrow array หรือ numpy array ของตัวเลข)"""
+    if isinstance(column, np.ndarray):
+        return np.isin(column, [value for value in allowed if not isinstance(value, str)])
+    if not is_string_type(column):
+        return np.zeros(len(column), dtype=bool)
+    return _to_numpy(pc.is_in(column, value_set=pa.array([str(value) for value in allowed], pa.string())))
+
+
+def parse_numbers(column, integer: bool = False):
+    """(ค่าเป็น numpy array, mask ของแถวที่ไม่ใช่ตัวเลข/จำนวนเต็ม) - แถวที่ไม่ผ่านมีค่าเป็น 0"""
+    target = pa.int64() if integer else pa.float64()
+    if is_string_type(column):
+        pattern = INTEGER_PATTERN if integer else NUMBER_PATTERN
+        ok = pc.fill_null(pc.match_substring_regex(column, pattern), False)
+        text = pc.utf8_trim_whitespace(pc.if_else(ok, column, pa.scalar(None, column.type)))
+        values = pc.cast(pc.replace_substring_regex(text, r"^\+", ""), target)
+    elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        ok = pc.is_valid(column)
+        if integer and pa.types.is_floating(column.type):
+            # ต้องเป็นจำนวนเต็มและอยู่ในช่วง int64 (2 ** 63 แทนด้วย float ได้พอดี)
+            ok = pc.and_(ok, pc.equal(pc.trunc(column), column))
+            ok = pc.and_(ok, pc.and_(pc.greater_equal(column, float(INT64_MIN)),
+                                     pc.less(column, float(INT64_MAX + 1))))
+        elif integer and pa.types.is_unsigned_integer(column.type):
+            ok = pc.and_(ok, pc.less_equal(column, pa.scalar(INT64_MAX, column.type)))
+        column = pc.if_else(ok, column, pa.scalar(None, column.type))
+        values = pc.cast(column, target)
+    else:
+        ok = pa.nulls(len(column), pa.bool_())
+        values = pa.nulls(len(column), target)
+    return pc.fill_null(values, 0).to_numpy(zero_copy_only=False), ~_to_numpy(ok)
+
+
+def _as_string(column):
+    return column if is_string_type(column) else pc.cast(column, pa.string())
+
+
+def _to_numpy(mask, fill: bool = False):
+    """Arrow boolean -> numpy (null = fill)"""
+    return pc.fill_null(mask, fill).to_numpy(zero_copy_only=False)
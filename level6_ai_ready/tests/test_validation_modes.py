@@ -0,0 +1,164 @@
+"""
+ตรวจว่าการตรวจแบบทีละ record, แบบ columnar และแบบ validate_parallel ให้ผลเดียวกัน
+บนไฟล์ JSONL สุ่มที่มีข้อมูลเสียหลายแบบ (ปัญหา จำนวน และ report ต้องตรงกันทุกรายการ)
+
+รัน: pip install pytest pyarrow numpy
+     python -m pytest level6_ai_ready/tests
+"""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("pyarrow")
+
+import validation  # noqa: E402
+from issue_report import ReportWriter  # noqa: E402
+from validation import DataValidator  # noqa: E402
+
+# json.dumps เขียนเป็น NaN/Infinity ซึ่งไม่ใช่ JSON มาตรฐาน ทุกโหมดต้องรายงานเป็น invalid_json
+NAN, INF = float("nan"), float("inf")
+
+# บรรทัดที่เป็น JSON ถูกต้องแต่ไม่ใช่ object (รายงานเป็น invalid_record)
+NOT_OBJECTS = ["[1, 2]", '"x"', "5", "null", "true", " null"]
+
+REGIONS = ["TH-C", "TH-N", "TH-NE", "TH-S", "TH-E"]
+
+BATCH_SIZE = 500
+
+# ค่าเสียที่ชนิดเดียวกับค่าปกติ (ก้อนยังตรวจแบบ columnar ได้)
+SAME_TYPE_VALUES = {
+    "region_code": ["TH-X", "", None],
+    "region_th": ["", None],
+    "region_en": ["North-1", "", None],
+    "year": [2566.0, 2566.5, 2700, 1e16, 1e20, None],
+    "consumption_gwh": [-1, 0, 150000.0, NAN, INF, None],
+    "customers": [0, 1.0, 2.5, -5, 1e20, None],
+    "growth_rate": [150, -101.5, None],
+}
+
+# ค่าเสียที่ตรงกับชนิดใน schema พอดี (pyarrow.json อ่านทั้งก้อนได้)
+ARROW_TYPE_VALUES = {
+    "region_code": ["TH-X", "", None],
+    "region_en": ["North-1", None],
+    "year": [2700, 2499, None],
+    "consumption_gwh": [-1, 0, 150000.0, NAN, INF, None],
+    "customers": [0, -5, None],
+    "growth_rate": [150, -101.5, None],
+}
+
+# ค่าเสียทุกแบบ รวมชนิดที่ปนกับค่าปกติ (ก้อนที่มีค่าเหล่านี้ตรวจทีละ record)
+BAD_VALUES = {
+    "region_code": ["TH-X", "", 5, None, True],
+    "region_th": ["", 12, None, ["ภาค"]],
+    "region_en": ["North-1", 7, "", None],
+    "year": [2566.0, 2566.5, "2566", "2566.0", "abc", 2700, "", None, False, 10 ** 20, 1e16],
+    "consumption_gwh": [-1, 0, "12.5", "x", 150000.0, "", None, {"gwh": 1}],
+    "customers": [0, 1.0, 2.5, "100", "1e3", 10 ** 20, 2 ** 63, -5, None],
+    "growth_rate": [150, "-3.5", "n/a", None, ""],
+}
+
+
+def record(rng: random.Random, bad_values: dict) -> dict:
+    result = {
+        "region_code": rng.choice(REGIONS),
+        "region_th": "ภาคกลาง",
+        "region_en": "Central",
+        "year": rng.randint(2560, 2566),
+        "consumption_gwh": round(rng.uniform(1000, 40000), 2),
+        "customers": rng.randint(1000, 9_000_000),
+        "growth_rate": round(rng.uniform(-5, 5), 2),
+    }
+    for field, values in bad_values.items():
+        if rng.random() < 0.03:
+            value = rng.choice(values)
+            if value is None and rng.random() < 0.5:
+                del result[field]
+            else:
+                result[field] = value
+    return result
+
+
+def write_bad_file(path: Path, rows: int, seed: int = 0):
+    """JSONL สุ่ม: ค่าเสีย JSON เสีย บรรทัดที่ไม่ใช่ object บรรทัดว่าง และข้อมูลซ้ำ"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for row in range(rows):
+            # ก้อนแบบ 0: ค่าเสียทุกแบบ (ตรวจทีละ record), 1: ชนิดเดียวกัน + JSON เสีย (columnar หลัง parse
+            # ทีละบรรทัด), 2: ชนิดเดียวกันและ JSON ถูกทั้งก้อน (pyarrow.json อ่านทั้งก้อน)
+            kind = row // BATCH_SIZE % 3
+            bad_values = [BAD_VALUES, SAME_TYPE_VALUES, ARROW_TYPE_VALUES][kind]
+            roll = rng.random() if kind < 2 else 1
+            if roll < 0.01:
+                f.write('{"region_code": "TH-C", broken\n')
+            elif roll < 0.015:
+                f.write("\n")
+            elif roll < 0.02:
+                f.write(rng.choice(NOT_OBJECTS) + "\n")
+            else:
+                f.write(json.dumps(record(rng, bad_values), ensure_ascii=False) + "\n")
+
+
+def run(path: Path, report: Path, columnar: bool, workers: int = 1, max_errors: int = None) -> dict:
+    validator = DataValidator(columnar=columnar, batch_size=BATCH_SIZE, max_errors=max_errors,
+                              report=ReportWriter(report, validation.compile_schema().rules))
+    if workers > 1:
+        validator.validate_parallel([path], workers=workers)
+    else:
+        validator.validate_jsonl(str(path), check_keys=True)
+    validator.report.close(validator.summary())
+    with open(report, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    return {
+        "summary": entries[-1]["summary"],
+        "issues": sorted(json.dumps(entry, sort_keys=True, ensure_ascii=False) for entry in entries[:-1]),
+        "errors": sorted(validator.errors),
+        "warnings": sorted(validator.warnings),
+    }
+
+
+@pytest.fixture(scope="module")
+def bad_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "bad.jsonl"
+    write_bad_file(path, 5000)
+    return path
+
+
+@pytest.mark.parametrize("max_errors", [None, 1, 7, 50, 300, 1234, 3000])
+def test_modes_agree(bad_file, tmp_path, monkeypatch, max_errors):
+    monkeypatch.setattr(validation, "MIN_SHARD_BYTES", 64 << 10)  # หลาย shard แม้ไฟล์เล็ก
+    expected = run(bad_file, tmp_path / "row.jsonl", columnar=False, max_errors=max_errors)
+    assert expected["summary"]["errors"] > 0
+    for name, options in {
+        "columnar": {"columnar": True},
+        "parallel": {"columnar": True, "workers": 3},
+        "parallel-row": {"columnar": False, "workers": 3},
+    }.items():
+        result = run(bad_file, tmp_path / f"{name}.jsonl", max_errors=max_errors, **options)
+        assert result == expected, name
+
+
+def test_modes_agree_at_exact_limit(bad_file, tmp_path, monkeypatch):
+    # max_errors เท่ากับจำนวน error ของ shard แรกพอดี: หยุดที่แถวของ error สุดท้ายใน shard นั้น
+    # ไม่นับแถวหลังจากนั้น (validate_parallel ต้องตรวจ shard ซ้ำแม้ error ไม่เกินโควตา)
+    monkeypatch.setattr(validation, "MIN_SHARD_BYTES", 64 << 10)
+    count = max(1, min(3 * validation.SHARDS_PER_WORKER, bad_file.stat().st_size // validation.MIN_SHARD_BYTES))
+    _, end = validation.line_shards(bad_file, count)[0]
+    with open(bad_file, "rb") as f:
+        last_row = f.read(end).count(b"\n")
+    rows = [json.loads(issue)["row"] for issue in run(bad_file, tmp_path / "all.jsonl", columnar=False)["issues"]
+            if json.loads(issue)["severity"] == "error"]
+    max_errors = sum(row <= last_row for row in rows)
+    expected = run(bad_file, tmp_path / "row.jsonl", columnar=False, max_errors=max_errors)
+    assert expected["summary"]["stopped"]
+    for name, options in {
+        "columnar": {"columnar": True},
+        "parallel": {"columnar": True, "workers": 3},
+    }.items():
+        result = run(bad_file, tmp_path / f"{name}.jsonl", max_errors=max_errors, **options)
+        assert result == expected, name
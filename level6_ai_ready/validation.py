@@ -2,19 +2,65 @@
 Data Validation for AI-Ready Energy Statistics
 Level 6: ตรวจสอบคุณภาพข้อมูลก่อนใช้กับ AI/ML
 
-รัน: python validation.py
+ถ้าติดตั้ง pyarrow ไว้ จะตรวจทีละ batch แบบ columnar: ทุกกฎทำงานกับทั้งคอลัมน์ด้วย
+pyarrow.compute / numpy (CSV อ่านด้วย pyarrow.csv) ไม่มี pyarrow จะตรวจทีละ record
+ด้วย validate_record - ผลเหมือนกัน (รวมแถว CSV ที่จำนวนคอลัมน์ไม่ตรง header ซึ่งถูกข้าม
+และรายงานเป็น invalid_csv ทั้งสองแบบ) แต่ช้ากว่ามากกับไฟล์ใหญ่
+
+กฎทั้งหมดมาจาก schema.json (compile ครั้งเดียวด้วย schema_compiler.py) แก้ schema แล้วการตรวจเปลี่ยนตาม
+dataset อื่นใช้ DataValidator(schema="path/to/schema.json")
+
+ปัญหาที่พบเก็บเป็น (row, rule, value) ใน IssueLog แล้วค่อยแปลงเป็นข้อความตอนรายงาน
+ไม่สร้าง string ทีละแถวระหว่างตรวจ - นับครบทุกรายการแต่เก็บตัวอย่างแค่ --samples รายการต่อ rule
+(ไฟล์ที่เสียทั้งไฟล์จึงไม่ใช้ memory ตามจำนวนแถว) ปัญหาทั้งหมดเขียนลงไฟล์ได้ระหว่างตรวจด้วย
+--report (JSONL หรือ SARIF ดู issue_report.py) และ --max-errors N หยุดตรวจที่ error ลำดับที่ N
+(รายงานและ report มี error พอดี N รายการ ทั้งแบบ columnar แบบทีละ record และ --workers)
+
+ไฟล์ใหญ่: --workers N แบ่งแต่ละไฟล์เป็นช่วง byte ที่ขอบตรงต้นบรรทัด ตรวจใน process pool
+แล้วรวมเป็นรายงานเดียว (ข้อมูลซ้ำตรวจด้วย set ของ key ต่อ shard แล้วรวมตอนท้าย)
+
+รัน: python validation.py [--workers 8] [--max-errors 1000] [--report reports/validation.sarif]
+     (pip install pyarrow - ไม่บังคับ)
 """
 
-import json
+import argparse
 import csv
+import io
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from pathlib import Path
 from typing import Any
 
+from issue_report import ReportWriter
+from jsonl_reader import BATCH_SIZE, iter_line_blocks, line_shards, open_range, parse_lines
+from schema_compiler import SCHEMA_PATH, compile_schema, is_string_type, missing_mask, parse_column, parse_value
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+except ImportError:  # ตรวจทีละ record แทน
+    np = pa = pc = pa_csv = pa_json = None
+
+
+# validate_parallel: จำนวน shard ต่อ worker (กระจายงานให้ process ที่เสร็จก่อน) และขนาด shard ขั้นต่ำ
+SHARDS_PER_WORKER = 4
+MIN_SHARD_BYTES = 4 << 20
 
-# Validation Rules
-VALID_REGION_CODES = {"TH-C", "TH-N", "TH-NE", "TH-S", "TH-E"}
-MIN_YEAR = 2500
-MAX_YEAR = 2600
+# จำนวนตัวอย่างที่เก็บ/แสดงต่อ rule (จำนวนปัญหานับครบทุกรายการเสมอ)
+MAX_SAMPLES = 20
+
+# key ของการตรวจข้อมูลซ้ำ: ค่าของ field ใน x-unique ต่อกันด้วย KEY_SEPARATOR (ค่าที่ไม่มีแทนด้วย NULL_KEY)
+KEY_SEPARATOR = "\x1f"
+NULL_KEY = "\x00"
+
+# บรรทัด JSONL ที่เป็น null: pyarrow.json อ่านเป็นแถวว่างแทนที่จะ error
+NULL_LINE = re.compile(rb"^[ \t\r]*null", re.MULTILINE)
 
 
 class ValidationError(Exception):
@@ -22,155 +68,632 @@ class ValidationError(Exception):
     pass
 
 
+class IssueLog:
+    """
+    ปัญหาที่พบแยกตาม rule: นับทุกรายการ แต่เก็บเลขแถวและค่าที่ไม่ผ่านไว้แค่ max_samples รายการแรกต่อ rule
+    (ไฟล์ที่เสียทั้งไฟล์จึงไม่ใช้ memory ตามจำนวนแถว) ทุกรายการส่งต่อให้ sink ได้ (ReportWriter)
+    row = None คือปัญหาระดับไฟล์ (ไม่มีเลขแถว)
+    max_errors: บันทึก error ไม่เกินจำนวนนี้ (รายการที่เกินไม่ถูกนับและไม่ส่งให้ sink)
+    """
+
+    def __init__(self, rules: dict, max_samples: int = MAX_SAMPLES, sink=None, max_errors: int = None):
+        self.rules = rules                # rule -> (severity, ข้อความ) ของ CompiledSchema
+        self.max_samples = max_samples    # None = เก็บทุกรายการ
+        self.sink = sink                  # ReportWriter ที่เขียนทุกรายการลงไฟล์ทันที
+        self.max_errors = max_errors      # None = ไม่จำกัด
+        self.errors = 0                   # จำนวน error ที่บันทึกแล้ว
+        self._rows = defaultdict(list)    # rule -> [ก้อนของเลขแถว]
+        self._values = defaultdict(list)  # rule -> [ก้อนของค่า]
+        self._stored = defaultdict(int)
+        self._counts = defaultdict(int)
+
+    def add(self, rule: str, row, value=None):
+        """บันทึกปัญหาหนึ่งรายการ"""
+        self.extend(rule, (row,), (value,))
+
+    def extend(self, rule: str, rows, values=None):
+        """บันทึกปัญหาหลายแถวของ rule เดียวกัน (values = None: ไม่มีค่าที่ต้องแสดง)"""
+        if rule not in self.rules:
+            raise KeyError(f"Unknown validation rule {rule!r}")
+        if self.rules[rule][0] == "error":
+            if self.max_errors is not None and len(rows) > self.max_errors - self.errors:
+                room = max(0, self.max_errors - self.errors)
+                rows = rows[:room]
+                values = values[:room] if values is not None else None
+            self.errors += len(rows)
+        if len(rows) == 0:
+            return
+        if self.sink is not None:
+            self.sink.write(rule, rows, values)
+        self._counts[rule] += len(rows)
+        self._keep(rule, rows, values)
+
+    def _keep(self, rule: str, rows, values):
+        """เก็บตัวอย่างไม่เกิน max_samples ต่อ rule"""
+        room = len(rows) if self.max_samples is None else self.max_samples - self._stored[rule]
+        if room <= 0:
+            return
+        rows = rows[:room]
+        self._rows[rule].append(rows)
+        self._values[rule].append(values[:room] if values is not None else (None,) * len(rows))
+        self._stored[rule] += len(rows)
+
+    def counts(self, severity: str = None) -> dict:
+        """{rule: จำนวน} ของ rule ที่พบ (นับทุกรายการ ไม่ใช่แค่ตัวอย่างที่เก็บไว้)"""
+        return {rule: self._counts[rule] for rule in self.rules
+                if rule in self._counts and (severity is None or self.rules[rule][0] == severity)}
+
+    def count(self, severity: str = None) -> int:
+        return sum(self.counts(severity).values())
+
+    def issues(self, severity: str = None):
+        """yield (row, rule, value) ของตัวอย่างที่เก็บไว้ เรียงตาม rule แล้วตามลำดับที่พบ"""
+        for rule in self.rules:
+            if rule in self._counts and (severity is None or self.rules[rule][0] == severity):
+                for row, value in self.samples(rule):
+                    yield row, rule, value
+
+    def samples(self, rule: str):
+        """yield (row, value) ของตัวอย่างที่เก็บไว้ของ rule"""
+        rows = chain.from_iterable(_tolist(chunk) for chunk in self._rows[rule])
+        values = chain.from_iterable(_tolist(chunk) for chunk in self._values[rule])
+        yield from zip(rows, values)
+
+    def messages(self, severity: str = None) -> list:
+        """ข้อความของปัญหาแบบเดียวกับที่รายงาน"""
+        return [self.format(row, rule, value) for row, rule, value in self.issues(severity)]
+
+    def format(self, row, rule: str, value) -> str:
+        """ข้อความของปัญหา เช่น "Row 12: year 2700 out of range [2500, 2600]" """
+        message = self.rules[rule][1].format(value=value)
+        return message if row is None else f"Row {row}: {message}"
+
+    def __getstate__(self):
+        # ส่งข้าม process ได้ (ไฟล์ของ sink ไม่ถูกส่งไปด้วย)
+        return {**self.__dict__, "sink": None}
+
+    def merge(self, other: "IssueLog", row_offset: int = 0):
+        """
+        เพิ่มปัญหาของ other (เลขแถวบวก row_offset): รวมจำนวนทั้งหมดและตัวอย่างที่ other เก็บไว้
+        ไม่ส่งให้ sink (other เขียน report ของตัวเองไปแล้ว - ดู ReportWriter.copy)
+        """
+        for rule, count in other._counts.items():
+            self._counts[rule] += count
+        self.errors += other.errors
+        for rule, chunks in other._rows.items():
+            for rows, values in zip(chunks, other._values[rule]):
+                if hasattr(rows, "dtype"):
+                    rows = rows + row_offset
+                else:
+                    rows = tuple(None if row is None else row + row_offset for row in rows)
+                self._keep(rule, rows, values)
+
+
+def _tolist(chunk) -> list:
+    return chunk.tolist() if hasattr(chunk, "tolist") else list(chunk)
+
+
 class DataValidator:
-    def __init__(self):
-        self.errors = []
-        self.warnings = []
+    def __init__(self, columnar: bool = None, batch_size: int = BATCH_SIZE, schema=SCHEMA_PATH,
+                 max_samples: int = MAX_SAMPLES, max_errors: int = None, report=None):
+        # columnar: None = ใช้เมื่อติดตั้ง pyarrow ไว้
+        # schema: path ของ JSON Schema หรือ dict (compile ครั้งเดียว ใช้ซ้ำจาก cache)
+        # max_samples: ตัวอย่างที่เก็บต่อ rule, max_errors: หยุดตรวจเมื่อพบ error ครบ (None = ตรวจจนจบ)
+        # report: ReportWriter ที่เขียนทุกปัญหาลงไฟล์ระหว่างตรวจ
+        if columnar and pa is None:
+            raise ImportError("pyarrow is required for columnar validation: pip install pyarrow")
+        self.columnar = pa is not None if columnar is None else columnar
+        self.batch_size = batch_size
+        self.schema = compile_schema(schema)
+        self.issues = IssueLog(self.schema.rules, max_samples, sink=report, max_errors=max_errors)
+        self.max_errors = max_errors
+        self.stopped = False        # หยุดก่อนจบเพราะ error ครบ max_errors
         self.records_checked = 0
+        self.rows_read = 0          # เลขแถวสุดท้ายของไฟล์/ช่วงที่ตรวจล่าสุด (ใช้รวมผลของ shard)
+        self.keys = {}              # key ของ x-unique -> แถวแรกที่พบ
+        self.values_found = {field: set() for field in self.schema.complete}
+
+    def __getstate__(self):
+        # ส่งข้าม process (validate_parallel): ส่งที่มาของ schema แล้ว compile ใหม่ฝั่งผู้รับ
+        state = self.__dict__.copy()
+        state["schema"] = self.schema.source
+        return state
+
+    def __setstate__(self, state):
+        state["schema"] = compile_schema(state["schema"])
+        self.__dict__.update(state)
+
+    @property
+    def report(self):
+        return self.issues.sink
+
+    def limit_reached(self) -> bool:
+        """พบ error ครบ max_errors แล้ว (ตรวจต่อไม่ได้)"""
+        if not self.stopped and self.max_errors is not None:
+            self.stopped = self.issues.errors >= self.max_errors
+        return self.stopped
+
+    @property
+    def errors(self) -> list:
+        return self.issues.messages("error")
+
+    @property
+    def warnings(self) -> list:
+        return self.issues.messages("warning")
 
     def validate_record(self, record: dict, row_num: int) -> bool:
         """ตรวจสอบ record เดียว"""
         is_valid = True
 
         # Required fields
-        required_fields = [
-            "region_code", "region_th", "region_en",
-            "year", "consumption_gwh", "customers", "growth_rate"
-        ]
-
-        for field in required_fields:
+        for field in self.schema.required:
             if field not in record or record[field] is None or record[field] == "":
-                self.errors.append(f"Row {row_num}: Missing required field '{field}'")
+                self.issues.add(f"{field}:required", row_num)
                 is_valid = False
 
         if not is_valid:
             return False
 
-        # Region code validation
-        if record["region_code"] not in VALID_REGION_CODES:
-            self.errors.append(
-                f"Row {row_num}: Invalid region_code '{record['region_code']}'. "
-                f"Must be one of {VALID_REGION_CODES}"
-            )
-            is_valid = False
-
-        # Year validation
-        try:
-            year = int(record["year"])
-            if not (MIN_YEAR <= year <= MAX_YEAR):
-                self.errors.append(
-                    f"Row {row_num}: Year {year} out of range [{MIN_YEAR}, {MAX_YEAR}]"
-                )
+        for field in self.schema.fields:
+            raw = record.get(field.name)
+            if raw is None or raw == "":
+                continue  # field ที่ไม่บังคับ
+            value = parse_value(field.type, raw)
+            if value is None:
+                self.issues.add(field.type_rule, row_num, raw)
                 is_valid = False
-        except (ValueError, TypeError):
-            self.errors.append(f"Row {row_num}: Invalid year value '{record['year']}'")
-            is_valid = False
-
-        # Consumption validation
-        try:
-            consumption = float(record["consumption_gwh"])
-            if consumption <= 0:
-                self.errors.append(
-                    f"Row {row_num}: consumption_gwh must be positive, got {consumption}"
-                )
-                is_valid = False
-            if consumption > 100000:  # Sanity check
-                self.warnings.append(
-                    f"Row {row_num}: consumption_gwh={consumption} seems unusually high"
-                )
-        except (ValueError, TypeError):
-            self.errors.append(
-                f"Row {row_num}: Invalid consumption_gwh value '{record['consumption_gwh']}'"
-            )
-            is_valid = False
-
-        # Customers validation
-        try:
-            customers = int(record["customers"])
-            if customers <= 0:
-                self.errors.append(
-                    f"Row {row_num}: customers must be positive, got {customers}"
-                )
-                is_valid = False
-        except (ValueError, TypeError):
-            self.errors.append(
-                f"Row {row_num}: Invalid customers value '{record['customers']}'"
-            )
-            is_valid = False
-
-        # Growth rate validation
-        try:
-            growth = float(record["growth_rate"])
-            if not (-100 <= growth <= 100):
-                self.errors.append(
-                    f"Row {row_num}: growth_rate {growth} out of range [-100, 100]"
-                )
-                is_valid = False
-        except (ValueError, TypeError):
-            self.errors.append(
-                f"Row {row_num}: Invalid growth_rate value '{record['growth_rate']}'"
-            )
-            is_valid = False
+                continue
+            for check in field.checks:
+                if not check.test(value):
+                    self.issues.add(check.rule, row_num, value)
+                    if check.severity == "error":
+                        is_valid = False
 
         self.records_checked += 1
         return is_valid
 
-    def validate_jsonl(self, filepath: str) -> bool:
-        """ตรวจสอบไฟล์ JSONL"""
-        print(f"\nValidating JSONL: {filepath}")
+    def validate_batch(self, batch, row_nums, found: list = None) -> Any:
+        """
+        ตรวจ record ทั้ง batch พร้อมกัน (pyarrow.RecordBatch, row_nums = เลขแถวของแต่ละ record)
+        กฎเดียวกับ validate_record คืน numpy mask ของแถวที่ผ่าน
+        found: ปัญหาที่พบแล้วของแถวในช่วงเดียวกัน [(rule, rows, values)] เช่น JSON เสีย ข้อมูลซ้ำ
+        (บันทึกพร้อมกันเพื่อให้ max_errors ตัดตามลำดับแถวเหมือนตรวจทีละ record)
+        """
+        row_nums = np.asarray(row_nums, dtype=np.int64)
+        complete = np.ones(batch.num_rows, dtype=bool)
+        names = batch.schema.names
+        # (rule, rows, values) ตามลำดับเดียวกับ validate_record
+        found = [(rule, np.asarray(rows, dtype=np.int64), values) for rule, rows, values in found or ()]
+
+        # Required fields (แถวที่ขาด field ไม่ถูกตรวจต่อ เหมือน validate_record)
+        for field in self.schema.required:
+            missing = missing_mask(batch.column(field)) if field in names else ~complete
+            found.append((f"{field}:required", row_nums[missing], None))
+            complete &= ~missing
+
+        batch, rows = batch.filter(pa.array(complete)), row_nums[complete]
+        valid = np.ones(batch.num_rows, dtype=bool)
+
+        def flag(rule, severity, failed, values):
+            nonlocal valid
+            if failed.any():
+                if isinstance(values, np.ndarray):
+                    values = values[failed]
+                else:  # คอลัมน์ Arrow: แปลงเป็น Python เฉพาะแถวที่ไม่ผ่าน
+                    values = values.filter(pa.array(failed)).to_pylist()
+                found.append((rule, rows[failed], values))
+                if severity == "error":
+                    valid &= ~failed
+
+        for field in self.schema.fields:
+            column = batch.column(field.name) if field.name in names else None
+            if column is None or column.null_count == len(column):
+                continue  # field ที่ไม่บังคับและไม่มีในไฟล์/batch นี้
+            # field บังคับ: แถวที่ขาดถูกกรองออกไปแล้ว
+            present = complete[complete] if field.required else ~missing_mask(column)
+            values, bad = parse_column(field.type, column)
+            flag(field.type_rule, "error", present & bad, column)
+            checked = present & ~bad
+            for check in field.checks:
+                flag(check.rule, check.severity, checked & check.failed(values), values)
+
+        last = None
+        if self.max_errors is not None:
+            found, last = self._until_limit(found)
+        for rule, rule_rows, values in found:
+            self.issues.extend(rule, rule_rows, values)
+
+        # error ครบใน batch นี้: นับเฉพาะแถวจนถึงแถวที่ครบ เหมือนตรวจทีละ record
+        self.records_checked += batch.num_rows if last is None else int((rows <= last).sum())
+        result = np.zeros(len(row_nums), dtype=bool)
+        result[complete] = valid
+        return result
+
+    def _until_limit(self, found: list) -> tuple:
+        """
+        ตัดปัญหาของ batch ให้เหมือนตรวจทีละแถวแล้วหยุดที่ error ลำดับที่ max_errors:
+        เรียง error ตามแถว (แถวเดียวกันตามลำดับใน found ซึ่งเป็นลำดับที่ validate_record พบ)
+        เก็บเท่าที่ยังบันทึกได้ และทิ้งปัญหาทุกอย่างของแถวหลังแถวที่ครบ
+        คืน (found ที่ตัดแล้ว, แถวที่ error ครบ) - แถวเป็น None ถ้า batch นี้ยังไม่ครบ
+        """
+        room = self.max_errors - self.issues.errors
+        errors = {i for i, (rule, _, _) in enumerate(found) if self.schema.rules[rule][0] == "error"}
+        error_rows = np.concatenate([found[i][1] for i in sorted(errors)]) if errors else np.empty(0, np.int64)
+        if len(error_rows) < room:
+            return found, None
+        order = np.lexsort((np.arange(len(error_rows)), error_rows))[:max(room, 0)]
+        chosen = np.zeros(len(error_rows), dtype=bool)
+        chosen[order] = True
+        last = int(error_rows[order[-1]]) if room > 0 else -1
+        kept, start = [], 0
+        for i, (rule, rows, values) in enumerate(found):
+            if i in errors:
+                keep = chosen[start:start + len(rows)]
+                start += len(rows)
+            else:
+                keep = rows <= last
+            if keep.any():
+                if isinstance(values, np.ndarray):
+                    values = values[keep]
+                elif values is not None:
+                    values = [value for value, ok in zip(values, keep) if ok]
+                kept.append((rule, rows[keep], values))
+        return kept, last
+
+    def validate_jsonl(self, filepath: str, check_keys: bool = False,
+                       start: int = 0, end: int = None) -> bool:
+        """
+        ตรวจสอบไฟล์ JSONL (start/end: เฉพาะช่วง byte นั้น เลขแถวนับ 1 จาก start)
+        check_keys: ตรวจข้อมูลซ้ำและเก็บภูมิภาคที่พบไปพร้อมกัน ไม่ต้องอ่านไฟล์อีกรอบ
+        """
+        if self.limit_reached():
+            return False
+        if not start and end is None:
+            print(f"\nValidating JSONL: {filepath}")
+        if self.report is not None:
+            self.report.artifact = str(filepath)
         all_valid = True
 
-        with open(filepath, "r", encoding="utf-8") as f:
-            for i, line in enumerate(f, 1):
-                try:
-                    record = json.loads(line.strip())
-                    if not self.validate_record(record, i):
-                        all_valid = False
-                except json.JSONDecodeError as e:
-                    self.errors.append(f"Row {i}: Invalid JSON - {e}")
+        def invalid_json(row_num, error):
+            nonlocal all_valid
+            self.issues.add("invalid_json", row_num, str(error))
+            all_valid = False
+
+        blocks = iter_line_blocks(filepath, self.batch_size, start, end)
+        self.rows_read = 0
+
+        if not self.columnar:
+            for first_line, lines in blocks:
+                if not self._validate_lines(lines, first_line, filepath, check_keys, invalid_json):
                     all_valid = False
+                self.rows_read = first_line + len(lines) - 1
+                if self.limit_reached():
+                    return False
+            return all_valid
+
+        # ก้อนที่สะอาด: pyarrow.json parse ทั้งก้อนเป็นคอลัมน์โดยตรง
+        # ก้อนที่มี JSON เสีย บรรทัดว่าง หรือชนิดไม่ตรง: parse ทีละบรรทัดเพื่อรายงานให้ถูกแถว
+        # (ถ้าเสียติดกันหลายก้อน เว้นการลอง pyarrow เป็นช่วงยาวขึ้นเรื่อย ๆ ไม่ต้อง parse ซ้ำสองรอบ)
+        # field ที่ชนิดปนกันในก้อน (เช่น 2566.0 กับ "abc") แปลงเป็นคอลัมน์เดียวไม่ได้โดยไม่เปลี่ยนค่า
+        # ก้อนนั้นจึงตรวจทีละ record ด้วย validate_record ให้ผลตรงกับแบบทีละ record ทุกค่า
+        def invalid_line(row_num, error):
+            bad_rows.append(row_num)
+            bad_errors.append(str(error))
+
+        skip, backoff = 0, 1
+        for first_line, lines in blocks:
+            batch = None
+            bad_rows, bad_errors, not_objects = [], [], []
+            if skip:
+                skip -= 1
+            else:
+                batch = _read_json_block(lines, self.schema.arrow_schema())
+                skip, backoff = (0, 1) if batch is not None else (backoff, min(backoff * 2, 64))
+            if batch is not None:
+                row_nums = np.arange(first_line, first_line + len(lines))
+            else:
+                records = []
+                for row_num, record in parse_lines(lines, first_line, invalid_line, filepath):
+                    if isinstance(record, dict):
+                        records.append((row_num, record))
+                    else:
+                        not_objects.append((row_num, _json_type(record)))
+                row_nums = [row_num for row_num, _ in records]
+                columns = {field: _arrow_column([record.get(field) for _, record in records])
+                           for field in self.schema.columns}
+                if any(column is None for column in columns.values()):
+                    if not self._validate_lines(lines, first_line, filepath, check_keys, invalid_json):
+                        all_valid = False
+                    self.rows_read = first_line + len(lines) - 1
+                    if self.limit_reached():
+                        return False
+                    continue
+                batch = pa.RecordBatch.from_pydict(columns)
+            found = [("invalid_json", bad_rows, bad_errors)] if bad_rows else []
+            if not_objects:
+                found.append(("invalid_record", *map(list, zip(*not_objects))))
+            if check_keys:
+                found += self.track_keys(batch, row_nums)
+            if not self.validate_batch(batch, row_nums, found).all() or bad_rows or not_objects:
+                all_valid = False
+            self.rows_read = first_line + len(lines) - 1
+            if self.limit_reached():
+                return False
 
         return all_valid
 
-    def validate_csv(self, filepath: str) -> bool:
-        """ตรวจสอบไฟล์ CSV"""
-        print(f"\nValidating CSV: {filepath}")
+    def _validate_lines(self, lines, first_line: int, filepath, check_keys: bool, on_error) -> bool:
+        """ตรวจบรรทัด JSONL ทีละ record (หยุดเมื่อ error ครบ max_errors) คืน True ถ้าทุก record ผ่าน"""
+        valid = True
+        for i, record in parse_lines(lines, first_line, on_error, filepath):
+            if self.limit_reached():
+                break  # error ครบแล้ว (รวม JSON เสียของบรรทัดก่อนหน้า)
+            if not isinstance(record, dict):
+                self.issues.add("invalid_record", i, _json_type(record))
+                valid = False
+                continue
+            if check_keys:
+                self._track_record(record, i)
+            if not self.validate_record(record, i):
+                valid = False
+        return valid
+
+    def validate_csv(self, filepath: str, start: int = 0, end: int = None, header: list = None) -> bool:
+        """
+        ตรวจสอบไฟล์ CSV
+        start/end/header: เฉพาะช่วง byte ที่ไม่มี header (header = ชื่อคอลัมน์) เลขแถวนับ 1 จาก start
+        """
+        if self.limit_reached():
+            return False
+        ranged = header is not None
+        if not ranged:
+            print(f"\nValidating CSV: {filepath}")
+        if self.report is not None:
+            self.report.artifact = str(filepath)
         all_valid = True
-
-        with open(filepath, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, record in enumerate(reader, 2):  # Start at 2 (header is row 1)
-                if not self.validate_record(record, i):
-                    all_valid = False
+        first_row = 1 if ranged else 2  # header is row 1
+        self.rows_read = first_row - 1
+
+        if not self.columnar:
+            if ranged:
+                f = io.TextIOWrapper(open_range(filepath, start, end), encoding="utf-8")
+            else:
+                f = open(filepath, "r", encoding="utf-8")
+            with f:
+                reader = csv.DictReader(f, fieldnames=header)
+                for i, record in enumerate(reader, first_row):
+                    # จำนวนคอลัมน์ไม่ตรง header: ข้ามแถวแล้วรายงานเป็น invalid_csv เหมือนแบบ columnar
+                    # (DictReader เก็บคอลัมน์เกินไว้ที่ key None และเติมคอลัมน์ที่ขาดด้วย None)
+                    if None in record or None in record.values():
+                        columns = sum(value is not None for key, value in record.items() if key is not None)
+                        columns += len(record.get(None, ()))
+                        self.issues.add("invalid_csv", i, (len(reader.fieldnames), columns))
+                        valid = False
+                    else:
+                        valid = self.validate_record(record, i)
+                    if not valid:
+                        all_valid = False
+                        if self.limit_reached():
+                            return False
+                    self.rows_read = i
+            return all_valid
+
+        # แถวที่จำนวนคอลัมน์ไม่ตรง header ถูกข้าม (รายงานเป็น invalid_csv พร้อม batch ที่แถวนั้นอยู่
+        # เพราะ reader อ่านล่วงหน้าได้หลาย batch)
+        skipped, invalid = [], []
+
+        def invalid_row(row):
+            skipped.append(row.number)
+            if row.number is None:
+                self.issues.add("invalid_csv", None, (row.expected_columns, row.actual_columns))
+            else:
+                invalid.append((row.number, (row.expected_columns, row.actual_columns)))
+            return "skip"
+
+        def invalid_until(last_row):
+            """ปัญหา invalid_csv ของแถวที่ไม่เกิน last_row (ที่ยังไม่บันทึก)"""
+            rows = [(row, value) for row, value in invalid if row <= last_row]
+            invalid[:] = [(row, value) for row, value in invalid if row > last_row]
+            return [("invalid_csv", [row for row, _ in rows], [value for _, value in rows])] if rows else []
+
+        # อ่านเฉพาะคอลัมน์ที่ต้องตรวจเป็น string แบบ csv.DictReader (ช่องว่าง = "" ไม่ใช่ null)
+        reader = pa_csv.open_csv(
+            open_range(filepath, start, end) if ranged else filepath,
+            read_options=pa_csv.ReadOptions(column_names=header),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=invalid_row),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=self.schema.columns, include_missing_columns=True,
+                column_types={field: pa.string() for field in self.schema.columns},
+                strings_can_be_null=False,
+            ),
+        )
+        next_row = first_row
+        for batch in reader:
+            row_nums = _csv_row_numbers(next_row, batch.num_rows, skipped)
+            if len(row_nums):
+                next_row = int(row_nums[-1]) + 1
+            if not self.validate_batch(batch, row_nums, invalid_until(next_row - 1)).all():
+                all_valid = False
+            if self.limit_reached():
+                return False
+        for _, rows, values in invalid_until(float("inf")):
+            self.issues.extend("invalid_csv", rows, values)  # แถวเสียท้ายไฟล์
+
+        self.rows_read = max([next_row - 1, *filter(None, skipped)])
+        return all_valid and not skipped
+
+    def validate_parallel(self, jsonl_paths=(), csv_paths=(), workers: int = None) -> bool:
+        """
+        ตรวจหลายไฟล์พร้อมกันด้วย process pool: แต่ละไฟล์ถูกแบ่งเป็นช่วง byte ที่ขอบตรงต้นบรรทัด
+        (line_shards) แต่ละ shard ตรวจใน process แยก แล้วรวมผลเป็นรายงานเดียวตามลำดับแถวเดิม
+        ไฟล์ JSONL ตรวจข้อมูลซ้ำ/ภูมิภาคไปพร้อมกัน ทุกไฟล์จึงถูกอ่านครั้งเดียว
+        มี report: แต่ละ shard เขียนปัญหาลงไฟล์ .partN ของตัวเอง แล้วต่อเข้า report ตามลำดับตอนรวมผล
+
+        CSV แบบแบ่ง shard ต้องไม่มีการขึ้นบรรทัดใหม่ภายในค่าที่อยู่ในเครื่องหมายคำพูด
+        """
+        workers = workers or os.cpu_count() or 1
+        tasks, files = [], []
+        for kind, paths in (("jsonl", jsonl_paths), ("csv", csv_paths)):
+            for path in map(str, paths):
+                header, offset = (None, 0) if kind == "jsonl" else _csv_header(path)
+                count = max(1, min(workers * SHARDS_PER_WORKER, os.path.getsize(path) // MIN_SHARD_BYTES))
+                shards = line_shards(path, count, offset)
+                print(f"\nValidating {kind.upper()}: {path} ({len(shards)} shards, {workers} workers)")
+                files.append((kind, path, len(shards)))
+                tasks.extend((kind, path, begin, end, header) for begin, end in shards)
+
+        parts = [None if self.report is None else f"{self.report.path}.part{i}" for i in range(len(tasks))]
+        options = (self.schema.source, self.columnar, self.batch_size, self.issues.max_samples, self.max_errors)
+        all_valid = True
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_validate_shard, [(*options, task, part) for task, part in zip(tasks, parts)])
+                pending = iter(zip(tasks, parts))
+                for kind, path, count in files:
+                    if self.report is not None:
+                        self.report.artifact = path
+                    # เลขแถวของ shard = จำนวนแถวของ shard ก่อนหน้า + เลขแถวใน shard (CSV มี header เป็นแถวแรก)
+                    offset = 0 if kind == "jsonl" else 1
+                    for _ in range(count):
+                        shard, valid = next(results)
+                        task, part = next(pending)
+                        if self._overflows(shard):
+                            # shard ที่ทำให้ error เกิน: ตรวจซ้ำด้วยโควตาที่เหลือ (รู้ key ของ shard ก่อนหน้า)
+                            # ให้หยุดที่ error ลำดับ max_errors พอดีเหมือนตรวจทีละไฟล์
+                            room = self.max_errors - self.issues.errors
+                            shard, valid = _validate_shard((*options[:-1], room, task, part), self.keys)
+                        if part is not None:
+                            self.report.copy(part, offset)
+                        self.merge(shard, offset)
+                        offset += shard.rows_read
+                        all_valid = all_valid and valid
+                        if self.limit_reached():
+                            # shard ที่ยังไม่เริ่มไม่ต้องตรวจ
+                            executor.shutdown(wait=True, cancel_futures=True)
+                            return False
+        finally:
+            for part in filter(None, parts):
+                if os.path.exists(part):
+                    os.remove(part)
 
         return all_valid
 
-    def check_duplicates(self, records: list) -> bool:
+    def _overflows(self, shard: "DataValidator") -> bool:
+        """
+        error ของ shard (รวมข้อมูลที่ซ้ำกับ shard ก่อนหน้า) ถึงโควตาที่เหลือของ max_errors
+        (ครบพอดีก็ต้องตรวจซ้ำ: แถวหลัง error สุดท้ายของ shard ต้องไม่ถูกนับ)
+        """
+        if self.max_errors is None:
+            return False
+        duplicates = sum(key in self.keys for key in shard.keys)
+        return shard.issues.errors + duplicates >= self.max_errors - self.issues.errors
+
+    def merge(self, other: "DataValidator", row_offset: int = 0):
+        """รวมผลของ DataValidator อื่น (เช่น shard ถัดไปของไฟล์เดียวกัน) เลขแถวของ other บวก row_offset"""
+        self.issues.merge(other.issues, row_offset)
+        self.records_checked += other.records_checked
+        # key ที่ shard นี้พบครั้งแรก แต่ shard ก่อนหน้าพบไปแล้ว = ข้อมูลซ้ำ
+        for key, row in other.keys.items():
+            if key in self.keys:
+                self.issues.add("duplicate", row + row_offset, _key_value(key))
+            else:
+                self.keys[key] = row + row_offset
+        for field, found in other.values_found.items():
+            self.values_found[field] |= found
+
+    def track_keys(self, batch, row_nums):
+        """
+        ตรวจข้อมูลซ้ำตาม key ใน x-unique และเก็บค่าที่พบของ field ใน x-complete (แบบ columnar)
+        แทน check_duplicates/check_completeness ที่ต้องอ่านไฟล์ซ้ำ
+        คืนปัญหาข้อมูลซ้ำ [(rule, rows, values)] ให้ validate_batch บันทึก
+        """
+        row_nums = np.asarray(row_nums, dtype=np.int64)
+        for field, found in self.values_found.items():
+            found.update(pc.unique(batch.column(field)).to_pylist())
+        if not self.schema.unique:
+            return []
+
+        parts = [_key_part(batch.column(field)) for field in self.schema.unique]
+        keys = pc.dictionary_encode(pc.binary_join_element_wise(*parts, KEY_SEPARATOR))
+        indices, dictionary = keys.indices.to_numpy(zero_copy_only=False), keys.dictionary.to_pylist()
+        # แถวแรกของแต่ละ key ใน batch ไม่ซ้ำ ยกเว้น key นั้นเคยพบใน batch ก่อนหน้า
+        duplicate = np.ones(len(indices), dtype=bool)
+        unique, first = np.unique(indices, return_index=True)
+        for index, position in zip(unique.tolist(), first.tolist()):
+            key = dictionary[index]
+            if key not in self.keys:
+                self.keys[key] = int(row_nums[position])
+                duplicate[position] = False
+        return [("duplicate", row_nums[duplicate],
+                 [_key_value(dictionary[index]) for index in indices[duplicate].tolist()])]
+
+    def _track_record(self, record: dict, row_num: int):
+        """track_keys ของ record เดียว (แบบทีละ record)"""
+        for field, found in self.values_found.items():
+            found.add(record.get(field))
+        if not self.schema.unique:
+            return
+
+        parts = []
+        for field in self.schema.unique:
+            value = record.get(field)
+            if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+                value = int(value)  # ให้ key ตรงกับแบบ columnar (2566.0 -> "2566", 1e16 -> "1e+16")
+            parts.append(NULL_KEY if value is None else str(value))
+        key = KEY_SEPARATOR.join(parts)
+        if key in self.keys:
+            self.issues.add("duplicate", row_num, _key_value(key))
+        else:
+            self.keys[key] = row_num
+
+    def check_duplicates(self, records) -> bool:
         """ตรวจสอบข้อมูลซ้ำ"""
         seen_keys = set()
         has_duplicates = False
 
         for i, record in enumerate(records, 1):
-            key = (record.get("region_code"), record.get("year"))
+            key = tuple(record.get(field) for field in self.schema.unique)
             if key in seen_keys:
-                self.errors.append(
-                    f"Row {i}: Duplicate record for region={key[0]}, year={key[1]}"
-                )
+                self.issues.add("duplicate", i, key)
                 has_duplicates = True
             seen_keys.add(key)
 
         return not has_duplicates
 
-    def check_completeness(self, records: list) -> bool:
-        """ตรวจสอบความครบถ้วนของข้อมูล"""
-        regions_found = {r.get("region_code") for r in records}
-        missing_regions = VALID_REGION_CODES - regions_found
-
-        if missing_regions:
-            self.warnings.append(f"Missing data for regions: {missing_regions}")
-            return False
-
-        return True
+    def check_completeness(self, records=None) -> bool:
+        """ตรวจสอบความครบถ้วนของข้อมูล (records = None: ใช้ค่าที่พบระหว่าง validate_jsonl(check_keys=True))"""
+        complete = True
+        for field, allowed in self.schema.complete.items():
+            if records is None:
+                found = self.values_found[field]
+            else:
+                found = {r.get(field) for r in records}
+            missing = [value for value in allowed if value not in found]
+
+            if missing:
+                self.issues.add(f"{field}:complete", None, missing)
+                complete = False
+
+        return complete
+
+    def summary(self) -> dict:
+        """สรุปผล (เขียนต่อท้าย report)"""
+        return {"records_checked": self.records_checked, "errors": self.issues.count("error"),
+                "warnings": self.issues.count("warning"), "stopped": self.stopped,
+                "counts": self.issues.counts()}
+
+    def _print_issues(self, severity: str):
+        """ตัวอย่างของแต่ละ rule (ไม่เกิน max_samples) และจำนวนที่ไม่ได้แสดง"""
+        counts = self.issues.counts(severity)
+        for rule in self.issues.rules:
+            if rule not in counts:
+                continue
+            shown = 0
+            for row, value in self.issues.samples(rule):
+                print(f"   - {self.issues.format(row, rule, value)}")
+                shown += 1
+            if counts[rule] > shown:
+                print(f"     ... {counts[rule] - shown} more ({rule})")
 
     def print_report(self):
         """แสดงรายงานผลการตรวจสอบ"""
@@ -180,21 +703,27 @@ class DataValidator:
 
         print(f"\nRecords checked: {self.records_checked}")
 
-        if self.errors:
-            print(f"\n❌ ERRORS ({len(self.errors)}):")
-            for error in self.errors:
-                print(f"   - {error}")
+        if self.stopped:
+            print(f"⛔ Stopped after {self.max_errors} errors (max_errors) - rest of the data not checked")
+
+        errors = self.issues.count("error")
+        if errors:
+            print(f"\n❌ ERRORS ({errors}):")
+            self._print_issues("error")
         else:
             print("\n✅ No errors found!")
 
-        if self.warnings:
-            print(f"\n⚠️  WARNINGS ({len(self.warnings)}):")
-            for warning in self.warnings:
-                print(f"   - {warning}")
+        warnings = self.issues.count("warning")
+        if warnings:
+            print(f"\n⚠️  WARNINGS ({warnings}):")
+            self._print_issues("warning")
+
+        if self.report is not None:
+            print(f"\n📄 Report ({self.report.written} issues): {self.report.path}")
 
         print("\n" + "=" * 60)
 
-        if self.errors:
+        if errors:
             print("RESULT: ❌ FAILED - Data is NOT AI-ready")
             return False
         else:
@@ -202,32 +731,153 @@ class DataValidator:
             return True
 
 
+# ===========================================
+# Column checks (pyarrow.compute)
+# ===========================================
+
+def _read_json_block(lines: list, schema):
+    """RecordBatch ของบรรทัด JSONL ทั้งก้อนตามชนิดใน schema (None ถ้ามีบรรทัดที่ต้อง parse ทีละบรรทัด)"""
+    data = b"".join(lines)
+    # pyarrow รับ NaN/Infinity ที่ไม่ใช่ JSON มาตรฐาน ให้ parse ทีละบรรทัดแล้วรายงานเป็น invalid_json
+    if b"NaN" in data or b"Infinity" in data or NULL_LINE.search(data):
+        return None
+    try:
+        table = pa_json.read_json(
+            io.BytesIO(data),
+            read_options=pa_json.ReadOptions(block_size=len(data) + 1),
+            parse_options=pa_json.ParseOptions(explicit_schema=schema,
+                                               unexpected_field_behavior="ignore"),
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    # บรรทัดว่างถูกข้าม เลขแถวจะไม่ต่อเนื่อง
+    if table.num_rows != len(lines):
+        return None
+    return table.combine_chunks().to_batches()[0]
+
+
+def _arrow_column(values: list):
+    """
+    Arrow array ของค่าใน field หนึ่ง (ตัวเลขหรือ string ล้วน) - None ถ้าชนิดปนกัน (เช่น 2566 กับ "abc")
+    หรือเป็น true/false, list, object ซึ่งต้องตรวจทีละค่าด้วย validate_record
+    """
+    try:
+        column = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+    if not (pa.types.is_null(column.type) or pa.types.is_integer(column.type)
+            or pa.types.is_floating(column.type) or is_string_type(column)):
+        return None
+    return column
+
+
+def _json_type(value) -> str:
+    """ชนิดใน JSON ของ record ที่ไม่ใช่ object (สำหรับรายงาน invalid_record)"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    return "string" if isinstance(value, str) else "array"
+
+
+def _key_part(column):
+    """คอลัมน์เป็น string สำหรับ key ของข้อมูลซ้ำ (null -> NULL_KEY)"""
+    if not is_string_type(column):
+        column = pc.cast(column, pa.string())
+    return pc.fill_null(column, NULL_KEY)
+
+
+def _key_value(key: str) -> tuple:
+    """ค่าของแต่ละ field ใน key สำหรับรายงาน"""
+    return tuple(None if part == NULL_KEY else part for part in key.split(KEY_SEPARATOR))
+
+
+def _csv_header(filepath) -> tuple:
+    """(ชื่อคอลัมน์, byte ที่ข้อมูลเริ่ม) ของไฟล์ CSV"""
+    with open(filepath, "rb") as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8-sig")])), len(line)
+
+
+def _validate_shard(job, keys: dict = None) -> tuple:
+    """
+    ตรวจ shard หนึ่งใน process ของ pool คืน (DataValidator ของ shard, ผ่านหรือไม่)
+    part: ไฟล์ JSONL ที่เขียนปัญหาทั้งหมดของ shard (เลขแถวนับจากต้น shard)
+    keys: key ที่พบใน shard ก่อนหน้า (record ที่มี key เหล่านี้รายงานเป็นข้อมูลซ้ำใน shard เอง)
+    """
+    schema, columnar, batch_size, max_samples, max_errors, (kind, path, start, end, header), part = job
+    report = None if part is None else ReportWriter(part, compile_schema(schema).rules, "jsonl")
+    validator = DataValidator(columnar=columnar, batch_size=batch_size, schema=schema,
+                              max_samples=max_samples, max_errors=max_errors, report=report)
+    validator.keys = dict(keys or {})
+    try:
+        if kind == "jsonl":
+            valid = validator.validate_jsonl(path, check_keys=True, start=start, end=end)
+        else:
+            valid = validator.validate_csv(path, start=start, end=end, header=header)
+    finally:
+        if report is not None:
+            report.close()
+    if keys:
+        validator.keys = {key: row for key, row in validator.keys.items() if key not in keys}
+    return validator, valid
+
+
+def _csv_row_numbers(first_row: int, count: int, skipped: list):
+    """เลขแถวของ record ใน batch ของ CSV (ข้ามแถวที่ invalid_row_handler ทิ้งไป)"""
+    pending = [row for row in skipped if row is not None and row >= first_row]
+    candidates = np.arange(first_row, first_row + count + len(pending), dtype=np.int64)
+    if pending:
+        candidates = candidates[~np.isin(candidates, pending)]
+    return candidates[:count]
+
+
 def main():
     """Main validation routine"""
-    data_dir = Path(__file__).parent / "data"
-
-    validator = DataValidator()
+    parser = argparse.ArgumentParser(description="Validate AI-ready energy statistics")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="จำนวน process (>1 = แบ่งไฟล์เป็นช่วงแล้วตรวจพร้อมกัน)")
+    parser.add_argument("--max-errors", type=int, default=None,
+                        help="หยุดตรวจเมื่อพบ error ครบจำนวนนี้")
+    parser.add_argument("--samples", type=int, default=MAX_SAMPLES,
+                        help="จำนวนตัวอย่างที่แสดงต่อ rule")
+    parser.add_argument("--report", default=None,
+                        help="เขียนทุกปัญหาลงไฟล์ระหว่างตรวจ (.jsonl หรือ .sarif)")
+    args = parser.parse_args()
+    if args.max_errors is not None and args.max_errors < 1:
+        parser.error("--max-errors must be at least 1")
 
-    # Validate JSONL
+    data_dir = Path(__file__).parent / "data"
     jsonl_path = data_dir / "energy_stats.jsonl"
-    if jsonl_path.exists():
-        validator.validate_jsonl(str(jsonl_path))
-
-    # Validate CSV
     csv_path = data_dir / "energy_stats_clean.csv"
-    if csv_path.exists():
-        validator.validate_csv(str(csv_path))
-
-    # Load records for additional checks
-    records = []
-    if jsonl_path.exists():
-        with open(jsonl_path, "r", encoding="utf-8") as f:
-            records = [json.loads(line) for line in f]
-
-    # Check duplicates and completeness
-    if records:
-        validator.check_duplicates(records)
-        validator.check_completeness(records)
+
+    report = ReportWriter(args.report, compile_schema().rules) if args.report else None
+    validator = DataValidator(max_samples=args.samples, max_errors=args.max_errors, report=report)
+
+    # Validate JSONL (ตรวจข้อมูลซ้ำและเก็บภูมิภาคไปพร้อมกัน) และ CSV - อ่านแต่ละไฟล์ครั้งเดียว
+    jsonl_paths = [jsonl_path] if jsonl_path.exists() else []
+    csv_paths = [csv_path] if csv_path.exists() else []
+    if args.workers > 1:
+        validator.validate_parallel(jsonl_paths, csv_paths, workers=args.workers)
+    else:
+        for path in jsonl_paths:
+            validator.validate_jsonl(str(path), check_keys=True)
+            if validator.stopped:
+                break
+        for path in csv_paths:
+            if validator.stopped:
+                break
+            validator.validate_csv(str(path))
+
+    # Check completeness (ค่าที่พบระหว่างตรวจ JSONL เช่น ทุกภูมิภาค)
+    if jsonl_paths and not validator.stopped:
+        if report is not None:
+            report.artifact = str(jsonl_paths[0])
+        validator.check_completeness()
+    if report is not None:
+        report.close(validator.summary())
 
     # Print report
     is_valid = validator.print_report()
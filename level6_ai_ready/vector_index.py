@@ -0,0 +1,343 @@
+"""
+Vector Index
+Level 6: index สำหรับค้นหา embeddings ที่ prepare_data.py สร้างไว้ (ไม่ต้องสร้างใหม่ทุกครั้งที่รัน)
+
+    index = build_index("data/embeddings", kind="ivf")    # ครั้งเดียวหลัง prepare_data
+    index = load_index("data/embeddings")                 # โหลดแบบ memory-map ใช้ได้ทันที
+    index.similarity_search("ภาคอีสานใช้ไฟฟ้าเท่าไหร่", k=4, region_code="TH-NE", year=2566)
+
+ชนิดของ index (เก็บใน data/embeddings/index/):
+    flat   ค้นทุกแถว (ผลแม่นยำที่สุด)
+    ivf    แบ่ง vector เป็นกลุ่มด้วย k-means       centroids.npy, list_offsets.npy,
+           ค้นเฉพาะ nprobe กลุ่มที่ใกล้ที่สุด        list_rows.npy
+    hnsw   graph ของ hnswlib (ต้องติดตั้ง hnswlib)  hnsw.bin
+
+ทุกชนิดมี index.json และ inv_norms.npy (1 / ความยาวของแต่ละ vector)
+
+ทุกชนิดใช้ cosine similarity และอ่าน vector จาก vectors.npy ผ่าน memory map
+(ไม่คัดลอก matrix) - ยกเว้น hnsw ที่ hnswlib โหลด graph ทั้งไฟล์เข้าหน่วยความจำ
+index อยู่ในโฟลเดอร์ของ embeddings จึงถูกลบไปพร้อมกันเมื่อ embeddings ถูกเขียนใหม่
+
+รัน: pip install numpy pyarrow   (hnsw: pip install hnswlib)
+"""
+
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import PLACEHOLDER_MODEL, Encoder, StoredEmbeddings
+
+INDEX_KINDS = ("flat", "ivf", "hnsw")
+INDEX_DIR = "index"
+
+# จำนวนแถวที่คำนวณต่อรอบ (จำกัดหน่วยความจำตอนสร้าง index และตอนค้นแบบ flat)
+CHUNK_ROWS = 65_536
+
+# IVF: จำนวนกลุ่มที่ค้นต่อ query และจำนวนตัวอย่างต่อกลุ่มที่ใช้ train k-means
+DEFAULT_NPROBE = 8
+TRAIN_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+# HNSW
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# คอลัมน์ของ metadata.parquet ที่ใช้ filter ได้
+FILTER_FIELDS = ("region_code", "year")
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+    except ImportError:
+        raise ImportError("hnswlib is required for the hnsw index: pip install hnswlib")
+    return hnswlib
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """ทำให้แต่ละแถวยาว 1 (vector ศูนย์คงเป็นศูนย์)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """ตำแหน่งของคะแนนสูงสุด k ตัว เรียงจากมากไปน้อย"""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+# ===========================================
+# Build
+# ===========================================
+
+def inverse_norms(store: StoredEmbeddings) -> np.ndarray:
+    """1 / ความยาวของแต่ละ vector (0 สำหรับ vector ศูนย์) - คะแนน cosine = dot * inv_norm"""
+    inv = np.zeros(len(store), dtype=np.float32)
+    for start in range(0, len(store), CHUNK_ROWS):
+        norms = np.linalg.norm(store.dense(slice(start, start + CHUNK_ROWS)), axis=1)
+        inv[start:start + len(norms)] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return inv
+
+
+def train_ivf(store: StoredEmbeddings, nlist: int, seed: int = 0) -> tuple:
+    """
+    (centroids, list_offsets, list_rows) ด้วย spherical k-means
+
+    train จากตัวอย่างสุ่ม แล้วจัดทุกแถวเข้ากลุ่มทีละ CHUNK_ROWS แถว
+    แถวของกลุ่ม i คือ list_rows[list_offsets[i]:list_offsets[i + 1]]
+    """
+    rng = np.random.default_rng(seed)
+    count = len(store)
+    sample_size = min(count, nlist * TRAIN_SAMPLES_PER_LIST)
+    sample = np.sort(rng.choice(count, sample_size, replace=False))
+    train = _normalize(store.dense(sample))
+
+    centroids = train[rng.choice(sample_size, nlist, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        sums[empty] = centroids[empty]  # กลุ่มที่ไม่มีสมาชิกคง centroid เดิม
+        centroids = _normalize(sums)
+
+    assign = np.empty(count, dtype=np.int32)
+    for start in range(0, count, CHUNK_ROWS):
+        chunk = _normalize(store.dense(slice(start, start + CHUNK_ROWS)))
+        assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+    list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+    list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+    return centroids.astype(np.float32), list_offsets, list_rows
+
+
+def build_index(embeddings_dir, kind: str = "flat", nlist: int = None,
+                m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+    """สร้าง index ของ embeddings_dir แล้วบันทึกใน embeddings_dir/index/ คืน VectorIndex ที่โหลดแล้ว"""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"kind must be one of {INDEX_KINDS}, got {kind!r}")
+    store = StoredEmbeddings(embeddings_dir)
+    if len(store) == 0:
+        raise ValueError(f"No embeddings in {embeddings_dir}")
+
+    output = Path(embeddings_dir) / INDEX_DIR
+    staging = output.with_name(output.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    params = {}
+    np.save(staging / "inv_norms.npy", inverse_norms(store))
+    if kind == "ivf":
+        nlist = nlist or int(np.clip(np.sqrt(len(store)), 1, 4096))
+        nlist = min(nlist, len(store))
+        centroids, list_offsets, list_rows = train_ivf(store, nlist)
+        np.save(staging / "centroids.npy", centroids)
+        np.save(staging / "list_offsets.npy", list_offsets)
+        np.save(staging / "list_rows.npy", list_rows)
+        params = {"nlist": nlist}
+    elif kind == "hnsw":
+        hnswlib = _hnswlib()
+        graph = hnswlib.Index(space="cosine", dim=store.info["dim"])
+        graph.init_index(max_elements=len(store), ef_construction=ef_construction, M=m)
+        for start in range(0, len(store), CHUNK_ROWS):
+            vectors = store.dense(slice(start, start + CHUNK_ROWS))
+            graph.add_items(vectors, np.arange(start, start + len(vectors)))
+        graph.save_index(str(staging / "hnsw.bin"))
+        params = {"m": m, "ef_construction": ef_construction}
+
+    info = {"kind": kind, "metric": "cosine", "count": len(store), "dim": store.info["dim"],
+            "model": store.model, **params}
+    with open(staging / "index.json", "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output, ignore_errors=True)
+    staging.rename(output)
+    return VectorIndex(embeddings_dir)
+
+
+def index_info(embeddings_dir) -> dict:
+    """index.json ของ index ที่สร้างไว้ (None ถ้ายังไม่มี)"""
+    try:
+        with open(Path(embeddings_dir) / INDEX_DIR / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_index(embeddings_dir, encoder=None):
+    """โหลด index ที่สร้างไว้ (vector และ index array เป็น memory map)"""
+    return VectorIndex(embeddings_dir, encoder=encoder)
+
+
+# ===========================================
+# Search
+# ===========================================
+
+class VectorIndex:
+    """index ที่บันทึกไว้ของ embeddings ชุดหนึ่ง"""
+
+    def __init__(self, embeddings_dir, encoder=None):
+        self.directory = Path(embeddings_dir) / INDEX_DIR
+        self.info = index_info(embeddings_dir)
+        if self.info is None:
+            raise FileNotFoundError(f"No vector index in {self.directory} (run build_index first)")
+        self.store = StoredEmbeddings(embeddings_dir)
+        if self.info["count"] != len(self.store) or self.info["model"] != self.store.model:
+            raise ValueError(f"Vector index in {self.directory} is stale (rebuild it)")
+        self.kind = self.info["kind"]
+        self.encoder = encoder
+        self.nprobe = DEFAULT_NPROBE
+
+        self.inv_norms = np.load(self.directory / "inv_norms.npy", mmap_mode="r")
+        if self.kind == "ivf":
+            self.centroids = np.load(self.directory / "centroids.npy")
+            self.list_offsets = np.load(self.directory / "list_offsets.npy")
+            self.list_rows = np.load(self.directory / "list_rows.npy", mmap_mode="r")
+        elif self.kind == "hnsw":
+            hnswlib = _hnswlib()
+            self.graph = hnswlib.Index(space="cosine", dim=self.info["dim"])
+            self.graph.load_index(str(self.directory / "hnsw.bin"), max_elements=self.info["count"])
+            self.graph.set_ef(HNSW_EF_SEARCH)
+
+        # ค่าของคอลัมน์ filter เป็น array ของรหัส (dictionary encode) เทียบด้วย numpy ได้เร็ว
+        self._filters = {}
+        for field in FILTER_FIELDS:
+            column = self.store.metadata.column(field).dictionary_encode().combine_chunks()
+            self._filters[field] = (column.dictionary.to_pylist(),
+                                    column.indices.to_numpy(zero_copy_only=False))
+
+    @property
+    def model(self) -> str:
+        return self.info["model"]
+
+    def __len__(self):
+        return self.info["count"]
+
+    def filter_mask(self, **filters) -> np.ndarray:
+        """
+        mask ของแถวที่ตรงกับ filter (None = ไม่มี filter)
+
+        ค่าของ filter เป็นค่าเดียวหรือ list ก็ได้: region_code="TH-NE", year=[2565, 2566]
+        """
+        mask = None
+        for field, wanted in filters.items():
+            if wanted is None:
+                continue
+            if field not in self._filters:
+                raise ValueError(f"Cannot filter on {field!r}. Must be one of {list(FILTER_FIELDS)}")
+            values, codes = self._filters[field]
+            wanted = set(wanted) if isinstance(wanted, (list, tuple, set)) else {wanted}
+            matched = np.isin(codes, [i for i, value in enumerate(values) if value in wanted])
+            mask = matched if mask is None else mask & matched
+        return mask
+
+    def _exact(self, queries: np.ndarray, k: int, candidates=None) -> list:
+        """
+        ค้นทุกแถว (หรือทุกแถวใน candidates) ทีละ CHUNK_ROWS คืน [(rows, scores)] ต่อ query
+
+        queries (ยาว 1 ทุกแถว) ถูกคูณกับแต่ละ chunk ใน matrix multiply ครั้งเดียว
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        best = [empty] * len(queries)
+        total = len(self) if candidates is None else len(candidates)
+        for start in range(0, total, CHUNK_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(start + CHUNK_ROWS, total))
+                selected = slice(start, start + len(rows))
+            else:
+                rows = selected = np.asarray(candidates[start:start + CHUNK_ROWS])
+            # cosine = dot * (1 / ความยาวของแถว) - queries ยาว 1 อยู่แล้ว
+            scores = (self.store.dense(selected) @ queries.T) * self.inv_norms[selected][:, None]
+            for i, (best_rows, best_scores) in enumerate(best):
+                merged_rows = np.concatenate([best_rows, rows])
+                merged_scores = np.concatenate([best_scores, scores[:, i]])
+                top = _top_k(merged_scores, k)
+                best[i] = (merged_rows[top], merged_scores[top])
+        return best
+
+    def _ivf(self, query: np.ndarray, k: int, mask=None) -> tuple:
+        """ค้นเฉพาะ nprobe กลุ่มที่ใกล้ query ที่สุด (ขยายจำนวนกลุ่มถ้าผ่าน filter ไม่ถึง k แถว)"""
+        order = np.argsort(-(self.centroids @ query))
+        nprobe = self.nprobe
+        while True:
+            lists = order[:nprobe]
+            rows = np.concatenate([
+                self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+            ])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) >= k or nprobe >= len(order):
+                break
+            nprobe *= 2
+        rows.sort()  # อ่าน memory map ตามลำดับ
+        return self._exact(query[None, :], k, rows)[0]
+
+    def _hnsw(self, queries: np.ndarray, k: int, mask=None) -> list:
+        """ค้นบน graph ของ hnswlib ทั้ง batch ในครั้งเดียว (filter ผ่าน callback ของ hnswlib)"""
+        available = len(self) if mask is None else int(mask.sum())
+        k = min(k, available)
+        self.graph.set_ef(max(HNSW_EF_SEARCH, k))
+        try:
+            labels, distances = self.graph.knn_query(
+                queries, k=k, filter=None if mask is None else (lambda label: bool(mask[label]))
+            )
+        except RuntimeError:
+            # filter แคบมากจน graph หาได้ไม่ครบ k - ค้นตรงๆ จากแถวที่ผ่าน filter
+            return self._exact(queries, k, np.flatnonzero(mask))
+        return [
+            (row_labels.astype(np.int64), (1.0 - row_distances).astype(np.float32))
+            for row_labels, row_distances in zip(labels, distances)
+        ]
+
+    def search_many(self, vectors: np.ndarray, k: int = 4, **filters) -> list:
+        """[(rows, scores)] ของหลาย query ที่ใช้ filter เดียวกัน - flat/hnsw ค้นทั้ง batch ในครั้งเดียว"""
+        queries = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.info["dim"]))
+        mask = self.filter_mask(**filters)
+        if k <= 0 or (mask is not None and not mask.any()):
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [empty] * len(queries)
+        if self.kind == "ivf":
+            return [self._ivf(query, k, mask) for query in queries]
+        if self.kind == "hnsw":
+            return self._hnsw(queries, k, mask)
+        return self._exact(queries, k, None if mask is None else np.flatnonzero(mask))
+
+    def search(self, vector: np.ndarray, k: int = 4, **filters) -> tuple:
+        """(rows, scores) ของ k แถวที่ใกล้ vector ที่สุด ผ่าน filter (ดู filter_mask)"""
+        return self.search_many(vector, k, **filters)[0]
+
+    def encode(self, texts: list) -> np.ndarray:
+        """encode คำถามด้วย model เดียวกับที่สร้าง embeddings"""
+        if self.encoder is None:
+            if self.model == PLACEHOLDER_MODEL:
+                raise ValueError("Embeddings were built without sentence-transformers; "
+                                 "pass a query vector instead of text")
+            self.encoder = Encoder(self.model)
+        return self.encoder.encode(texts)
+
+    def results(self, rows, scores) -> list:
+        """แถวที่ค้นได้ พร้อม metadata และคะแนน"""
+        records = self.store.metadata.take(np.asarray(rows, dtype=np.int64)).to_pylist()
+        return [
+            {"row": int(row), "score": round(float(score), 6), **record}
+            for row, score, record in zip(rows, scores, records)
+        ]
+
+    def similarity_search(self, query, k: int = 4, region_code=None, year=None) -> list:
+        """
+        ค้นแถวที่ใกล้ query ที่สุด k แถว
+
+        query เป็นข้อความ (encode ด้วย model ของ embeddings) หรือ vector ก็ได้
+        คืน list ของ {"row", "score", "region_code", "region_th", "year", "text", ...}
+        """
+        vector = self.encode([query])[0] if isinstance(query, str) else query
+        rows, scores = self.search(vector, k, region_code=region_code, year=year)
+        return self.results(rows, scores)